@@ -7,11 +7,30 @@ Detecte le niveau de confiance et cree des entrees KB placeholder si necessaire.
 import os
 import re
 import sys
+import time
+import asyncio
 import logging
-from typing import Optional
-from anthropic import Anthropic
-from kb_retriever import KBRetriever, format_kb_entries_for_prompt
-from prompts import SYSTEM_PROMPT, KB_CONTEXT_TEMPLATE
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Optional
+from anthropic import Anthropic, AsyncAnthropic, RateLimitError
+from answer_cache import ANSWER_CACHE_ENABLED, AnswerCache
+from direct_answer import DIRECT_ANSWER_REFINE, DirectAnswerer
+from event_dedup import AsyncSingleFlight, SingleFlight
+from kb_retriever import (
+    KB_FETCH_PAGE_BODIES,
+    KB_PAGE_BODY_TOP_N,
+    KB_PARALLEL_SEARCH,
+    KBRetriever,
+    format_kb_entries_for_prompt,
+)
+from keyword_matcher import CATEGORY_GROUP_PREFIX, CATEGORY_KEYWORDS, KEYWORD_MATCHER
+from metrics import ANSWERS, CLAUDE_CALL_SECONDS, record_usage, span
+from model_router import TIER_FAST, ModelRouter, Route
+from notion_transport import TokenBucket
+from placeholder_queue import PlaceholderQueue
+from prompt_builder import build_user_message, score_entries
+from prompts import SYSTEM_PROMPT
+from tokenizer import normalize_text
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(name)s] %(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
@@ -20,70 +39,449 @@ logger = logging.getLogger(__name__)
 PAUL_HENRI_ID = os.getenv("PAUL_HENRI_SLACK_ID", "PLACEHOLDER")
 CONSTANTIN_ID = os.getenv("CONSTANTIN_SLACK_ID", "PLACEHOLDER")
 
+# Tags de confiance ajoutes par Claude en fin de reponse (retires avant affichage)
+CONFIDENCE_TAGS = ("[CONFIANCE:HAUTE]", "[CONFIANCE:MOYENNE]", "[CONFIANCE:BASSE]")
+
+# Debut de tag ou de mention encore incomplet en fin de flux ("[CONFI", "<@PAUL_HE")
+_PARTIAL_TAG_RE = re.compile(r"(\[[A-Z:]*|<@[A-Z_]*)$")
+
+# Debit max des appels Claude (requetes/s, 0 = illimite) et rafale : limite du compte Anthropic
+CLAUDE_RATE_LIMIT = float(os.getenv("CLAUDE_RATE_LIMIT", "0"))
+CLAUDE_RATE_BURST = int(os.getenv("CLAUDE_RATE_BURST", "5"))
+# Pause des appels Claude apres un 429 sans Retry-After (secondes)
+CLAUDE_RATE_LIMIT_PAUSE = 10.0
+
+# Ajoute toute la KB (snapshot) au system prompt, en bloc cacheable (prompt caching Anthropic)
+PROMPT_CACHE_FULL_KB = os.getenv("PROMPT_CACHE_FULL_KB", "false").lower() in ("1", "true", "yes")
+
+FULL_KB_HEADER = "## Knowledge Base complete (reference)\n\n"
+
+# Affiche en streaming a la place de la reponse du modele rapide, le temps que le modele principal reponde
+ESCALATION_PENDING_MESSAGE = ":mag: Je verifie ca plus en detail dans la KB, un instant..."
+
+# Lien ajoute a la reponse (edition du message Slack) une fois la fiche placeholder creee
+PLACEHOLDER_LINK_TEMPLATE = (
+    "\n\n📝 *Une fiche a ete creee dans la KB pour documenter ce process :*\n"
+    "<{url}|Completer la fiche KB>"
+)
+
+
+def _flight_key(question: str, channel_context: str) -> str:
+    """Cle de regroupement : question normalisee (casse, accents, espaces) + contexte du thread."""
+    return f"{' '.join(normalize_text(question).split())}\n{channel_context}"
+
+
+class AnswerResult:
+    """Reponse finale, source (claude / cache / direct / error) et niveau de confiance ("" si inconnu)."""
+
+    __slots__ = ("text", "source", "confidence")
+
+    def __init__(self, text: str, source: str, confidence: str = ""):
+        self.text = text
+        self.source = source
+        self.confidence = confidence
+
 
 class OpsHelpRaulAgent:
     """Agent principal qui orchestre KB retrieval + Claude API."""
 
     def __init__(self):
         self.client = Anthropic()
+        self.async_client = AsyncAnthropic()
         self.kb = KBRetriever()
+        # Demarrer sur le snapshot local s'il existe (reconcilie avec Notion en tache de fond),
+        # sinon charger la KB depuis Notion ; puis la tenir a jour en tache de fond
+        if self.kb.load_from_store():
+            self.kb.start_background_refresh(refresh_now=True)
+        else:
+            self.kb.refresh_snapshot(full=True)
+            self.kb.start_background_refresh()
+
+        # System prompt identique pour toutes les requetes : substitution faite une seule fois
+        self.system_prompt = SYSTEM_PROMPT.replace("PAUL_HENRI_ID", PAUL_HENRI_ID).replace("CONSTANTIN_ID", CONSTANTIN_ID)
+        self._full_kb_block: Optional[dict] = None
+        self._full_kb_version = -1
+
+        # Cache des reponses aux questions recurrentes (SQLite, invalide par version KB)
+        self.answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
+        # Questions identiques simultanees : un seul calcul partage
+        self._inflight = SingleFlight()
+        self._inflight_async = AsyncSingleFlight()
+        # Choix du modele (rapide / principal) a partir des signaux du retrieval
+        self.router = ModelRouter()
+        # Reponse rendue depuis la fiche KB, sans Claude, pour les correspondances exactes
+        self.direct = DirectAnswerer({"Paul-Henri": PAUL_HENRI_ID, "Constantin": CONSTANTIN_ID})
+        # Fiches placeholder creees en tache de fond (hors du chemin de la reponse)
+        self.placeholders = PlaceholderQueue(self.kb)
+        # Desactive en mode batch (reevaluation de questions deja posees)
+        self.create_placeholders = True
+        # Debit des appels Claude (suspendu apres un 429)
+        self.claude_limiter = TokenBucket(CLAUDE_RATE_LIMIT, CLAUDE_RATE_BURST)
         logger.info("Agent Ops Help Raul initialise.")
 
-    def answer(self, question: str, channel_context: str = "") -> str:
+    def answer(
+        self,
+        question: str,
+        channel_context: str = "",
+        on_partial: Optional[Callable[[str], None]] = None,
+        on_placeholder: Optional[Callable[[dict], None]] = None,
+    ) -> str:
         """
         Point d'entree principal. Recoit une question, retourne une reponse.
         1. Recherche dans la KB
         2. Construit le contexte pour Claude
         3. Appelle Claude API
-        4. Post-traitement (confiance, escalade, creation KB si necessaire)
+        4. Post-traitement (confiance, escalade, creation KB en tache de fond si necessaire)
+        Une question qui correspond exactement a une fiche KB est servie directement depuis la
+        fiche, sans Claude (cf. direct_answer.py).
+        Si on_partial est fourni, la reponse est streamee : on_partial recoit le texte
+        partiel deja nettoye (tags de confiance retires, IDs d'escalade remplaces).
+        on_placeholder(fiche) est appele depuis un thread de fond quand une fiche KB placeholder
+        a ete creee pour la question (cf. placeholder_link pour completer la reponse postee).
+        Les questions deja connues sont servies par le cache de reponses, et une question
+        identique deja en cours de traitement partage le calcul en cours (sans streaming).
         """
+        return self.answer_result(question, channel_context, on_partial, on_placeholder).text
+
+    def answer_result(
+        self,
+        question: str,
+        channel_context: str = "",
+        on_partial: Optional[Callable[[str], None]] = None,
+        on_placeholder: Optional[Callable[[dict], None]] = None,
+    ) -> AnswerResult:
+        """Comme answer(), avec la source et le niveau de confiance de la reponse (mode batch)."""
+        return self._inflight.do(
+            _flight_key(question, channel_context),
+            lambda: self._answer(question, channel_context, on_partial, on_placeholder),
+        )
+
+    def _answer(
+        self,
+        question: str,
+        channel_context: str,
+        on_partial: Optional[Callable[[str], None]],
+        on_placeholder: Optional[Callable[[dict], None]],
+    ) -> AnswerResult:
         logger.info(f"Question recue : {question[:80]}...")
 
+        with span("answer_cache"):
+            cached = self._cached_answer(question, channel_context)
+        if cached:
+            return self._result(cached, "cache")
+
+        # Reponse directe depuis la fiche KB si elle correspond exactement a la question
+        with span("direct_answer"):
+            ranked = self._local_ranking(question)
+            direct = self._direct_answer(ranked, channel_context)
+        if direct and not (DIRECT_ANSWER_REFINE and on_partial):
+            return self._serve_direct(direct, question)
+        if direct:
+            # Affichee tout de suite, puis remplacee par la reponse de Claude (non streamee)
+            on_partial(self._clean_partial(direct))
+            on_partial = None
+
         # Etape 1 : Recherche KB
-        kb_entries = self._retrieve_kb(question)
+        with span("retrieval"):
+            kb_entries = self._retrieve_kb(question)
         logger.info(f"KB: {len(kb_entries)} entree(s) trouvee(s)")
+        with span("page_bodies"):
+            kb_entries = self._with_page_bodies(question, kb_entries)
+
+        # Etape 2 : Construire le message avec contexte KB et choisir le modele
+        with span("prompt_build"):
+            user_message = self._build_user_message(question, kb_entries, channel_context)
+            route = self._route(question, channel_context, ranked)
 
-        # Etape 2 : Construire le message avec contexte KB
-        kb_context = format_kb_entries_for_prompt(kb_entries)
-        user_message = KB_CONTEXT_TEMPLATE.format(
-            kb_entries=kb_context,
-            question=question,
+        # Etape 3 : Appel Claude API (modele principal si le modele rapide n'est pas sur de lui)
+        try:
+            answer = self._call_claude(user_message, route, on_partial)
+            if route.tier == TIER_FAST and self._detect_confidence(answer) == "BASSE":
+                route = self.router.escalate(route)
+                if on_partial:
+                    # Remplace la reponse ecartee deja affichee (le flux du modele principal repart de zero)
+                    on_partial(ESCALATION_PENDING_MESSAGE)
+                answer = self._call_claude(user_message, route, on_partial)
+            logger.info("Reponse Claude recue.")
+        except Exception as e:
+            logger.error(f"Erreur Claude API: {e}")
+            if direct:
+                return self._serve_direct(direct, question)
+            return self._result(self._technical_error_message(), "error")
+
+        # Etape 4 : Post-traitement
+        with span("post_process"):
+            final = self._post_process(answer, kb_entries, question, on_placeholder)
+        self._store_answer(question, channel_context, answer, final, kb_entries)
+        return self._result(final, "claude", self._detect_confidence(answer))
+
+    async def answer_async(
+        self,
+        question: str,
+        channel_context: str = "",
+        kb_entries: Optional[list[dict]] = None,
+        on_partial: Optional[Callable[[str], Awaitable[None]]] = None,
+        on_placeholder: Optional[Callable[[dict], None]] = None,
+    ) -> str:
+        """
+        Version coroutine de answer() pour le mode Slack async.
+        Les entrees KB peuvent etre passees si la recherche a deja ete lancee en parallele
+        (cf. retrieve_kb_async). L'appel Claude passe par le client AsyncAnthropic ;
+        les appels Notion restants (fallbacks) tournent dans un thread.
+        on_partial (coroutine) active le streaming, comme pour answer() ; on_placeholder
+        reste une fonction synchrone appelee depuis le thread de la file des placeholders.
+        """
+        result = await self._inflight_async.do(
+            _flight_key(question, channel_context),
+            lambda: self._answer_async(question, channel_context, kb_entries, on_partial, on_placeholder),
         )
+        return result.text
+
+    async def _answer_async(
+        self,
+        question: str,
+        channel_context: str,
+        kb_entries: Optional[list[dict]],
+        on_partial: Optional[Callable[[str], Awaitable[None]]],
+        on_placeholder: Optional[Callable[[dict], None]],
+    ) -> AnswerResult:
+        logger.info(f"Question recue (async) : {question[:80]}...")
+
+        with span("answer_cache"):
+            cached = self._cached_answer(question, channel_context)
+        if cached:
+            return self._result(cached, "cache")
 
-        # Ajouter le contexte du thread si disponible
-        if channel_context:
-            user_message = f"## Contexte de la conversation Slack\n{channel_context}\n\n{user_message}"
+        with span("direct_answer"):
+            ranked = self._local_ranking(question)
+            direct = self._direct_answer(ranked, channel_context)
+        if direct and not (DIRECT_ANSWER_REFINE and on_partial):
+            return self._serve_direct(direct, question)
+        if direct:
+            await on_partial(self._clean_partial(direct))
+            on_partial = None
+
+        if kb_entries is None:
+            kb_entries = await self.retrieve_kb_async(question)
+        logger.info(f"KB: {len(kb_entries)} entree(s) trouvee(s)")
+        with span("page_bodies"):
+            kb_entries = await asyncio.to_thread(self._with_page_bodies, question, kb_entries)
+
+        with span("prompt_build"):
+            user_message = self._build_user_message(question, kb_entries, channel_context)
+            route = self._route(question, channel_context, ranked)
 
-        # Etape 3 : Appel Claude API
         try:
-            # Remplacer les placeholders dans le system prompt
-            system = SYSTEM_PROMPT.replace("PAUL_HENRI_ID", PAUL_HENRI_ID).replace("CONSTANTIN_ID", CONSTANTIN_ID)
-
-            response = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=1024,
-                system=system,
-                messages=[{"role": "user", "content": user_message}],
-            )
-            answer = response.content[0].text
+            answer = await self._call_claude_async(user_message, route, on_partial)
+            if route.tier == TIER_FAST and self._detect_confidence(answer) == "BASSE":
+                route = self.router.escalate(route)
+                if on_partial:
+                    await on_partial(ESCALATION_PENDING_MESSAGE)
+                answer = await self._call_claude_async(user_message, route, on_partial)
             logger.info("Reponse Claude recue.")
         except Exception as e:
             logger.error(f"Erreur Claude API: {e}")
-            return (
-                "Desole, je rencontre un probleme technique. "
-                f"<@{PAUL_HENRI_ID}> ou <@{CONSTANTIN_ID}> peuvent t'aider en attendant."
-            )
+            if direct:
+                return self._serve_direct(direct, question)
+            return self._result(self._technical_error_message(), "error")
 
-        # Etape 4 : Post-traitement
-        answer = self._post_process(answer, kb_entries, question)
+        with span("post_process"):
+            final = self._post_process(answer, kb_entries, question, on_placeholder)
+        self._store_answer(question, channel_context, answer, final, kb_entries)
+        return self._result(final, "claude", self._detect_confidence(answer))
+
+    @staticmethod
+    def _result(text: str, source: str, confidence: str = "") -> AnswerResult:
+        ANSWERS.inc(source=source, confidence=confidence)
+        return AnswerResult(text, source, confidence)
+
+    def _cached_answer(self, question: str, channel_context: str) -> Optional[str]:
+        """
+        Reponse en cache pour une question deja posee, ou None.
+        Pas de cache pour les questions en thread (la reponse depend du contexte),
+        ni sans snapshot KB frais (impossible de verifier les versions des entrees).
+        """
+        if not self.answer_cache or channel_context or not self.kb.is_snapshot_fresh():
+            return None
+        try:
+            cached = self.answer_cache.get(question, self.kb.get_entry)
+        except Exception as e:
+            logger.warning(f"Lecture du cache de reponses echouee: {e}")
+            return None
+        if cached:
+            logger.info("Reponse servie depuis le cache.")
+        return cached
+
+    def _store_answer(
+        self, question: str, channel_context: str, raw_answer: str, answer: str, kb_entries: list[dict]
+    ) -> None:
+        """Met en cache une reponse fondee sur la KB (jamais les escalades en confiance BASSE)."""
+        if not self.answer_cache or channel_context or not kb_entries:
+            return
+        if self._detect_confidence(raw_answer) == "BASSE":
+            return
+        try:
+            self.answer_cache.put(question, answer, kb_entries)
+        except Exception as e:
+            logger.warning(f"Ecriture du cache de reponses echouee: {e}")
+
+    async def retrieve_kb_async(self, question: str) -> list[dict]:
+        """Recherche KB sans bloquer la boucle asyncio (snapshot local, Notion en thread si besoin)."""
+        with span("retrieval"):
+            return await asyncio.to_thread(self._retrieve_kb, question)
+
+    def _with_page_bodies(self, question: str, kb_entries: list[dict]) -> list[dict]:
+        """
+        Charge le corps de page des KB_PAGE_BODY_TOP_N entrees les plus pertinentes
+        (celles qui partent en tete du prompt) ; les autres restent sans corps.
+        """
+        if not KB_FETCH_PAGE_BODIES or KB_PAGE_BODY_TOP_N <= 0 or not kb_entries:
+            return kb_entries
+        top = [entry for entry, _ in score_entries(question, kb_entries)[:KB_PAGE_BODY_TOP_N]]
+        loaded = {entry["id"]: entry for entry in self.kb.with_page_bodies(top)}
+        return [loaded.get(entry["id"], entry) for entry in kb_entries]
+
+    def _build_user_message(self, question: str, kb_entries: list[dict], channel_context: str = "") -> str:
+        """Construit le message utilisateur : contexte KB + question (+ contexte du thread), sous budget de tokens."""
+        return build_user_message(question, kb_entries, channel_context)
+
+    def _local_ranking(self, question: str) -> Optional[list[tuple[dict, float]]]:
+        """Deux meilleures entrees du classement local, None si le snapshot n'est pas utilisable."""
+        return self.kb.rank(question, max_results=2) if self.kb.should_use_snapshot() else None
+
+    def _direct_answer(self, ranked: Optional[list[tuple[dict, float]]], channel_context: str) -> Optional[str]:
+        """Reponse brute (avec tag de confiance) rendue depuis la fiche KB, ou None."""
+        entry = self.direct.match(ranked, channel_context)
+        return self.direct.render(entry) if entry else None
+
+    def _serve_direct(self, direct: str, question: str) -> AnswerResult:
+        return self._result(self._post_process(direct, [], question), "direct", "HAUTE")
+
+    def _route(self, question: str, channel_context: str, ranked: Optional[list[tuple[dict, float]]]) -> Route:
+        """Decision de routage : classement local (None si le snapshot n'est pas utilisable) + categorie."""
+        return self.router.route(ranked, self._detect_category(question), channel_context)
+
+    def _claude_request(self, user_message: str, route: Route) -> dict:
+        """Parametres de l'appel messages.create (communs aux clients sync et async)."""
+        return {
+            "model": route.model,
+            "max_tokens": route.max_tokens,
+            "system": self._system_blocks(),
+            "messages": [{"role": "user", "content": user_message}],
+        }
+
+    def _call_claude(self, user_message: str, route: Route, on_partial: Optional[Callable[[str], None]]) -> str:
+        """Appel Claude (streame si on_partial) avec le modele de la route ; latence loggee par tier."""
+        request = self._claude_request(user_message, route)
+        self.claude_limiter.acquire()
+        start = time.perf_counter()
+        with span("claude"), self._rate_limit_guard():
+            if on_partial:
+                answer = ""
+                with self.client.messages.stream(**request) as stream:
+                    for chunk in stream.text_stream:
+                        answer += chunk
+                        on_partial(self._clean_partial(answer))
+                    self._log_usage(stream.get_final_message().usage)
+            else:
+                response = self.client.messages.create(**request)
+                answer = response.content[0].text
+                self._log_usage(response.usage)
+        self._log_latency(route, time.perf_counter() - start)
+        return answer
+
+    async def _call_claude_async(
+        self, user_message: str, route: Route, on_partial: Optional[Callable[[str], Awaitable[None]]]
+    ) -> str:
+        """Version async de _call_claude (client AsyncAnthropic)."""
+        request = self._claude_request(user_message, route)
+        await asyncio.to_thread(self.claude_limiter.acquire)
+        start = time.perf_counter()
+        with span("claude"), self._rate_limit_guard():
+            if on_partial:
+                answer = ""
+                async with self.async_client.messages.stream(**request) as stream:
+                    async for chunk in stream.text_stream:
+                        answer += chunk
+                        await on_partial(self._clean_partial(answer))
+                    self._log_usage((await stream.get_final_message()).usage)
+            else:
+                response = await self.async_client.messages.create(**request)
+                answer = response.content[0].text
+                self._log_usage(response.usage)
+        self._log_latency(route, time.perf_counter() - start)
         return answer
 
+    @contextmanager
+    def _rate_limit_guard(self):
+        """Sur un 429 Anthropic (retries du SDK epuises), suspend les appels suivants (Retry-After)."""
+        try:
+            yield
+        except RateLimitError as e:
+            retry_after = e.response.headers.get("retry-after", "")
+            pause = float(retry_after) if retry_after.replace(".", "", 1).isdigit() else CLAUDE_RATE_LIMIT_PAUSE
+            logger.warning(f"Limite de debit Claude atteinte : appels suspendus {pause:.0f}s")
+            self.claude_limiter.pause(pause)
+            raise
+
+    @staticmethod
+    def _log_latency(route: Route, elapsed: float) -> None:
+        CLAUDE_CALL_SECONDS.observe(elapsed, tier=route.tier)
+        logger.info(f"Claude : tier={route.tier} model={route.model} duration_ms={elapsed * 1000:.0f}")
+
+    def _system_blocks(self) -> list[dict]:
+        """
+        System prompt sous forme de blocs marques cacheables (prompt caching).
+        Avec PROMPT_CACHE_FULL_KB, un second bloc contient toute la KB ; il n'est reconstruit
+        (et donc re-cache) que quand le snapshot change.
+        """
+        blocks = [{"type": "text", "text": self.system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+        if PROMPT_CACHE_FULL_KB:
+            version = self.kb.snapshot_version
+            if self._full_kb_block is None or version != self._full_kb_version:
+                entries = sorted(self.kb.get_snapshot_entries(), key=lambda e: e["id"])
+                self._full_kb_block = {
+                    "type": "text",
+                    "text": FULL_KB_HEADER + format_kb_entries_for_prompt(entries),
+                    "cache_control": {"type": "ephemeral"},
+                }
+                self._full_kb_version = version
+            blocks.append(self._full_kb_block)
+
+        return blocks
+
+    @staticmethod
+    def _log_usage(usage) -> None:
+        """Log des tokens consommes, dont lecture / creation du cache de prompt."""
+        if usage is None:
+            return
+        record_usage(usage)
+        logger.info(
+            f"Tokens Claude : input={usage.input_tokens} output={usage.output_tokens} "
+            f"cache_read={getattr(usage, 'cache_read_input_tokens', 0) or 0} "
+            f"cache_creation={getattr(usage, 'cache_creation_input_tokens', 0) or 0}"
+        )
+
+    @staticmethod
+    def _technical_error_message() -> str:
+        return (
+            "Desole, je rencontre un probleme technique. "
+            f"<@{PAUL_HENRI_ID}> ou <@{CONSTANTIN_ID}> peuvent t'aider en attendant."
+        )
+
     def _retrieve_kb(self, question: str) -> list[dict]:
         """
         Strategie de recherche multi-etapes :
         1. Recherche par mots-cles
         2. Si pas assez de resultats, detection de categorie + recherche par categorie
+        Si le snapshot KB n'est pas utilisable (appels Notion en direct), les recherches
+        mots-cles / globale / categorie partent en parallele avec une deadline.
         """
+        if KB_PARALLEL_SEARCH and not self.kb.should_use_snapshot():
+            category = self._detect_category(question)
+            return self.kb.search_parallel(question, category=category, max_results=8)
+
         # Etape 1 : Recherche par mots-cles
         results = self.kb.search_by_keywords(question, max_results=8)
 
@@ -102,89 +500,84 @@ class OpsHelpRaulAgent:
         return results[:8]
 
     def _detect_category(self, question: str) -> Optional[str]:
-        """Detection de categorie basee sur des mots-cles."""
-        q = question.lower()
-
-        category_keywords = {
-            "Billing": ["facture", "facturation", "credit note", "avoir", "remboursement", "paiement",
-                        "rib", "tva", "impaye", "recouvrement", "dunning", "chargebee", "stripe",
-                        "prelevement", "encaissement", "chorus", "banniere", "relance"],
-            "Lead": ["lead", "prospect", "conversion lead", "convertir", "assignation", "doublon",
-                     "partenariat", "partnership"],
-            "Contract Change": ["changement contrat", "contract change", "upsell", "downsell",
-                                "migration", "rollout", "remise", "discount", "avenant",
-                                "mm vers enterprise", "enterprise vers mm", "changement plan"],
-            "Churn": ["churn", "resiliation", "reactivation", "reactiver", "desabonnement",
-                      "annulation", "free trial", "churned"],
-            "Quote": ["devis", "quote", "propal", "proposition", "multi-shop", "multi shop",
-                      "approbation devis"],
-            "Opportunité": ["opportunite", "opportunity", "pipeline", "conversion opp"],
-            "Pricing": ["prix", "pricing", "tarif", "grille", "remise exceptionnelle",
-                        "mm vs enterprise"],
-            "Calendrier": ["calendly", "booking", "calendar", "rdv", "rendez-vous",
-                           "assignation raul"],
-            "Accès": ["acces", "login", "mot de passe", "password", "reset", "salesforce acces",
-                      "chargebee acces", "stripe acces"],
-            "Technique": ["bug", "sync", "synchronisation", "automation", "erreur technique",
-                          "probleme sf"],
-            "Subscription/MRR": ["mrr", "subscription", "abonnement", "modification cb",
-                                 "mensualite"],
-            "Attribution": ["attribution", "changement owner", "reassignation", "regle attribution"],
-            "Rapport": ["rapport", "report", "dashboard", "tableau de bord", "stats"],
-            "Intégration": ["integration", "upflow", "connecteur", "api", "webhook",
-                            "cb sf sync", "calendly sf"],
-        }
+        """Detection de categorie basee sur des mots-cles (comparaison sans accents)."""
+        scores = KEYWORD_MATCHER.group_scores(normalize_text(question))
 
         best_match = None
         best_score = 0
 
-        for category, keywords in category_keywords.items():
-            score = sum(1 for kw in keywords if kw in q)
+        for category in CATEGORY_KEYWORDS:
+            score = scores.get(CATEGORY_GROUP_PREFIX + category, 0)
             if score > best_score:
                 best_score = score
                 best_match = category
 
         return best_match if best_score > 0 else None
 
-    def _post_process(self, answer: str, kb_entries: list[dict], question: str) -> str:
+    def _post_process(
+        self,
+        answer: str,
+        kb_entries: list[dict],
+        question: str,
+        on_placeholder: Optional[Callable[[dict], None]] = None,
+    ) -> str:
         """
         Post-traitement de la reponse :
         - Detecte le niveau de confiance
-        - Si confiance basse, cree une entree KB placeholder
+        - Si confiance basse, demande une entree KB placeholder (creee en tache de fond)
         - Remplace les placeholders
         """
         # Detecter le niveau de confiance dans la reponse
-        confidence = "HAUTE"
-        if "[CONFIANCE:BASSE]" in answer:
-            confidence = "BASSE"
-        elif "[CONFIANCE:MOYENNE]" in answer:
-            confidence = "MOYENNE"
+        confidence = self._detect_confidence(answer)
 
         # Retirer le tag de confiance de la reponse affichee
-        answer = answer.replace("[CONFIANCE:HAUTE]", "").replace("[CONFIANCE:MOYENNE]", "").replace("[CONFIANCE:BASSE]", "").strip()
+        answer = self._strip_confidence_tags(answer).strip()
 
-        # Si confiance basse : creer une entree KB placeholder
-        if confidence == "BASSE":
-            logger.info("Confiance BASSE detectee -> creation entree KB placeholder")
+        # Si confiance basse : creer une entree KB placeholder, sans faire attendre la reponse
+        if confidence == "BASSE" and self.create_placeholders:
+            logger.info("Confiance BASSE detectee -> entree KB placeholder mise en file")
             category = self._detect_category(question) or ""
-            created = self.kb.create_placeholder_entry(
-                question=question,
-                category=category,
-                detected_topic="",
-            )
-            if created and created.get("url"):
-                answer += (
-                    f"\n\n📝 *Une fiche a ete creee dans la KB pour documenter ce process :*\n"
-                    f"<{created['url']}|Completer la fiche KB>"
-                )
-                logger.info(f"Entree KB creee : {created['url']}")
+            self.placeholders.submit(question, category, on_placeholder)
 
         # Remplacer les IDs Slack si encore en placeholder
-        answer = answer.replace("<@PAUL_HENRI_ID>", f"<@{PAUL_HENRI_ID}>")
-        answer = answer.replace("<@CONSTANTIN_ID>", f"<@{CONSTANTIN_ID}>")
+        return self._replace_escalation_ids(answer)
+
+    @staticmethod
+    def placeholder_link(created: dict) -> str:
+        """Texte a ajouter a la reponse postee une fois la fiche placeholder creee ("" sans URL)."""
+        if not created.get("url"):
+            return ""
+        return PLACEHOLDER_LINK_TEMPLATE.format(url=created["url"])
+
+    def _clean_partial(self, partial: str) -> str:
+        """
+        Nettoyage incremental d'une reponse en cours de streaming : memes regles que
+        _post_process (sans creation KB), et masquage d'un tag ou d'une mention coupes.
+        """
+        text = self._strip_confidence_tags(partial)
+        text = _PARTIAL_TAG_RE.sub("", text)
+        return self._replace_escalation_ids(text).strip()
+
+    @staticmethod
+    def _detect_confidence(answer: str) -> str:
+        """Niveau de confiance annonce par Claude (HAUTE par defaut)."""
+        if "[CONFIANCE:BASSE]" in answer:
+            return "BASSE"
+        if "[CONFIANCE:MOYENNE]" in answer:
+            return "MOYENNE"
+        return "HAUTE"
 
+    @staticmethod
+    def _strip_confidence_tags(answer: str) -> str:
+        for tag in CONFIDENCE_TAGS:
+            answer = answer.replace(tag, "")
         return answer
 
+    @staticmethod
+    def _replace_escalation_ids(answer: str) -> str:
+        answer = answer.replace("<@PAUL_HENRI_ID>", f"<@{PAUL_HENRI_ID}>")
+        return answer.replace("<@CONSTANTIN_ID>", f"<@{CONSTANTIN_ID}>")
+
 
 # Mode test standalone
 if __name__ == "__main__":
@@ -0,0 +1,187 @@
+"""
+Cache des reponses aux questions recurrentes de #help_raul.
+Cle = mots significatifs normalises et stemmes (tokenizer.analyze), avec en option une
+similarite vectorielle legere (n-grammes de caracteres hashes) pour les formulations proches.
+Chaque reponse retient les entrees KB utilisees (id + last_edited_time) et est invalidee des
+qu'une de ces entrees change. TTL + eviction LRU, stockage SQLite (survit aux redemarrages).
+"""
+
+import os
+import json
+import math
+import time
+import sqlite3
+import logging
+import threading
+import zlib
+from typing import Callable, Optional
+from tokenizer import analyze, normalize_text
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "data/answer_cache.db")
+# Duree de vie d'une reponse en cache (secondes, 7 jours par defaut)
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+# Seuil de similarite cosinus pour reutiliser une reponse proche (0 = cle exacte uniquement)
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+# Dimension des vecteurs de n-grammes hashes
+_VECTOR_DIM = 2 ** 16
+_NGRAM = 3
+
+
+def cache_key(question: str) -> str:
+    """Cle canonique : termes significatifs normalises, dedoublonnes et tries."""
+    terms = analyze(question, drop_stop_words=True) or analyze(question)
+    return " ".join(sorted(set(terms)))
+
+
+def _vectorize(text: str) -> dict[int, float]:
+    """Vecteur creux normalise de trigrammes de caracteres (hashes) du texte normalise."""
+    text = f" {' '.join(normalize_text(text).split())} "
+    counts: dict[int, float] = {}
+    for i in range(len(text) - _NGRAM + 1):
+        bucket = zlib.crc32(text[i:i + _NGRAM].encode()) % _VECTOR_DIM
+        counts[bucket] = counts.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {k: v / norm for k, v in counts.items()}
+
+
+def _cosine(a: dict[int, float], b: dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class AnswerCache:
+    """Cache persistant (SQLite) des reponses, invalide par version des entrees KB utilisees."""
+
+    def __init__(
+        self,
+        path: str = ANSWER_CACHE_PATH,
+        ttl: int = ANSWER_CACHE_TTL,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.stats = {"hits": 0, "misses": 0, "invalidated": 0, "evicted": 0}
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " key TEXT PRIMARY KEY, question TEXT, answer TEXT, kb_versions TEXT,"
+            " created_at REAL, last_access REAL, hits INTEGER DEFAULT 0)"
+        )
+        self._db.commit()
+
+        # Vecteurs en memoire pour la recherche par similarite
+        self._vectors: dict[str, dict[int, float]] = {}
+        if self.similarity_threshold > 0:
+            for key, question in self._db.execute("SELECT key, question FROM answers"):
+                self._vectors[key] = _vectorize(question)
+        logger.info(f"Cache de reponses : {self._count_rows()} entree(s) ({path})")
+
+    def get(self, question: str, kb_lookup: Callable[[str], Optional[dict]]) -> Optional[str]:
+        """
+        Retourne la reponse en cache pour la question, ou None.
+        kb_lookup(id) doit retourner l'entree KB courante : si une entree utilisee a change
+        (last_edited_time different) ou disparu, la reponse est invalidee.
+        """
+        key = cache_key(question)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT key, answer, kb_versions, created_at FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None and self.similarity_threshold > 0:
+                row = self._find_similar(question)
+
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            row_key, answer, kb_versions, created_at = row
+            if not self._is_valid(created_at, json.loads(kb_versions), kb_lookup):
+                self._delete(row_key)
+                self.stats["invalidated"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self._db.execute(
+                "UPDATE answers SET last_access = ?, hits = hits + 1 WHERE key = ?", (time.time(), row_key)
+            )
+            self._db.commit()
+            self.stats["hits"] += 1
+            return answer
+
+    def put(self, question: str, answer: str, kb_entries: list[dict]) -> None:
+        """Met une reponse en cache avec les versions des entrees KB utilisees."""
+        key = cache_key(question)
+        if not key:
+            return
+        kb_versions = {e["id"]: e.get("last_edited_time", "") for e in kb_entries}
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers (key, question, answer, kb_versions, created_at, last_access, hits)"
+                " VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, question, answer, json.dumps(kb_versions), now, now),
+            )
+            if self.similarity_threshold > 0:
+                self._vectors[key] = _vectorize(question)
+            self._evict_lru()
+            self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM answers")
+            self._db.commit()
+            self._vectors.clear()
+
+    def _is_valid(self, created_at: float, kb_versions: dict, kb_lookup: Callable[[str], Optional[dict]]) -> bool:
+        if time.time() - created_at > self.ttl:
+            return False
+        for entry_id, version in kb_versions.items():
+            entry = kb_lookup(entry_id)
+            if entry is None or entry.get("last_edited_time", "") != version:
+                return False
+        return True
+
+    def _find_similar(self, question: str) -> Optional[tuple]:
+        vector = _vectorize(question)
+        best_key, best_score = None, self.similarity_threshold
+        for key, other in self._vectors.items():
+            score = _cosine(vector, other)
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            return None
+        logger.info(f"Cache de reponses : question proche trouvee (similarite {best_score:.2f})")
+        return self._db.execute(
+            "SELECT key, answer, kb_versions, created_at FROM answers WHERE key = ?", (best_key,)
+        ).fetchone()
+
+    def _evict_lru(self) -> None:
+        overflow = self._count_rows() - self.max_entries
+        if overflow <= 0:
+            return
+        keys = [r[0] for r in self._db.execute(
+            "SELECT key FROM answers ORDER BY last_access ASC LIMIT ?", (overflow,)
+        )]
+        for key in keys:
+            self._delete(key)
+        self.stats["evicted"] += len(keys)
+
+    def _delete(self, key: str) -> None:
+        self._db.execute("DELETE FROM answers WHERE key = ?", (key,))
+        self._db.commit()
+        self._vectors.pop(key, None)
+
+    def _count_rows(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
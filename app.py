@@ -1,16 +1,31 @@
 """
 Application Slack Bot pour Ops Help Raul.
-Deux modes : Slack Bot (Socket Mode) et CLI interactif pour les tests.
+Quatre modes : Slack Bot (Socket Mode), Slack Bot async (AsyncApp, --async),
+CLI interactif pour les tests et batch sur un fichier JSONL de questions (--batch).
 """
 
 import os
 import sys
+import json
+import asyncio
 import logging
 import re
+import threading
+from typing import Callable, Optional
 from dotenv import load_dotenv
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
 from agent import OpsHelpRaulAgent
+from batch_runner import BatchRunner
+from event_dedup import EventDeduplicator
+from keyword_matcher import KEYWORD_MATCHER, QUESTION_WORDS_RE, REQUEST_GROUPS, THANKS_ONLY
+from metrics import SLACK_EVENTS, register_health_check, span, start_metrics_server
+from scheduler import PRIORITY_MENTION, PRIORITY_MESSAGE, AnswerScheduler, AsyncAnswerScheduler
+from slack_streaming import PENDING_MESSAGE, AsyncSlackStreamingReply, SlackStreamingReply
+from thread_cache import THREAD_CACHE
+from tokenizer import normalize_text
 
 load_dotenv()
 
@@ -20,94 +35,383 @@ logger = logging.getLogger(__name__)
 # Channel ID a monitorer (test ou production)
 TARGET_CHANNEL = os.getenv("HELP_RAUL_CHANNEL_ID", "")
 
+# Mode async (AsyncApp + AsyncSocketModeHandler) : active aussi via --async
+SLACK_ASYNC_MODE = os.getenv("SLACK_ASYNC_MODE", "false").lower() in ("1", "true", "yes")
+
+# Streaming des reponses Claude dans Slack (message mis a jour progressivement)
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "false").lower() in ("1", "true", "yes")
+
+ERROR_MESSAGE = "Desole, je rencontre un probleme technique. Contacte Paul-Henri ou Constantin directement."
+GREETING_MESSAGE = "Salut ! Pose-moi une question RevOps et je ferai de mon mieux pour t'aider."
+# Accuse de reception quand la file d'attente est longue, et message de rejet quand elle est pleine
+ACK_MESSAGE = ":eyes: Bien recu ! {position} demande(s) avant la tienne, je te reponds des que possible."
+BUSY_MESSAGE = (
+    "Beaucoup de demandes en ce moment, je n'ai pas pu traiter la tienne. "
+    "Reessaie dans quelques minutes ou contacte Paul-Henri ou Constantin directement."
+)
+
 
 def create_slack_app() -> App:
     """Cree et configure l'application Slack."""
     app = App(token=os.getenv("SLACK_BOT_TOKEN"))
     agent = OpsHelpRaulAgent()
+    _register_agent_health_checks(agent)
+    scheduler = AnswerScheduler().start()
+    # Retries Slack et double livraison message + app_mention d'un meme message
+    dedup = EventDeduplicator()
 
     @app.event("message")
     def handle_message(event, say, client):
         """Traite les messages dans la channel monitoree."""
-        # Ignorer les messages du bot lui-meme
-        if event.get("bot_id") or event.get("subtype"):
-            return
+        # Tous les messages (y compris ceux du bot, editions, suppressions, et hors de la channel
+        # monitoree : une mention peut y arriver) alimentent le contexte des threads
+        THREAD_CACHE.record(event)
 
         # Verifier que le message est dans la bonne channel
         channel = event.get("channel", "")
         if TARGET_CHANNEL and channel != TARGET_CHANNEL:
             return
 
+        # Ignorer les messages du bot lui-meme
+        if event.get("bot_id") or event.get("subtype"):
+            return
+
         text = event.get("text", "")
         if not text or not _is_revops_request(text):
+            SLACK_EVENTS.inc(event="message", outcome="ignored")
+            return
+        if dedup.is_duplicate(event):
+            SLACK_EVENTS.inc(event="message", outcome="duplicate")
             return
 
         logger.info(f"Demande RevOps detectee dans {channel}: {text[:80]}...")
+        SLACK_EVENTS.inc(event="message", outcome="handled")
 
-        # Recuperer le contexte du thread si applicable
-        thread_ts = event.get("thread_ts") or event.get("ts")
-        context = _get_thread_context(event, client)
-
-        try:
-            answer = agent.answer(text, channel_context=context)
-            say(text=answer, thread_ts=thread_ts)
-            logger.info("Reponse envoyee dans le thread.")
-        except Exception as e:
-            logger.error(f"Erreur lors de la reponse: {e}")
-            say(
-                text="Desole, je rencontre un probleme technique. Contacte Paul-Henri ou Constantin directement.",
-                thread_ts=thread_ts,
-            )
+        _schedule_answer(scheduler, agent, event, text, say, client, PRIORITY_MESSAGE)
 
     @app.event("app_mention")
     def handle_mention(event, say, client):
         """Traite les mentions @Ops Help Raul."""
+        # La mention fait partie du thread, meme si l'evenement `message` n'est pas recu
+        THREAD_CACHE.record(event)
         text = event.get("text", "")
         # Retirer la mention du bot du texte
         text = re.sub(r"<@[A-Z0-9]+>", "", text).strip()
 
+        # Deja traite via l'evenement `message` (ou retry Slack)
+        if dedup.is_duplicate(event):
+            SLACK_EVENTS.inc(event="app_mention", outcome="duplicate")
+            return
+
         if not text:
-            say(
-                text="Salut ! Pose-moi une question RevOps et je ferai de mon mieux pour t'aider.",
-                thread_ts=event.get("ts"),
-            )
+            SLACK_EVENTS.inc(event="app_mention", outcome="greeting")
+            say(text=GREETING_MESSAGE, thread_ts=event.get("ts"))
             return
 
         logger.info(f"Mention recue: {text[:80]}...")
+        SLACK_EVENTS.inc(event="app_mention", outcome="handled")
+        _schedule_answer(scheduler, agent, event, text, say, client, PRIORITY_MENTION)
+
+    return app
+
+
+def _schedule_answer(
+    scheduler: AnswerScheduler, agent: OpsHelpRaulAgent, event: dict, text: str, say, client, priority: int
+) -> None:
+    """Met la reponse en file (priorite, equite par utilisateur, accuse si la file est longue)."""
+    channel = event["channel"]
+    thread_ts = event.get("thread_ts") or event.get("ts")
 
-        thread_ts = event.get("thread_ts") or event.get("ts")
+    def _ack(position: int) -> Optional[str]:
+        response = client.chat_postMessage(
+            channel=channel, thread_ts=thread_ts, text=ACK_MESSAGE.format(position=position)
+        )
+        return response.get("ts")
+
+    def _shed(ack_ts: Optional[str]) -> None:
+        # L'accuse de reception annoncait une reponse : il est remplace par le message de rejet
+        if ack_ts:
+            client.chat_update(channel=channel, ts=ack_ts, text=BUSY_MESSAGE)
+        else:
+            say(text=BUSY_MESSAGE, thread_ts=thread_ts)
+
+    scheduler.submit(
+        lambda ack_ts: _answer_in_thread(agent, event, text, say, client, message_ts=ack_ts),
+        user=event.get("user", ""),
+        priority=priority,
+        on_ack=_ack,
+        on_shed=_shed,
+    )
+
+
+def _answer_in_thread(
+    agent: OpsHelpRaulAgent, event: dict, text: str, say, client, message_ts: Optional[str] = None
+) -> None:
+    """
+    Repond dans le thread du message (mode sync).
+    Avec STREAM_RESPONSES, un message d'attente est poste puis mis a jour au fil du streaming.
+    message_ts : message deja poste (accuse de reception) a remplacer par la reponse.
+    """
+    with span("end_to_end"):
+        _reply_in_thread(agent, event, text, say, client, message_ts)
+
+
+def _reply_in_thread(agent: OpsHelpRaulAgent, event: dict, text: str, say, client, message_ts: Optional[str]) -> None:
+    # Recuperer le contexte du thread si applicable
+    channel = event["channel"]
+    thread_ts = event.get("thread_ts") or event.get("ts")
+    with span("thread_context"):
         context = _get_thread_context(event, client)
 
+    # Fiche KB placeholder creee en tache de fond : son lien est ajoute a la reponse postee
+    link = _PlaceholderLink(agent, lambda ts, answer: client.chat_update(channel=channel, ts=ts, text=answer))
+
+    if STREAM_RESPONSES:
+        reply = SlackStreamingReply(client, channel, thread_ts, message_ts=message_ts)
         try:
-            answer = agent.answer(text, channel_context=context)
-            say(text=answer, thread_ts=thread_ts)
-            logger.info("Reponse envoyee (mention).")
+            answer = agent.answer(text, channel_context=context, on_partial=reply.update, on_placeholder=link.created)
         except Exception as e:
             logger.error(f"Erreur lors de la reponse: {e}")
-            say(
-                text="Desole, je rencontre un probleme technique. Contacte Paul-Henri ou Constantin directement.",
-                thread_ts=thread_ts,
-            )
+            answer = ERROR_MESSAGE
+        try:
+            with span("slack_reply"):
+                reply.finish(answer)
+            link.posted(reply.ts, answer)
+            logger.info("Reponse envoyee dans le thread (streaming).")
+        except Exception as e:
+            logger.error(f"Impossible d'envoyer la reponse: {e}")
+        return
+
+    def _send(answer: str) -> Optional[str]:
+        if message_ts:
+            client.chat_update(channel=channel, ts=message_ts, text=answer)
+            return message_ts
+        return say(text=answer, thread_ts=thread_ts).get("ts")
+
+    try:
+        answer = agent.answer(text, channel_context=context, on_placeholder=link.created)
+        with span("slack_reply"):
+            link.posted(_send(answer), answer)
+        logger.info("Reponse envoyee dans le thread.")
+    except Exception as e:
+        logger.error(f"Erreur lors de la reponse: {e}")
+        _send(ERROR_MESSAGE)
+
+
+class _PlaceholderLink:
+    """
+    Ajoute le lien de la fiche KB placeholder a la reponse deja postee (edition du message).
+    La fiche peut etre creee avant ou apres l'envoi de la reponse : l'edition part des que
+    les deux sont connus. edit(ts, texte) est appele une seule fois, depuis l'un ou l'autre thread.
+    """
+
+    def __init__(self, agent: OpsHelpRaulAgent, edit: Callable[[str, str], None]):
+        self._agent = agent
+        self._edit = edit
+        self._lock = threading.Lock()
+        self._message: Optional[tuple[str, str]] = None
+        self._link = ""
+        self._done = False
+
+    def created(self, entry: dict) -> None:
+        with self._lock:
+            self._link = self._agent.placeholder_link(entry)
+        self._maybe_edit()
+
+    def posted(self, ts: Optional[str], answer: str) -> None:
+        if not ts:
+            return
+        with self._lock:
+            self._message = (ts, answer)
+        self._maybe_edit()
+
+    def _maybe_edit(self) -> None:
+        with self._lock:
+            if self._done or not self._message or not self._link:
+                return
+            (ts, answer), link = self._message, self._link
+            self._done = True
+        try:
+            self._edit(ts, answer + link)
+            logger.info("Lien de la fiche KB ajoute a la reponse.")
+        except Exception as e:
+            logger.warning(f"Impossible d'ajouter le lien de la fiche KB: {e}")
+
+
+def create_async_slack_app() -> AsyncApp:
+    """
+    Cree l'application Slack en mode async.
+    Chaque evenement est traite dans sa propre coroutine : une reponse lente
+    (Notion + Claude) ne bloque pas les suivantes.
+    """
+    app = AsyncApp(token=os.getenv("SLACK_BOT_TOKEN"))
+    agent = OpsHelpRaulAgent()
+    _register_agent_health_checks(agent)
+    scheduler = AsyncAnswerScheduler()
+    dedup = EventDeduplicator()
+
+    @app.event("message")
+    async def handle_message(event, client):
+        """Traite les messages dans la channel monitoree."""
+        THREAD_CACHE.record(event)
+        channel = event.get("channel", "")
+        if TARGET_CHANNEL and channel != TARGET_CHANNEL:
+            return
+
+        if event.get("bot_id") or event.get("subtype"):
+            return
+
+        text = event.get("text", "")
+        if not text or not _is_revops_request(text):
+            SLACK_EVENTS.inc(event="message", outcome="ignored")
+            return
+        if dedup.is_duplicate(event):
+            SLACK_EVENTS.inc(event="message", outcome="duplicate")
+            return
+
+        logger.info(f"Demande RevOps detectee dans {channel}: {text[:80]}...")
+        SLACK_EVENTS.inc(event="message", outcome="handled")
+        await _schedule_answer_async(scheduler, agent, event, text, client, PRIORITY_MESSAGE)
+
+    @app.event("app_mention")
+    async def handle_mention(event, say, client):
+        """Traite les mentions @Ops Help Raul."""
+        THREAD_CACHE.record(event)
+        text = re.sub(r"<@[A-Z0-9]+>", "", event.get("text", "")).strip()
+
+        if dedup.is_duplicate(event):
+            SLACK_EVENTS.inc(event="app_mention", outcome="duplicate")
+            return
+
+        if not text:
+            SLACK_EVENTS.inc(event="app_mention", outcome="greeting")
+            await say(text=GREETING_MESSAGE, thread_ts=event.get("ts"))
+            return
+
+        logger.info(f"Mention recue: {text[:80]}...")
+        SLACK_EVENTS.inc(event="app_mention", outcome="handled")
+        await _schedule_answer_async(scheduler, agent, event, text, client, PRIORITY_MENTION)
 
     return app
 
 
+async def _schedule_answer_async(
+    scheduler: AsyncAnswerScheduler, agent: OpsHelpRaulAgent, event: dict, text: str, client, priority: int
+) -> None:
+    """Version async de _schedule_answer."""
+    channel = event["channel"]
+    thread_ts = event.get("thread_ts") or event.get("ts")
+
+    async def _ack(position: int) -> Optional[str]:
+        response = await client.chat_postMessage(
+            channel=channel, thread_ts=thread_ts, text=ACK_MESSAGE.format(position=position)
+        )
+        return response.get("ts")
+
+    async def _shed(ack_ts: Optional[str]) -> None:
+        if ack_ts:
+            await client.chat_update(channel=channel, ts=ack_ts, text=BUSY_MESSAGE)
+        else:
+            await client.chat_postMessage(channel=channel, thread_ts=thread_ts, text=BUSY_MESSAGE)
+
+    await scheduler.submit(
+        lambda ack_ts: _answer_in_thread_async(agent, event, text, client, message_ts=ack_ts),
+        user=event.get("user", ""),
+        priority=priority,
+        on_ack=_ack,
+        on_shed=_shed,
+    )
+
+
+async def _answer_in_thread_async(
+    agent: OpsHelpRaulAgent, event: dict, text: str, client, message_ts: Optional[str] = None
+) -> None:
+    """
+    Repond dans le thread en mode async.
+    Le message d'attente, la recherche KB et le contexte du thread sont lances en parallele,
+    puis le message d'attente est remplace par la reponse (progressivement avec STREAM_RESPONSES).
+    message_ts : message deja poste (accuse de reception) utilise a la place du message d'attente.
+    """
+    with span("end_to_end"):
+        await _reply_in_thread_async(agent, event, text, client, message_ts)
+
+
+async def _reply_in_thread_async(
+    agent: OpsHelpRaulAgent, event: dict, text: str, client, message_ts: Optional[str]
+) -> None:
+    channel = event["channel"]
+    thread_ts = event.get("thread_ts") or event.get("ts")
+
+    placeholder_ts, context, kb_entries = await asyncio.gather(
+        _post_pending_message_async(client, channel, thread_ts, message_ts),
+        _get_thread_context_async(event, client),
+        agent.retrieve_kb_async(text),
+    )
+
+    reply = AsyncSlackStreamingReply(client, channel, thread_ts, message_ts=placeholder_ts)
+    # La fiche placeholder est creee dans un thread de fond : l'edition repasse par la boucle
+    loop = asyncio.get_running_loop()
+    link = _PlaceholderLink(
+        agent,
+        lambda ts, answer: asyncio.run_coroutine_threadsafe(_update_message_async(client, channel, ts, answer), loop),
+    )
+    try:
+        answer = await agent.answer_async(
+            text,
+            channel_context=context,
+            kb_entries=kb_entries,
+            on_partial=reply.update if STREAM_RESPONSES else None,
+            on_placeholder=link.created,
+        )
+    except Exception as e:
+        logger.error(f"Erreur lors de la reponse: {e}")
+        answer = ERROR_MESSAGE
+
+    try:
+        with span("slack_reply"):
+            await reply.finish(answer)
+        link.posted(reply.ts, answer)
+        logger.info("Reponse envoyee dans le thread (async).")
+    except Exception as e:
+        logger.error(f"Impossible d'envoyer la reponse: {e}")
+
+
+async def _update_message_async(client, channel: str, ts: str, text: str) -> None:
+    try:
+        await client.chat_update(channel=channel, ts=ts, text=text)
+    except Exception as e:
+        logger.warning(f"Impossible de mettre a jour le message {ts}: {e}")
+
+
+async def _post_pending_message_async(
+    client, channel: str, thread_ts: str, existing_ts: Optional[str] = None
+) -> Optional[str]:
+    """Poste le message d'attente dans le thread, retourne son ts (None si echec)."""
+    if existing_ts:
+        return existing_ts
+    try:
+        response = await client.chat_postMessage(channel=channel, thread_ts=thread_ts, text=PENDING_MESSAGE)
+        return response.get("ts")
+    except Exception as e:
+        logger.warning(f"Impossible de poster le message d'attente: {e}")
+        return None
+
+
 def _is_revops_request(text: str) -> bool:
     """
     Detecte si un message est une demande RevOps (question OU demande d'action).
     Adapte au style #help_raul ou les messages sont souvent des demandes directes.
+    Le texte est normalise (minuscules, sans accents) : "résiliation" == "resiliation".
+    Les tables de mots-cles sont compilees dans keyword_matcher (une seule passe par message).
     """
-    text_lower = text.lower().strip()
+    text_lower = normalize_text(text).strip()
 
     # Ignorer les messages trop courts (salutations, remerciements)
     if len(text_lower) < 15:
         return False
 
     # Ignorer les messages qui sont juste des remerciements
-    thanks_only = ["merci", "merci !", "merci beaucoup", "thanks", "thank you",
-                   "top merci", "super merci", "parfait merci", "ok merci",
-                   "c'est bon merci", "nickel", "top", "parfait"]
-    if text_lower.strip("! ") in thanks_only:
+    if text_lower.strip("! ") in THANKS_ONLY:
         return False
 
     # ---- QUESTIONS (point d'interrogation) ----
@@ -115,115 +419,117 @@ def _is_revops_request(text: str) -> bool:
         return True
 
     # ---- MOTS INTERROGATIFS ----
-    question_words = [
-        "comment", "pourquoi", "quand", "combien", "quel", "quelle",
-        "quels", "quelles", "est-ce que", "est-ce qu", "ou est",
-        "qui peut", "qui doit", "how", "what", "when", "where", "why",
-    ]
-    for word in question_words:
-        if text_lower.startswith(word) or f" {word} " in text_lower:
-            return True
-
-    # ---- DEMANDES D'ACTION (typiques de #help_raul) ----
-    action_keywords = [
-        # Demandes polies
-        "svp", "s'il vous plait", "s'il vous plaît", "stp", "s'il te plait",
-        "merci d'avance", "merci par avance", "d'avance merci",
-        # Formulations de demande
-        "possible de", "est-il possible", "est-ce possible", "serait-il possible",
-        "il faudrait", "il faut", "on peut", "on pourrait", "tu peux", "vous pouvez",
-        "j'aimerais", "je voudrais", "je souhaite", "je souhaiterais",
-        "besoin de", "besoin d'aide", "j'ai besoin",
-        "peux-tu", "pouvez-vous", "pourriez-vous", "pourrais-tu",
-        # Mots-cles d'aide
-        "help", "quelqu'un sait", "quelqu'un peut",
-        "je ne trouve pas", "je n'arrive pas",
-        "probleme avec", "soucis avec", "souci avec",
-        "bug", "erreur", "bloque", "bloqu",
-        "urgent",
-    ]
-    for kw in action_keywords:
-        if kw in text_lower:
-            return True
-
-    # ---- TERMES REVOPS SPECIFIQUES ----
-    # Si le message contient des termes metier RevOps, c'est probablement une demande
-    revops_terms = [
-        # Contract Change
-        " cc ", "contract change", "changement de contrat", "changement contrat",
-        "upsell", "downsell", "migration", "rollout",
-        # Billing
-        "facture", "facturation", "remboursement", "avoir", "credit note",
-        "impaye", "recouvrement", "prelevement", "chargebee", "stripe",
-        "dunning", "chorus", "write-off", "write off",
-        # Lead & Opportunity
-        "lead", "opportunite", "opportunity", "prospect", "conversion",
-        # Churn
-        "churn", "resiliation", "reactivation", "desabonnement",
-        # Quote
-        "devis", "quote", "propal",
-        # Subscription
-        "subscription", "abonnement", "mrr",
-        # Acces
-        "acces salesforce", "acces chargebee", "acces stripe",
-        "reset password", "mot de passe",
-        # Technique
-        "sync", "synchronisation", "automation",
-        # Actions courantes
-        "activer", "desactiver", "creer", "supprimer", "modifier",
-        "mettre a jour", "mise a jour", "ajouter", "retirer",
-        "badgeuse", "planning",
-    ]
-    for term in revops_terms:
-        if term in text_lower:
-            return True
-
-    # ---- LIENS SALESFORCE / CHARGEBEE ----
-    # Si le message contient un lien Salesforce ou Chargebee, c'est une demande RevOps
-    if "lightning.force.com" in text_lower or "chargebee.com" in text_lower:
+    if QUESTION_WORDS_RE.search(text_lower):
         return True
 
-    return False
+    # ---- DEMANDES D'ACTION / TERMES REVOPS / LIENS SALESFORCE-CHARGEBEE ----
+    scores = KEYWORD_MATCHER.group_scores(text_lower)
+    return any(group in scores for group in REQUEST_GROUPS)
 
 
 def _get_thread_context(event: dict, client) -> str:
     """
     Recupere le contexte du thread (5 derniers messages) pour les reponses en thread.
+    Lu dans le cache des evenements recus ; conversations_replies seulement si le thread
+    n'y est pas (commence avant le demarrage du bot, ou evince).
     """
     thread_ts = event.get("thread_ts")
     if not thread_ts:
         return ""
 
+    cached = THREAD_CACHE.get(event["channel"], thread_ts, event.get("ts", ""))
+    if cached is not None:
+        return _format_thread_messages(cached + [event])
+
     try:
         result = client.conversations_replies(
             channel=event["channel"],
             ts=thread_ts,
             limit=6,  # +1 car inclut le message parent
         )
-        messages = result.get("messages", [])
+        return _format_thread_messages(_seed_thread_cache(event, result))
+    except Exception as e:
+        logger.warning(f"Impossible de recuperer le contexte du thread: {e}")
+        return ""
 
-        # Exclure le message courant et limiter a 5
-        context_parts = []
-        for msg in messages[-6:-1]:  # 5 derniers avant le message actuel
-            user = msg.get("user", "inconnu")
-            text = msg.get("text", "")
-            context_parts.append(f"<@{user}>: {text}")
 
-        return "\n".join(context_parts)
+async def _get_thread_context_async(event: dict, client) -> str:
+    """Version async de _get_thread_context (AsyncWebClient)."""
+    thread_ts = event.get("thread_ts")
+    if not thread_ts:
+        return ""
+
+    cached = THREAD_CACHE.get(event["channel"], thread_ts, event.get("ts", ""))
+    if cached is not None:
+        return _format_thread_messages(cached + [event])
+
+    try:
+        with span("thread_context"):
+            result = await client.conversations_replies(
+                channel=event["channel"],
+                ts=thread_ts,
+                limit=6,  # +1 car inclut le message parent
+            )
+        return _format_thread_messages(_seed_thread_cache(event, result))
     except Exception as e:
         logger.warning(f"Impossible de recuperer le contexte du thread: {e}")
         return ""
 
 
+def _seed_thread_cache(event: dict, result) -> list[dict]:
+    """Alimente le cache avec la reponse de conversations_replies ; retourne les messages recus."""
+    messages = result.get("messages", [])
+    THREAD_CACHE.seed(event["channel"], event["thread_ts"], messages + [event], complete=not result.get("has_more"))
+    return messages
+
+
+def _format_thread_messages(messages: list[dict]) -> str:
+    """Formate les messages du thread pour le prompt (exclut le message courant, max 5)."""
+    context_parts = []
+    for msg in messages[-6:-1]:  # 5 derniers avant le message actuel
+        user = msg.get("user", "inconnu")
+        text = msg.get("text", "")
+        context_parts.append(f"<@{user}>: {text}")
+
+    return "\n".join(context_parts)
+
+
+def _register_agent_health_checks(agent: OpsHelpRaulAgent) -> None:
+    """Healthcheck /healthz : snapshot KB charge (sinon toutes les lectures partent sur Notion)."""
+    register_health_check("kb_snapshot", lambda: agent.kb.snapshot_age() is not None)
+
+
+def _async_socket_connected(client) -> bool:
+    """Etat de la connexion Socket Mode async (is_connected() est une coroutine)."""
+    session = client.current_session
+    return not client.closed and not client.stale and session is not None and not session.closed
+
+
 def run_slack_bot():
     """Lance le bot Slack en mode Socket Mode."""
     app = create_slack_app()
     handler = SocketModeHandler(app, os.getenv("SLACK_APP_TOKEN"))
+    register_health_check("slack_socket", handler.client.is_connected)
+    start_metrics_server()
     logger.info("Bot Ops Help Raul demarre en mode Socket Mode...")
     logger.info(f"Channel monitoree : {TARGET_CHANNEL or 'TOUTES'}")
     handler.start()
 
 
+def run_async_slack_bot():
+    """Lance le bot Slack en mode Socket Mode async."""
+    async def _main():
+        app = create_async_slack_app()
+        handler = AsyncSocketModeHandler(app, os.getenv("SLACK_APP_TOKEN"))
+        register_health_check("slack_socket", lambda: _async_socket_connected(handler.client))
+        start_metrics_server()
+        logger.info("Bot Ops Help Raul demarre en mode Socket Mode (async)...")
+        logger.info(f"Channel monitoree : {TARGET_CHANNEL or 'TOUTES'}")
+        await handler.start_async()
+
+    asyncio.run(_main())
+
+
 def run_test_mode():
     """Mode test interactif en CLI."""
     print("=== Ops Help Raul - Mode Test CLI ===")
@@ -241,7 +547,9 @@ def run_test_mode():
                 continue
 
             print("\nRecherche en cours...\n")
-            answer = agent.answer(question)
+            answer = agent.answer(
+                question, on_placeholder=lambda entry: print(f"\n[Fiche KB creee] {entry.get('url', '')}\n")
+            )
             print(f"Reponse :\n{answer}\n")
             print("-" * 50 + "\n")
         except KeyboardInterrupt:
@@ -251,8 +559,24 @@ def run_test_mode():
             print(f"Erreur: {e}\n")
 
 
+def run_batch_mode(input_path: str, output_path: str):
+    """Mode batch : repond aux questions de input_path (JSONL), reponses ajoutees a output_path."""
+    agent = OpsHelpRaulAgent()
+    stats = BatchRunner(agent).run(input_path, output_path)
+    if agent.create_placeholders:
+        agent.placeholders.join(timeout=60)
+    print(json.dumps(stats))
+
+
 if __name__ == "__main__":
-    if "--test" in sys.argv:
+    if "--batch" in sys.argv:
+        paths = sys.argv[sys.argv.index("--batch") + 1:][:2]
+        if len(paths) < 2:
+            sys.exit("Usage : python app.py --batch questions.jsonl reponses.jsonl")
+        run_batch_mode(*paths)
+    elif "--test" in sys.argv:
         run_test_mode()
+    elif "--async" in sys.argv or SLACK_ASYNC_MODE:
+        run_async_slack_bot()
     else:
         run_slack_bot()
@@ -0,0 +1,162 @@
+"""
+Mode batch : reponses hors Slack a un fichier JSONL de questions (backlog a re-repondre,
+evaluation d'une modification de la KB).
+Les questions sont lues au fil de l'eau et traitees par un pool de BATCH_WORKERS threads qui
+partagent un seul agent (donc un seul snapshot KB et les memes limiteurs de debit : token bucket
+Claude, transport Notion). Chaque reponse est ecrite des qu'elle est prete, avec sa source, son
+niveau de confiance et ses durees par etape.
+Le fichier de sortie sert de checkpoint : relance sur les memes fichiers, le batch saute les
+questions deja repondues (les erreurs sont retentees).
+
+Entree : une question par ligne, `{"id": ..., "question": ..., "context": ...}` (id et contexte
+optionnels) ; les champs `request_id`, `text`, `title` / `body` sont aussi acceptes.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+from metrics import collect_spans
+from notion_transport import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Nombre de questions traitees en parallele
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+# Debit max des appels Claude en mode batch (requetes/s) : ~50 requetes/min par defaut
+BATCH_CLAUDE_RATE_LIMIT = float(os.getenv("BATCH_CLAUDE_RATE_LIMIT", "0.8"))
+# Cree les fiches KB placeholder pour les reponses en confiance BASSE (desactive par defaut)
+BATCH_CREATE_PLACEHOLDERS = os.getenv("BATCH_CREATE_PLACEHOLDERS", "false").lower() in ("1", "true", "yes")
+# Frequence des logs de progression (nombre de questions)
+_PROGRESS_EVERY = 20
+
+
+def read_questions(path: str) -> Iterator[dict]:
+    """Questions du fichier JSONL, au fil de la lecture (lignes vides ou invalides ignorees)."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Ligne {line_number} ignoree (JSON invalide) : {e}")
+                continue
+            question = record.get("question") or record.get("text") or "\n\n".join(
+                part for part in (record.get("title"), record.get("body")) if part
+            )
+            if not question.strip():
+                logger.warning(f"Ligne {line_number} ignoree (pas de question)")
+                continue
+            yield {
+                "id": str(record.get("id") or record.get("request_id") or f"line-{line_number}"),
+                "question": question.strip(),
+                "context": record.get("context", ""),
+            }
+
+
+def load_checkpoint(path: str) -> set[str]:
+    """Ids deja repondus dans un fichier de sortie existant (hors erreurs)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Derniere ligne tronquee par une interruption
+                continue
+            if record.get("source") != "error":
+                done.add(record["id"])
+    return done
+
+
+class BatchRunner:
+    """Traite un fichier de questions avec un agent partage (OpsHelpRaulAgent)."""
+
+    def __init__(
+        self,
+        agent,
+        workers: int = BATCH_WORKERS,
+        claude_rate_limit: float = BATCH_CLAUDE_RATE_LIMIT,
+        create_placeholders: bool = BATCH_CREATE_PLACEHOLDERS,
+    ):
+        self.agent = agent
+        self.workers = max(1, workers)
+        # Les workers gardent la file pleine, le token bucket plafonne le debit vers Claude
+        if claude_rate_limit > 0:
+            agent.claude_limiter = TokenBucket(claude_rate_limit, agent.claude_limiter.burst)
+        agent.create_placeholders = create_placeholders
+        self._write_lock = threading.Lock()
+        self._stats = {"answered": 0, "errors": 0, "skipped": 0}
+
+    def run(self, input_path: str, output_path: str) -> dict:
+        """Repond a toutes les questions non encore traitees. Retourne les compteurs du batch."""
+        done = load_checkpoint(output_path)
+        _terminate_last_line(output_path)
+        if done:
+            logger.info(f"Reprise du batch : {len(done)} question(s) deja repondue(s)")
+        # Au plus 2 questions en attente par worker : lecture au fil de l'eau, memoire bornee
+        slots = threading.BoundedSemaphore(self.workers * 2)
+        start = time.monotonic()
+
+        with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="batch"
+        ) as pool:
+            for item in read_questions(input_path):
+                if item["id"] in done:
+                    self._stats["skipped"] += 1
+                    continue
+                done.add(item["id"])
+                slots.acquire()
+                future = pool.submit(self._answer, item, out)
+                future.add_done_callback(lambda _: slots.release())
+
+        elapsed = time.monotonic() - start
+        processed = self._stats["answered"] + self._stats["errors"]
+        logger.info(
+            f"Batch termine : {processed} question(s) en {elapsed:.1f}s "
+            f"({processed / elapsed if elapsed else 0:.2f}/s), {self._stats['errors']} erreur(s), "
+            f"{self._stats['skipped']} deja repondue(s)"
+        )
+        return dict(self._stats, duration_s=round(elapsed, 1))
+
+    def _answer(self, item: dict, out) -> None:
+        start = time.perf_counter()
+        with collect_spans() as timings:
+            try:
+                result = self.agent.answer_result(item["question"], channel_context=item["context"])
+                record = {"answer": result.text, "source": result.source, "confidence": result.confidence}
+            except Exception as e:
+                logger.error(f"Erreur sur la question {item['id']}: {e}")
+                record = {"answer": "", "source": "error", "confidence": "", "error": str(e)}
+
+        record = {
+            "id": item["id"],
+            "question": item["question"],
+            **record,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            "timings_ms": {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()},
+        }
+        with self._write_lock:
+            # Une ligne complete par reponse, ecrite tout de suite (checkpoint)
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            self._stats["errors" if record["source"] == "error" else "answered"] += 1
+            processed = self._stats["answered"] + self._stats["errors"]
+        if processed % _PROGRESS_EVERY == 0:
+            logger.info(f"Batch : {processed} question(s) traitee(s)")
+
+
+def _terminate_last_line(path: str) -> None:
+    """Termine une derniere ligne tronquee (interruption) pour que les ajouts restent sur leur ligne."""
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
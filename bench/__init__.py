@@ -0,0 +1 @@
+"""Benchmarks hors-ligne du pipeline Ops Help Raul (serveurs Notion / Anthropic / Slack locaux)."""
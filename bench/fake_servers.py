@@ -0,0 +1,341 @@
+"""
+Serveurs HTTP locaux qui imitent Notion, Anthropic et Slack pour les benchmarks.
+Chaque serveur injecte une latence configurable (base + jitter) et compte les appels
+par endpoint ; le faux Anthropic enregistre aussi la taille des prompts recus.
+"""
+
+import re
+import json
+import time
+import random
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class FakeService:
+    """Serveur HTTP de test : latence injectee + compteurs d'appels."""
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeService":
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                service._dispatch(self, "GET")
+
+            def do_POST(self):
+                service._dispatch(self, "POST")
+
+            def do_PATCH(self):
+                service._dispatch(self, "PATCH")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=f"{self.name}-server", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.calls.clear()
+
+    def count(self, endpoint: str) -> None:
+        with self._lock:
+            self.calls[endpoint] += 1
+
+    def _dispatch(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        length = int(handler.headers.get("Content-Length") or 0)
+        raw = handler.rfile.read(length) if length else b""
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        status, payload = self.handle(method, handler.path, raw, handler.headers.get("Content-Type", ""))
+        if isinstance(payload, (bytes, str)):
+            body = payload.encode() if isinstance(payload, str) else payload
+            content_type = "text/event-stream"
+        else:
+            body = json.dumps(payload).encode()
+            content_type = "application/json"
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def handle(self, method: str, path: str, raw: bytes, content_type: str):
+        raise NotImplementedError
+
+
+# ----------------------------------------------------------------------
+# Notion
+# ----------------------------------------------------------------------
+
+def _rich_text(text: str) -> list[dict]:
+    # Un span par ligne, comme Notion des qu'un texte mele plusieurs mises en forme
+    spans = text.splitlines(keepends=True)
+    return [{"type": "text", "plain_text": span, "text": {"content": span}} for span in spans]
+
+
+def _paragraphs(text: str) -> list[dict]:
+    """Corps de page : un bloc paragraph par ligne du champ body du fixture."""
+    return [
+        {"object": "block", "id": f"block-{i}", "type": "paragraph", "has_children": False,
+         "paragraph": {"rich_text": _rich_text(line)}}
+        for i, line in enumerate(text.splitlines()) if line.strip()
+    ]
+
+
+def entry_to_page(entry: dict, database_id: str) -> dict:
+    """Convertit une entree du fixture (format _parse_single_page) en page Notion."""
+    return {
+        "object": "page",
+        "id": entry["id"],
+        "url": f"https://www.notion.so/{entry['id'].replace('-', '')}",
+        "last_edited_time": entry.get("last_edited_time", "2026-01-01T00:00:00.000Z"),
+        "parent": {"type": "database_id", "database_id": database_id},
+        "properties": {
+            "Name": {"title": _rich_text(entry["name"])},
+            "Catégorie": {"select": {"name": entry["categorie"]} if entry.get("categorie") else None},
+            "Sous-catégorie": {"rich_text": _rich_text(entry.get("sous_categorie", ""))},
+            "Description": {"rich_text": _rich_text(entry.get("description", ""))},
+            "Mots-clés": {"rich_text": _rich_text(entry.get("mots_cles", ""))},
+            "Process de résolution": {"rich_text": _rich_text(entry.get("process", ""))},
+            "Qui résout": {"multi_select": [{"name": q} for q in entry.get("qui_resout", [])]},
+            "Action CRM requise": {"checkbox": bool(entry.get("action_crm"))},
+            "Lien process détaillé": {"url": entry.get("lien") or None},
+            "Niveau de confiance": {"select": {"name": entry["confiance"]} if entry.get("confiance") else None},
+            "Fréquence": {"select": {"name": entry["frequence"]} if entry.get("frequence") else None},
+            "Langue": {"select": {"name": entry["langue"]} if entry.get("langue") else None},
+        },
+    }
+
+
+def _plain(prop: dict) -> str:
+    items = prop.get("title") or prop.get("rich_text") or []
+    return "".join(i.get("plain_text") or i.get("text", {}).get("content", "") for i in items)
+
+
+class FakeNotion(FakeService):
+    """Sous-ensemble de l'API Notion utilise par KBRetriever (query, search, pages, blocks)."""
+
+    name = "notion"
+
+    def __init__(self, entries: list[dict], database_id: str, latency: float = 0.0, jitter: float = 0.0):
+        super().__init__(latency, jitter)
+        self.database_id = database_id
+        self.pages = [entry_to_page(e, database_id) for e in entries]
+        self.bodies = {e["id"]: e.get("body", "") for e in entries}
+
+    def handle(self, method, path, raw, content_type):
+        body = json.loads(raw or b"{}")
+        path = path.split("?")[0]
+
+        if re.search(r"/databases/[^/]+/query$", path):
+            self.count("databases.query")
+            pages = [p for p in self.pages if self._matches(p, body.get("filter"))]
+            return 200, self._paginate(pages, body)
+        if path.endswith("/search"):
+            self.count("search")
+            terms = (body.get("query") or "").lower().split()
+            pages = [p for p in self.pages if any(t in _plain(p["properties"]["Name"]).lower() for t in terms)]
+            return 200, self._paginate(pages, body)
+        if path.endswith("/pages") and method == "POST":
+            self.count("pages.create")
+            page_id = f"00000000-0000-0000-0000-{len(self.pages) + 1:012d}"
+            page = {
+                "object": "page",
+                "id": page_id,
+                "url": f"https://www.notion.so/{page_id.replace('-', '')}",
+                "last_edited_time": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+                "parent": {"type": "database_id", "database_id": self.database_id},
+                "properties": {
+                    name: ({"title": _rich_text(_plain(prop))} if "title" in prop
+                           else {"rich_text": _rich_text(_plain(prop))} if "rich_text" in prop
+                           else prop)
+                    for name, prop in body.get("properties", {}).items()
+                },
+            }
+            self.pages.append(page)
+            return 200, page
+        match = re.search(r"/blocks/([^/]+)/children$", path)
+        if match:
+            self.count("blocks.children.list")
+            return 200, self._paginate(_paragraphs(self.bodies.get(match.group(1), "")), body)
+        return 404, {"object": "error", "code": "object_not_found", "message": path}
+
+    def _paginate(self, pages: list[dict], body: dict) -> dict:
+        start = int(body.get("start_cursor") or 0)
+        size = int(body.get("page_size") or 100)
+        chunk = pages[start:start + size]
+        has_more = start + size < len(pages)
+        return {
+            "object": "list",
+            "results": chunk,
+            "has_more": has_more,
+            "next_cursor": str(start + size) if has_more else None,
+        }
+
+    def _matches(self, page: dict, notion_filter: Optional[dict]) -> bool:
+        if not notion_filter:
+            return True
+        if "or" in notion_filter:
+            return any(self._matches(page, f) for f in notion_filter["or"])
+        if "and" in notion_filter:
+            return all(self._matches(page, f) for f in notion_filter["and"])
+        if notion_filter.get("timestamp") == "last_edited_time":
+            return page["last_edited_time"] >= notion_filter["last_edited_time"]["on_or_after"]
+
+        prop = page["properties"].get(notion_filter.get("property"), {})
+        if "select" in notion_filter:
+            selected = prop.get("select") or {}
+            return selected.get("name") == notion_filter["select"].get("equals")
+        for kind in ("title", "rich_text"):
+            if kind in notion_filter:
+                return notion_filter[kind]["contains"].lower() in _plain(prop).lower()
+        return False
+
+
+# ----------------------------------------------------------------------
+# Anthropic
+# ----------------------------------------------------------------------
+
+class FakeAnthropic(FakeService):
+    """
+    Faux endpoint /v1/messages. Repond en confiance HAUTE en citant la premiere entree KB
+    du prompt, ou en confiance BASSE si aucune entree n'a ete fournie.
+    Supporte le mode stream (SSE) et enregistre la taille des prompts.
+    fast_latency : latence des modeles rapides (nom contenant "haiku"), `latency` sinon.
+    """
+
+    name = "anthropic"
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, fast_latency: Optional[float] = None):
+        # La latence depend du modele demande : appliquee dans handle()
+        super().__init__(0.0, jitter)
+        self.model_latency = latency
+        self.fast_latency = latency if fast_latency is None else fast_latency
+        self.prompt_chars: list[int] = []
+        self.models: Counter = Counter()
+
+    def reset_counters(self) -> None:
+        super().reset_counters()
+        with self._lock:
+            self.prompt_chars.clear()
+            self.models.clear()
+
+    def handle(self, method, path, raw, content_type):
+        if not path.split("?")[0].endswith("/messages"):
+            return 404, {"type": "error", "error": {"type": "not_found_error", "message": path}}
+
+        body = json.loads(raw or b"{}")
+        self.count("messages")
+        system = body.get("system", "")
+        if isinstance(system, list):
+            system = "".join(block.get("text", "") for block in system)
+        user = "".join(
+            m["content"] if isinstance(m["content"], str) else "".join(b.get("text", "") for b in m["content"])
+            for m in body.get("messages", [])
+        )
+        prompt_chars = len(system) + len(user)
+        with self._lock:
+            self.prompt_chars.append(prompt_chars)
+            self.models[body.get("model", "")] += 1
+        time.sleep(self.fast_latency if "haiku" in body.get("model", "") else self.model_latency)
+
+        match = re.search(r"### Entree 1: (.+)", user)
+        if match:
+            text = f"D'apres la fiche *{match.group(1)}*, voici le process a suivre. [CONFIANCE:HAUTE]"
+        else:
+            text = "Je n'ai pas d'information fiable, <@PAUL_HENRI_ID> peut t'aider. [CONFIANCE:BASSE]"
+
+        usage = {
+            "input_tokens": prompt_chars // 4,
+            "output_tokens": len(text) // 4,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+        }
+        message = {
+            "id": "msg_bench",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", ""),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": usage,
+        }
+        if not body.get("stream"):
+            return 200, message
+        return 200, self._sse(message, text)
+
+    @staticmethod
+    def _sse(message: dict, text: str) -> str:
+        start = dict(message, content=[], stop_reason=None)
+        events = [
+            ("message_start", {"type": "message_start", "message": start}),
+            ("content_block_start", {"type": "content_block_start", "index": 0,
+                                     "content_block": {"type": "text", "text": ""}}),
+        ]
+        for i in range(0, len(text), 16):
+            events.append(("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                   "delta": {"type": "text_delta", "text": text[i:i + 16]}}))
+        events += [
+            ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+            ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                               "usage": {"output_tokens": message["usage"]["output_tokens"]}}),
+            ("message_stop", {"type": "message_stop"}),
+        ]
+        return "".join(f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events)
+
+
+# ----------------------------------------------------------------------
+# Slack
+# ----------------------------------------------------------------------
+
+class FakeSlack(FakeService):
+    """Sous-ensemble de la Web API Slack : auth.test, chat.postMessage/update, conversations.replies."""
+
+    name = "slack"
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, thread_length: int = 6):
+        super().__init__(latency, jitter)
+        self.thread_length = thread_length
+        self._ts = 0
+
+    def handle(self, method, path, raw, content_type):
+        api = path.split("?")[0].rsplit("/", 1)[-1]
+        self.count(api)
+        if api == "auth.test":
+            return 200, {"ok": True, "user_id": "UBENCHBOT", "bot_id": "BBENCH", "team_id": "TBENCH"}
+        if api in ("chat.postMessage", "chat.update"):
+            with self._lock:
+                self._ts += 1
+                ts = f"1700000000.{self._ts:06d}"
+            return 200, {"ok": True, "ts": ts, "channel": "CBENCH"}
+        if api == "conversations.replies":
+            messages = [{"user": f"U{i}", "text": f"Message {i} du thread", "ts": f"1.{i}"}
+                        for i in range(self.thread_length)]
+            return 200, {"ok": True, "messages": messages, "has_more": False}
+        return 200, {"ok": False, "error": "unknown_method"}
@@ -0,0 +1,282 @@
+"""
+Benchmark du pipeline Ops Help Raul contre des serveurs Notion / Anthropic / Slack locaux.
+Rejoue un corpus de questions #help_raul (filtre _is_revops_request, contexte de thread,
+OpsHelpRaulAgent.answer) avec une latence injectee, et rapporte p50/p95/p99 par etape,
+le debit sous concurrence, le nombre d'appels Notion/Claude et la taille des prompts.
+
+Usage (depuis la racine du repo) :
+    python -m bench.run_bench --concurrency 8 --repeat 3 --notion-latency 0.25 --anthropic-latency 1.5
+    python -m bench.run_bench --save bench/baseline.json
+    python -m bench.run_bench --compare bench/baseline.json --tolerance 0.25
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from bench.fake_servers import FakeAnthropic, FakeNotion, FakeSlack  # noqa: E402
+
+BENCH_DATABASE_ID = "9a6fb1778ff040d0a28279e32fe91ff2"
+BENCH_THREAD_TS = "1699999999.000001"
+
+# Metriques comparees avec --compare (plus haut = moins bien)
+REGRESSION_METRICS = (
+    "end_to_end_p95_ms",
+    "retrieval_p95_ms",
+    "notion_calls_per_question",
+    "claude_calls_per_question",
+    "avg_prompt_chars",
+)
+
+
+class StageTimer:
+    """Collecte les durees par etape (thread-safe)."""
+
+    def __init__(self):
+        self.durations: dict[str, list[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.durations[stage].append(seconds)
+
+    def wrap(self, stage: str, fn):
+        @wraps(fn)
+        def _timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return _timed
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Percentile par rang le plus proche."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def load_corpus(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_fixture(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    for i, entry in enumerate(entries, 1):
+        entry.setdefault("id", f"11111111-1111-1111-1111-{i:012d}")
+    return entries
+
+
+def configure_env(args, notion: FakeNotion, anthropic: FakeAnthropic, workdir: str) -> None:
+    """Pointe les clients vers les faux serveurs (a faire avant d'importer agent/app)."""
+    os.environ.update({
+        "NOTION_API_TOKEN": "bench-token",
+        "NOTION_BASE_URL": notion.url,
+        "NOTION_KB_DATABASE_ID": BENCH_DATABASE_ID,
+        "ANTHROPIC_API_KEY": "bench-key",
+        "ANTHROPIC_BASE_URL": anthropic.url,
+        "KB_STORE_PATH": "",
+        "KB_REFRESH_INTERVAL": "3600",
+        "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false",
+        "ANSWER_CACHE_PATH": os.path.join(workdir, "answer_cache.db"),
+        "NOTION_RATE_LIMIT": str(args.notion_rate_limit),
+    })
+    if args.live_notion:
+        # Snapshot toujours considere comme perime : toutes les lectures vont a Notion
+        os.environ["KB_MAX_STALENESS"] = "-1"
+
+
+def run(args) -> dict:
+    notion = FakeNotion(load_fixture(args.fixture), BENCH_DATABASE_ID, args.notion_latency, args.jitter).start()
+    anthropic = FakeAnthropic(args.anthropic_latency, args.jitter, args.fast_anthropic_latency).start()
+    slack = FakeSlack(args.slack_latency, args.jitter).start()
+    workdir = tempfile.mkdtemp(prefix="ops-help-raul-bench-")
+    configure_env(args, notion, anthropic, workdir)
+
+    import logging
+    from slack_sdk import WebClient
+    from agent import OpsHelpRaulAgent
+    from app import _get_thread_context, _is_revops_request
+    from thread_cache import THREAD_CACHE
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    timer = StageTimer()
+    init_start = time.perf_counter()
+    agent = OpsHelpRaulAgent()
+    init_seconds = time.perf_counter() - init_start
+
+    # Instrumentation des etapes internes de answer()
+    agent._retrieve_kb = timer.wrap("retrieval", agent._retrieve_kb)
+    agent._post_process = timer.wrap("post_process", agent._post_process)
+    agent.client.messages.create = timer.wrap("claude", agent.client.messages.create)
+    is_revops = timer.wrap("filter", _is_revops_request)
+    thread_context = timer.wrap("thread_context", _get_thread_context)
+    web_client = WebClient(token="xoxb-bench", base_url=f"{slack.url}/api/")
+
+    corpus = load_corpus(args.corpus) * args.repeat
+    for service in (notion, anthropic, slack):
+        service.reset_counters()
+
+    handled = 0
+    handled_lock = threading.Lock()
+
+    def process(i: int, item: dict) -> None:
+        nonlocal handled
+        start = time.perf_counter()
+        text = item["question"]
+        if not is_revops(text):
+            return
+        event = {"channel": "CBENCH", "ts": f"1700000000.{i:06d}", "text": text}
+        if item.get("thread"):
+            # Racine hors de la sequence des questions et jamais vue : le premier message du
+            # thread passe par conversations.replies, les suivants sont servis par le cache
+            event["thread_ts"] = BENCH_THREAD_TS
+        # Comme le handler `message` : l'evenement alimente le cache des threads
+        THREAD_CACHE.record(event)
+        context = thread_context(event, web_client)
+        agent.answer(text, channel_context=context)
+        timer.record("end_to_end", time.perf_counter() - start)
+        with handled_lock:
+            handled += 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda pair: process(*pair), enumerate(corpus)))
+    wall_seconds = time.perf_counter() - wall_start
+    # Fiches placeholder creees en tache de fond : hors du temps de reponse, mais comptees dans les appels
+    agent.placeholders.join(timeout=30)
+
+    for service in (notion, anthropic, slack):
+        service.stop()
+
+    per_question = max(handled, 1)
+    report = {
+        "config": {
+            "concurrency": args.concurrency,
+            "repeat": args.repeat,
+            "notion_latency": args.notion_latency,
+            "anthropic_latency": args.anthropic_latency,
+            "fast_anthropic_latency": args.fast_anthropic_latency,
+            "slack_latency": args.slack_latency,
+            "live_notion": args.live_notion,
+            "notion_rate_limit": args.notion_rate_limit,
+            "answer_cache": args.answer_cache,
+        },
+        "questions": len(corpus),
+        "handled": handled,
+        "ignored": len(corpus) - handled,
+        "init_ms": init_seconds * 1000,
+        "wall_seconds": wall_seconds,
+        "throughput_qps": handled / wall_seconds if wall_seconds else 0.0,
+        "stages": {
+            stage: {
+                "count": len(values),
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+                "mean_ms": sum(values) / len(values) * 1000,
+            }
+            for stage, values in sorted(timer.durations.items())
+        },
+        "calls": {
+            "notion": dict(notion.calls),
+            "anthropic": dict(anthropic.calls),
+            "slack": dict(slack.calls),
+            "models": dict(anthropic.models),
+        },
+        "notion_calls_per_question": sum(notion.calls.values()) / per_question,
+        "claude_calls_per_question": sum(anthropic.calls.values()) / per_question,
+        "slack_calls_per_question": sum(slack.calls.values()) / per_question,
+        "avg_prompt_chars": sum(anthropic.prompt_chars) / max(len(anthropic.prompt_chars), 1),
+    }
+    stages = report["stages"]
+    report["end_to_end_p95_ms"] = stages.get("end_to_end", {}).get("p95_ms", 0.0)
+    report["retrieval_p95_ms"] = stages.get("retrieval", {}).get("p95_ms", 0.0)
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(f"\nQuestions : {report['questions']} ({report['handled']} traitees, {report['ignored']} ignorees par le filtre)")
+    print(f"Init agent : {report['init_ms']:.1f} ms | Duree : {report['wall_seconds']:.2f} s | "
+          f"Debit : {report['throughput_qps']:.2f} questions/s (concurrence {report['config']['concurrency']})\n")
+    print(f"{'Etape':<16}{'n':>6}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'moy ms':>11}")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<16}{s['count']:>6}{s['p50_ms']:>11.2f}{s['p95_ms']:>11.2f}{s['p99_ms']:>11.2f}{s['mean_ms']:>11.2f}")
+    print(f"\nAppels Notion / question : {report['notion_calls_per_question']:.2f} {report['calls']['notion']}")
+    print(f"Appels Claude / question : {report['claude_calls_per_question']:.2f} {report['calls']['models']}")
+    print(f"Appels Slack / question  : {report['slack_calls_per_question']:.2f} {report['calls']['slack']}")
+    print(f"Taille moyenne du prompt : {report['avg_prompt_chars']:.0f} caracteres")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Liste des metriques qui regressent de plus de `tolerance` par rapport a la baseline."""
+    regressions = []
+    for metric in REGRESSION_METRICS:
+        before, after = baseline.get(metric, 0.0), report.get(metric, 0.0)
+        if before and after > before * (1 + tolerance):
+            regressions.append(f"{metric}: {before:.2f} -> {after:.2f} (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark hors-ligne du pipeline Ops Help Raul")
+    parser.add_argument("--corpus", default=os.path.join(BENCH_DIR, "corpus.jsonl"))
+    parser.add_argument("--fixture", default=os.path.join(BENCH_DIR, "kb_fixture.json"))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1, help="Nombre de passages sur le corpus")
+    parser.add_argument("--notion-latency", type=float, default=0.2, help="Latence Notion injectee (s)")
+    parser.add_argument("--anthropic-latency", type=float, default=1.0, help="Latence Claude injectee (s)")
+    parser.add_argument("--fast-anthropic-latency", type=float, default=0.4,
+                        help="Latence Claude injectee pour le modele rapide (s)")
+    parser.add_argument("--slack-latency", type=float, default=0.1, help="Latence Slack injectee (s)")
+    parser.add_argument("--notion-rate-limit", type=float, default=3.0,
+                        help="Limite de debit Notion cote client (req/s, 0 = sans limite)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Jitter uniforme ajoute a chaque latence (s)")
+    parser.add_argument("--live-notion", action="store_true", help="Desactive le snapshot KB (appels Notion en direct)")
+    parser.add_argument("--answer-cache", action="store_true", help="Active le cache de reponses")
+    parser.add_argument("--save", help="Ecrit le rapport JSON dans ce fichier")
+    parser.add_argument("--compare", help="Rapport JSON de reference pour detecter les regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Regression toleree (0.25 = +25%%)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nRapport ecrit dans {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS :")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("\nAucune regression par rapport a la baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Reponse directe sans appel Claude pour les questions qui correspondent exactement a une
+entree KB : quand le classement local place une fiche de confiance haute nettement en tete,
+la reponse Slack est rendue depuis la fiche (etapes du process, qui resout, lien Notion) en
+quelques millisecondes.
+Avec DIRECT_ANSWER_REFINE, la reponse directe est affichee tout de suite en mode streaming,
+puis remplacee par la reponse de Claude.
+"""
+
+import os
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Active la reponse directe
+DIRECT_ANSWER_ENABLED = os.getenv("DIRECT_ANSWER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Seuils : score de la meilleure entree (classement hybride local) et ecart au second
+DIRECT_ANSWER_MIN_SCORE = float(os.getenv("DIRECT_ANSWER_MIN_SCORE", "0.85"))
+DIRECT_ANSWER_MIN_MARGIN = float(os.getenv("DIRECT_ANSWER_MIN_MARGIN", "0.5"))
+# Affiche la reponse directe puis la fait reecrire par Claude (uniquement en streaming)
+DIRECT_ANSWER_REFINE = os.getenv("DIRECT_ANSWER_REFINE", "false").lower() in ("1", "true", "yes")
+
+
+class DirectAnswerer:
+    """
+    Decide si une question peut etre servie directement depuis la KB et rend la reponse.
+    `contacts` associe les noms de "Qui resout" aux IDs Slack (mention en cas d'action CRM).
+    """
+
+    def __init__(
+        self,
+        contacts: Optional[dict[str, str]] = None,
+        enabled: bool = DIRECT_ANSWER_ENABLED,
+        min_score: float = DIRECT_ANSWER_MIN_SCORE,
+        min_margin: float = DIRECT_ANSWER_MIN_MARGIN,
+    ):
+        self.contacts = contacts or {}
+        self.enabled = enabled
+        self.min_score = min_score
+        self.min_margin = min_margin
+
+    def match(self, ranked: Optional[list[tuple[dict, float]]], channel_context: str = "") -> Optional[dict]:
+        """
+        Entree a servir directement, ou None. ranked : classement local (entree, score) des
+        meilleures entrees (None si le snapshot n'est pas utilisable). Les questions en thread
+        passent toujours par Claude (la reponse depend du contexte).
+        """
+        if not self.enabled or not ranked or channel_context:
+            return None
+
+        top, top_score = ranked[0]
+        margin = top_score - (ranked[1][1] if len(ranked) > 1 else 0.0)
+        if top_score < self.min_score or margin < self.min_margin:
+            return None
+        if (top.get("confiance") or "").lower() != "haute" or not (top.get("process") or "").strip():
+            return None
+
+        logger.info(f"Reponse directe depuis la KB : {top['name']} (top={top_score:.2f} margin={margin:.2f})")
+        return top
+
+    def render(self, entry: dict) -> str:
+        """Reponse Slack rendue depuis la fiche, terminee par le tag de confiance HAUTE."""
+        lines = [f"*{entry['name']}*"]
+        if entry.get("description"):
+            lines.append(entry["description"])
+        lines += ["", entry["process"].strip(), ""]
+
+        owners = entry.get("qui_resout") or []
+        if entry.get("action_crm"):
+            mentions = " ou ".join(self._mention(name) for name in owners) or "l'equipe RevOps"
+            lines.append(f"⚠️ *Action CRM requise* : a faire par {mentions}.")
+        elif owners:
+            lines.append(f"*Qui resout :* {', '.join(owners)}")
+
+        links = []
+        if entry.get("url"):
+            links.append(f"<{entry['url']}|Voir la fiche KB>")
+        if entry.get("lien"):
+            links.append(f"<{entry['lien']}|Process detaille>")
+        if links:
+            lines.append(" · ".join(links))
+
+        return "\n".join(lines) + "\n\n[CONFIANCE:HAUTE]"
+
+    def _mention(self, name: str) -> str:
+        slack_id = self.contacts.get(name)
+        return f"<@{slack_id}>" if slack_id else name
@@ -0,0 +1,143 @@
+"""
+Deduplication des evenements Slack et regroupement des questions identiques en cours.
+- EventDeduplicator : fenetre glissante des evenements deja traites (client_msg_id, ou
+  channel:ts). Slack peut renvoyer un evenement (retry Socket Mode), et un message qui
+  mentionne le bot dans la channel monitoree declenche a la fois `message` et `app_mention`.
+- SingleFlight / AsyncSingleFlight : les appels concurrents avec la meme cle partagent un
+  seul calcul en cours (un seul appel Claude pour N questions identiques simultanees).
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+from metrics import COALESCED_ANSWERS
+
+logger = logging.getLogger(__name__)
+
+# Duree pendant laquelle un evenement deja vu est ignore (secondes)
+EVENT_DEDUP_WINDOW = float(os.getenv("EVENT_DEDUP_WINDOW", "600"))
+# Nombre max d'evenements memorises (les plus anciens sont oublies au-dela)
+EVENT_DEDUP_MAX_SIZE = int(os.getenv("EVENT_DEDUP_MAX_SIZE", "10000"))
+
+
+def event_key(event: dict) -> str:
+    """Identifiant du message : client_msg_id (commun a `message` et `app_mention`), sinon channel:ts."""
+    return event.get("client_msg_id") or f"{event.get('channel', '')}:{event.get('ts', '')}"
+
+
+class EventDeduplicator:
+    """Memorise les evenements traites pendant `window` secondes (thread-safe)."""
+
+    def __init__(self, window: float = EVENT_DEDUP_WINDOW, max_size: int = EVENT_DEDUP_MAX_SIZE):
+        self.window = window
+        self.max_size = max_size
+        self._seen: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_duplicate(self, event: dict) -> bool:
+        """Vrai si l'evenement a deja ete vu dans la fenetre ; sinon le marque comme vu."""
+        key = event_key(event)
+        now = time.monotonic()
+        with self._lock:
+            # Insertion chronologique : les entrees expirees sont en tete
+            while self._seen:
+                oldest = next(iter(self._seen.values()))
+                if now - oldest <= self.window and len(self._seen) < self.max_size:
+                    break
+                self._seen.popitem(last=False)
+            if key in self._seen:
+                logger.info(f"Evenement Slack deja traite, ignore : {key}")
+                return True
+            self._seen[key] = now
+            return False
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+
+
+class SingleFlight:
+    """Un seul calcul en cours par cle : les appelants concurrents attendent son resultat."""
+
+    def __init__(self):
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            COALESCED_ANSWERS.inc()
+            logger.info("Question identique deja en cours de traitement : reponse partagee.")
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _LeaderCancelled(Exception):
+    """Le calcul partage a ete annule avec son appelant : un autre appelant le reprend."""
+
+
+class AsyncSingleFlight:
+    """
+    Version asyncio de SingleFlight (a utiliser depuis une seule boucle). Si l'appelant qui
+    calcule est annule, le premier appelant en attente relance le calcul pour les autres.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is not None:
+            COALESCED_ANSWERS.inc()
+            logger.info("Question identique deja en cours de traitement : reponse partagee.")
+            try:
+                # shield : l'annulation d'un appelant n'annule pas le calcul partage
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                # La cle est deja liberee : le premier repreneur devient le calculateur
+                return await self.do(key, fn)
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # Pas d'annulation propagee aux appelants en attente : ils reprennent le calcul
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Marque l'exception comme lue si personne n'attendait ce calcul
+            future.exception()
+            raise
+        finally:
+            del self._calls[key]
@@ -0,0 +1,160 @@
+"""
+Index de facettes des entrees KB : pour chaque valeur des champs select / multi-select /
+checkbox (categorie, qui resout, confiance, frequence, langue, action CRM), un bitset des
+entrees qui la portent. Un filtre combine les bitsets en une passe (OU entre les valeurs d'un
+champ, ET entre les champs) : "entrees FR de Billing en confiance Haute" coute quelques
+operations sur des entiers, sans appel Notion ni parcours du snapshot.
+Le resultat (ensemble d'ids) restreint aussi le classement texte (KBRetriever.rank).
+"""
+
+import threading
+from typing import Optional, Union
+
+# Champs indexes
+FACET_FIELDS = ("categorie", "qui_resout", "confiance", "frequence", "langue", "action_crm")
+
+# Filtre : {champ: valeur ou liste de valeurs}, ou liste de tels filtres (OU entre eux)
+Filters = Union[dict, list[dict]]
+
+
+def _value_key(value) -> str:
+    """Valeur comparee sans tenir compte de la casse (True / False pour action_crm)."""
+    return str(value).strip().lower()
+
+
+def _entry_values(entry: dict, field: str) -> list[str]:
+    value = entry.get(field)
+    if isinstance(value, (list, tuple, set)):
+        return [_value_key(v) for v in value if v]
+    if value is None or value == "":
+        return []
+    return [_value_key(value)]
+
+
+def _wanted_values(field: str, wanted) -> list[str]:
+    if field not in FACET_FIELDS:
+        raise ValueError(f"Facette inconnue : {field} (attendu : {', '.join(FACET_FIELDS)})")
+    if isinstance(wanted, (list, tuple, set, frozenset)):
+        return [_value_key(v) for v in wanted]
+    return [_value_key(wanted)]
+
+
+def entry_matches(entry: dict, filters: Filters) -> bool:
+    """Meme semantique que FacetIndex.select, pour une entree isolee (resultats lus sur Notion)."""
+    if isinstance(filters, list):
+        return any(entry_matches(entry, f) for f in filters)
+    for field, wanted in filters.items():
+        if not set(_wanted_values(field, wanted)) & set(_entry_values(entry, field)):
+            return False
+    return True
+
+
+class FacetIndex:
+    """
+    Bitsets (entiers Python) par (champ, valeur) ; chaque entree occupe un bit, les bits des
+    entrees supprimees sont reutilises. Mise a jour incrementale, thread-safe.
+    """
+
+    def __init__(self):
+        # id entree -> position du bit, et position -> id (None si libre)
+        self._slots: dict[str, int] = {}
+        self._ids: list[Optional[str]] = []
+        self._free: list[int] = []
+        # (champ, valeur) -> bitset des entrees, et bitset de toutes les entrees
+        self._bits: dict[tuple[str, str], int] = {}
+        self._all = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def rebuild(self, entries: list[dict]) -> None:
+        with self._lock:
+            self._slots, self._ids, self._free, self._bits, self._all = {}, [], [], {}, 0
+            for entry in entries:
+                self._add_locked(entry)
+
+    def add(self, entry: dict) -> None:
+        """Ajoute ou met a jour une entree."""
+        with self._lock:
+            self._remove_locked(entry["id"])
+            self._add_locked(entry)
+
+    def remove(self, entry_id: str) -> None:
+        with self._lock:
+            self._remove_locked(entry_id)
+
+    def bitset(self, filters: Filters) -> int:
+        """
+        Bitset des entrees qui passent le filtre. Dans un filtre, les valeurs d'un meme champ
+        sont combinees en OU et les champs en ET ; une liste de filtres est combinee en OU.
+        Exemple : {"langue": "FR", "categorie": "Billing", "confiance": ["Haute", "Moyenne"]}.
+        """
+        with self._lock:
+            return self._bitset_locked(filters)
+
+    def select(self, filters: Filters) -> list[str]:
+        """Ids des entrees qui passent le filtre (ordre des bits)."""
+        with self._lock:
+            return self._ids_locked(self._bitset_locked(filters))
+
+    def count(self, filters: Filters) -> int:
+        return self.bitset(filters).bit_count()
+
+    def values(self, field: str) -> dict[str, int]:
+        """Nombre d'entrees par valeur d'un champ (valeurs en minuscules)."""
+        _wanted_values(field, ())
+        with self._lock:
+            return {value: bits.bit_count() for (f, value), bits in self._bits.items() if f == field and bits}
+
+    def _bitset_locked(self, filters: Filters) -> int:
+        if isinstance(filters, list):
+            result = 0
+            for sub in filters:
+                result |= self._bitset_locked(sub)
+            return result
+
+        # Aucun champ : toutes les entrees
+        result = self._all
+        for field, wanted in filters.items():
+            union = 0
+            for value in _wanted_values(field, wanted):
+                union |= self._bits.get((field, value), 0)
+            result &= union
+            if not result:
+                break
+        return result
+
+    def _ids_locked(self, bits: int) -> list[str]:
+        ids = []
+        while bits:
+            low = bits & -bits
+            ids.append(self._ids[low.bit_length() - 1])
+            bits ^= low
+        return ids
+
+    def _add_locked(self, entry: dict) -> None:
+        slot = self._free.pop() if self._free else len(self._ids)
+        if slot == len(self._ids):
+            self._ids.append(entry["id"])
+        else:
+            self._ids[slot] = entry["id"]
+        self._slots[entry["id"]] = slot
+        bit = 1 << slot
+        self._all |= bit
+        for field in FACET_FIELDS:
+            for value in _entry_values(entry, field):
+                key = (field, value)
+                self._bits[key] = self._bits.get(key, 0) | bit
+
+    def _remove_locked(self, entry_id: str) -> None:
+        slot = self._slots.pop(entry_id, None)
+        if slot is None:
+            return
+        mask = ~(1 << slot)
+        self._all &= mask
+        for key, bits in self._bits.items():
+            self._bits[key] = bits & mask
+        self._ids[slot] = None
+        self._free.append(slot)
+
@@ -0,0 +1,149 @@
+"""
+Index inverse local de la KB avec ranking BM25.
+Construit a partir des entrees parsees par KBRetriever (_parse_single_page), tokenisees
+par le pipeline de tokenizer.py (accents replies, stemming leger), en ponderant les
+champs : un mot du titre pese plus qu'un mot de la description.
+Supporte l'ajout / la mise a jour / la suppression incrementale d'une entree.
+"""
+
+import math
+import heapq
+import threading
+from collections import Counter
+from typing import Callable, Optional
+
+# Poids des champs indexes (BM25F simplifie : tf pondere par champ)
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "mots_cles": 2.5,
+    "sous_categorie": 1.5,
+    "description": 1.0,
+}
+
+# Parametres BM25 classiques
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Version du format persiste (a incrementer si le tokenizer ou les poids changent)
+INDEX_FORMAT_VERSION = 1
+
+
+class KBIndex:
+    """Index inverse terme -> entrees, avec scoring BM25 pondere par champ."""
+
+    def __init__(self, tokenizer: Callable[[str], list[str]], field_weights: Optional[dict] = None):
+        self.tokenize = tokenizer
+        self.field_weights = field_weights or FIELD_WEIGHTS
+        # terme -> {id entree: tf pondere}
+        self._postings: dict[str, dict[str, float]] = {}
+        # id entree -> {terme: tf pondere} (pour la mise a jour incrementale)
+        self._doc_terms: dict[str, dict[str, float]] = {}
+        self._doc_len: dict[str, float] = {}
+        self._total_len = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def rebuild(self, entries: list[dict]) -> None:
+        """Reconstruit l'index complet a partir d'une liste d'entrees."""
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            self._doc_len = {}
+            self._total_len = 0.0
+            for entry in entries:
+                self._add_locked(entry)
+
+    def add(self, entry: dict) -> None:
+        """Ajoute ou met a jour une entree (remplace l'ancienne version si presente)."""
+        with self._lock:
+            self._remove_locked(entry["id"])
+            self._add_locked(entry)
+
+    def remove(self, entry_id: str) -> None:
+        """Retire une entree de l'index."""
+        with self._lock:
+            self._remove_locked(entry_id)
+
+    def to_state(self) -> dict:
+        """Etat serialisable de l'index (termes par entree ; les postings s'en deduisent)."""
+        with self._lock:
+            return {
+                "version": INDEX_FORMAT_VERSION,
+                "field_weights": self.field_weights,
+                "doc_terms": self._doc_terms,
+            }
+
+    def load_state(self, state: dict) -> bool:
+        """
+        Restaure l'index depuis to_state() sans re-tokeniser les entrees.
+        Retourne False si l'etat est incompatible (format ou poids differents).
+        """
+        if state.get("version") != INDEX_FORMAT_VERSION or state.get("field_weights") != self.field_weights:
+            return False
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            self._doc_len = {}
+            self._total_len = 0.0
+            for doc_id, terms in state.get("doc_terms", {}).items():
+                self._doc_terms[doc_id] = terms
+                self._doc_len[doc_id] = sum(terms.values())
+                self._total_len += self._doc_len[doc_id]
+                for term, tf in terms.items():
+                    self._postings.setdefault(term, {})[doc_id] = tf
+        return True
+
+    def search(
+        self, terms: list[str], max_results: int = 8, allowed: Optional[set[str]] = None
+    ) -> list[tuple[str, float]]:
+        """
+        Score BM25 des entrees pour les termes de la requete (restreint aux ids `allowed` si fourni).
+        Retourne les (id entree, score) tries par score decroissant, scores > 0 uniquement.
+        """
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs or 1.0
+
+            scores: dict[str, float] = {}
+            for term in dict.fromkeys(terms):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf in postings.items():
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        return heapq.nlargest(max_results, scores.items(), key=lambda item: item[1])
+
+    def _add_locked(self, entry: dict) -> None:
+        terms: Counter = Counter()
+        for field, weight in self.field_weights.items():
+            for token in self.tokenize(entry.get(field) or ""):
+                terms[token] += weight
+
+        doc_id = entry["id"]
+        self._doc_terms[doc_id] = dict(terms)
+        self._doc_len[doc_id] = sum(terms.values())
+        self._total_len += self._doc_len[doc_id]
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+    def _remove_locked(self, entry_id: str) -> None:
+        terms = self._doc_terms.pop(entry_id, None)
+        if terms is None:
+            return
+        self._total_len -= self._doc_len.pop(entry_id, 0.0)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(entry_id, None)
+                if not postings:
+                    del self._postings[term]
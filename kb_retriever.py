@@ -5,120 +5,661 @@ Permet aussi de creer des entrees placeholder quand le bot ne connait pas la rep
 """
 
 import os
+import time
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from typing import Optional
 from datetime import datetime
-from notion_client import Client as NotionClient
+from facet_index import FACET_FIELDS, FacetIndex, Filters, entry_matches
+from kb_index import KBIndex
+from kb_store import KB_STORE_PATH, KBStore
+from metrics import KB_SNAPSHOT_SYNCED
+from near_duplicate import PLACEHOLDER_DESCRIPTION_PREFIX, NearDuplicateIndex
+from notion_transport import NotionTransport, create_notion_client
+from prompt_builder import NO_ENTRY_MESSAGE, format_entry
+from tokenizer import STOP_WORDS, analyze, fold_accents
+from vector_index import VectorIndex
 
 logger = logging.getLogger(__name__)
 
 # ID de la database KB dans Notion
 KB_DATABASE_ID = os.getenv("NOTION_KB_DATABASE_ID", "9a6fb1778ff040d0a28279e32fe91ff2")
-
-# Mots vides a ignorer dans la recherche
-STOP_WORDS = {
-    # Francais courant
-    "comment", "faire", "pour", "dans", "avec", "sans", "entre", "cette",
-    "sont", "sera", "suis", "etre", "avoir", "fait", "faut", "peut",
-    "dois", "doit", "veux", "veut", "quel", "quelle", "quels", "quelles",
-    "quand", "combien", "pourquoi", "quel", "aussi", "bien", "comme",
-    "plus", "moins", "tres", "tout", "tous", "toute", "toutes",
-    "mais", "donc", "encore", "depuis", "avant", "apres", "pendant",
-    "voici", "voila", "autre", "autres", "meme", "notre", "votre", "leur",
-    "chez", "vers", "sous", "dessus", "dessous",
-    # Determinants et pronoms
-    "elle", "elles", "nous", "vous", "ils", "leur", "leurs",
-    "celui", "celle", "ceux", "celles",
-    # Formulations de demande
-    "possible", "besoin", "bonjour", "hello", "salut", "merci",
-    "svp", "equipe", "team", "quelqu",
-    # Anglais courant
-    "what", "when", "where", "which", "that", "this", "from",
-    "have", "will", "been", "would", "could", "should",
-    "about", "there", "their", "them", "they", "some",
+# URL de l'API Notion (surchargeable pour les benchmarks / serveurs de test)
+NOTION_BASE_URL = os.getenv("NOTION_BASE_URL", "https://api.notion.com")
+
+# Snapshot en memoire de la KB : intervalle de rafraichissement (secondes)
+KB_REFRESH_INTERVAL = int(os.getenv("KB_REFRESH_INTERVAL", "300"))
+# Age maximum du snapshot au-dela duquel on repasse sur Notion en direct (secondes)
+KB_MAX_STALENESS = int(os.getenv("KB_MAX_STALENESS", "1800"))
+# Nombre de refresh incrementaux avant une resynchronisation complete
+# (les deltas last_edited_time ne voient pas les pages supprimees/archivees)
+KB_FULL_RESYNC_EVERY = int(os.getenv("KB_FULL_RESYNC_EVERY", "12"))
+
+# Recherche Notion en parallele (quand le snapshot n'est pas utilisable)
+KB_PARALLEL_SEARCH = os.getenv("KB_PARALLEL_SEARCH", "true").lower() in ("1", "true", "yes")
+# Deadline globale de la recherche parallele (secondes)
+KB_SEARCH_DEADLINE = float(os.getenv("KB_SEARCH_DEADLINE", "4"))
+
+# Corps des pages (blocks) charges a la demande pour les entrees envoyees a Claude
+KB_FETCH_PAGE_BODIES = os.getenv("KB_FETCH_PAGE_BODIES", "true").lower() in ("1", "true", "yes")
+# Nombre d'entrees (les mieux classees) dont on charge le corps
+KB_PAGE_BODY_TOP_N = int(os.getenv("KB_PAGE_BODY_TOP_N", "3"))
+# Attente max des corps de page (secondes) ; les lectures en retard continuent en fond
+KB_PAGE_BODY_DEADLINE = float(os.getenv("KB_PAGE_BODY_DEADLINE", "1.5"))
+# Lecture en tache de fond (apres chaque rafraichissement) des corps absents ou perimes
+KB_PREFETCH_PAGE_BODIES = os.getenv("KB_PREFETCH_PAGE_BODIES", "true").lower() in ("1", "true", "yes")
+
+# Recherche hybride : poids de la similarite vectorielle (n-grammes) face au score BM25 normalise
+KB_VECTOR_WEIGHT = float(os.getenv("KB_VECTOR_WEIGHT", "0.4"))
+# Similarite vectorielle minimale pour qu'une entree sans mot commun avec la question soit retenue
+KB_VECTOR_MIN_SCORE = float(os.getenv("KB_VECTOR_MIN_SCORE", "0.25"))
+
+# Proprietes Notion des facettes (champ parse -> (propriete, type)) pour les requetes sans snapshot
+_FACET_PROPERTIES = {
+    "categorie": ("Catégorie", "select"),
+    "qui_resout": ("Qui résout", "multi_select"),
+    "confiance": ("Niveau de confiance", "select"),
+    "frequence": ("Fréquence", "select"),
+    "langue": ("Langue", "select"),
+    "action_crm": ("Action CRM requise", "checkbox"),
 }
+# Imbrication maximale des filtres composes acceptee par l'API Notion
+_NOTION_MAX_FILTER_DEPTH = 2
 
+# Pool partage pour les recherches Notion paralleles
+_SEARCH_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("KB_SEARCH_WORKERS", "6")), thread_name_prefix="kb-search")
 
-class KBRetriever:
-    """Recupere les entrees pertinentes de la KB Notion."""
 
-    def __init__(self, notion_token: Optional[str] = None):
+class KBRetriever:
+    """
+    Recupere les entrees pertinentes de la KB Notion.
+    Maintient un snapshot en memoire de toute la database (rafraichi en tache de fond
+    via les deltas last_edited_time) et sert les lectures localement tant qu'il est frais.
+    Si le snapshot est absent ou trop vieux, les lectures repassent sur l'API Notion.
+    """
+
+    def __init__(
+        self,
+        notion_token: Optional[str] = None,
+        use_snapshot: bool = True,
+        store_path: Optional[str] = KB_STORE_PATH,
+    ):
         token = notion_token or os.getenv("NOTION_API_TOKEN")
         if not token:
             raise ValueError("NOTION_API_TOKEN requis")
-        self.notion = NotionClient(auth=token)
+        self.notion = create_notion_client(token, NOTION_BASE_URL)
+        # Debit, retries et disjoncteur partages par tous les appels Notion
+        self.transport = NotionTransport()
         self.db_id = KB_DATABASE_ID
 
-    def search_by_keywords(self, query: str, max_results: int = 8) -> list[dict]:
+        # Snapshot en memoire : id de page -> entree parsee
+        self.use_snapshot = use_snapshot
+        self.max_staleness = KB_MAX_STALENESS
+        self._snapshot: dict[str, dict] = {}
+        self.index = KBIndex(tokenizer=analyze)
+        # Vecteurs TF-IDF des entrees pour l'anti-doublon des fiches placeholder
+        self.duplicates = NearDuplicateIndex()
+        # Matrice NumPy des vecteurs n-grammes (paraphrases que BM25 ne voit pas)
+        self.vectors = VectorIndex()
+        # Bitsets des valeurs de select / multi-select / checkbox (filtres sans parcours du snapshot)
+        self.facets = FacetIndex()
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_refreshed_at: Optional[float] = None
+        # Incremente a chaque modification du contenu du snapshot (invalidation des caches derives)
+        self.snapshot_version = 0
+        self._last_edited_cursor = ""
+        self._refreshes_since_full = 0
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._stop_refresh = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+
+        # Corps des pages deja charges : id de page -> (last_edited_time, texte)
+        self._page_bodies: dict[str, tuple[str, str]] = {}
+        # Lectures en cours (une seule par page, partagee entre questions simultanees)
+        self._page_body_fetches: dict[str, Future] = {}
+        self._page_bodies_lock = threading.Lock()
+
+        # Persistance locale du snapshot (redemarrage sans Notion)
+        self.store: Optional[KBStore] = None
+        if use_snapshot and store_path:
+            try:
+                self.store = KBStore(store_path)
+            except Exception as e:
+                logger.warning(f"Stockage local du snapshot KB indisponible: {e}")
+
+    # ------------------------------------------------------------------
+    # Snapshot en memoire
+    # ------------------------------------------------------------------
+
+    def load_from_store(self) -> bool:
+        """
+        Charge le snapshot persiste sur disque (entrees + index), sans appel Notion.
+        Le snapshot est servi immediatement ; il doit ensuite etre reconcilie avec Notion
+        (start_background_refresh(refresh_now=True)).
+        Retourne False si aucun snapshot local n'est disponible.
+        """
+        if not self.store:
+            return False
+        try:
+            entries, meta = self.store.load()
+        except Exception as e:
+            logger.warning(f"Lecture du snapshot KB local echouee: {e}")
+            return False
+        if not entries:
+            return False
+
+        with self._snapshot_lock:
+            self._snapshot = {e["id"]: e for e in entries}
+        try:
+            page_bodies = self.store.load_page_bodies()
+        except Exception as e:
+            logger.warning(f"Lecture des corps de page locaux echouee: {e}")
+            page_bodies = {}
+        with self._page_bodies_lock:
+            self._page_bodies.update(page_bodies)
+        if not self.index.load_state(meta.get("index", {})):
+            self.index.rebuild(entries)
+        self.duplicates.rebuild(entries)
+        self.vectors.rebuild(entries)
+        self.facets.rebuild(entries)
+        self._last_edited_cursor = meta.get("cursor", "")
+        # Age reel du snapshot (derniere synchronisation avec Notion avant l'arret) : un snapshot
+        # sauvegarde il y a plus de KB_MAX_STALENESS n'est pas servi comme frais
+        saved_at = meta.get("saved_at")
+        age = max(0.0, time.time() - saved_at) if saved_at else float("inf")
+        self._snapshot_refreshed_at = time.monotonic() - age
+        if saved_at:
+            KB_SNAPSHOT_SYNCED.set(saved_at)
+        self.snapshot_version += 1
+
+        logger.info(f"Snapshot KB local charge : {len(entries)} entree(s), synchronise il y a {age:.0f}s")
+        if not self.is_snapshot_fresh():
+            logger.warning(
+                f"Snapshot KB local perime ({age:.0f}s > {self.max_staleness}s) : lectures sur Notion "
+                "jusqu'au prochain rafraichissement"
+            )
+        return True
+
+    def _is_known_locked(self, entry: dict) -> bool:
+        """Entree deja dans le snapshot avec le meme last_edited_time."""
+        known = self._snapshot.get(entry["id"])
+        return known is not None and known.get("last_edited_time") == entry.get("last_edited_time")
+
+    def _persist(self, entries: list[dict], full: bool) -> None:
+        """Ecrit les entrees modifiees (ou tout le snapshot) sur disque."""
+        if not self.store:
+            return
+        try:
+            if full:
+                self.store.save_all(entries, self._last_edited_cursor, self.index.to_state())
+            elif entries:
+                self.store.upsert(entries, self._last_edited_cursor, self.index.to_state())
+            else:
+                # Rien a reecrire, mais la date de synchronisation sert a l'age au redemarrage
+                self.store.mark_synced(self._last_edited_cursor)
+        except Exception as e:
+            logger.warning(f"Sauvegarde du snapshot KB local echouee: {e}")
+
+    def refresh_snapshot(self, full: bool = False) -> bool:
+        """
+        Rafraichit le snapshot de la KB.
+        Chargement complet au premier appel (ou si full=True, ou toutes les
+        KB_FULL_RESYNC_EVERY iterations), sinon uniquement les pages modifiees
+        depuis le dernier last_edited_time vu.
+        Retourne True si le snapshot est a jour.
+        """
+        full = full or not self._last_edited_cursor or self._refreshes_since_full >= KB_FULL_RESYNC_EVERY
+
+        try:
+            if full:
+                entries = self.get_all_entries()
+                with self._snapshot_lock:
+                    changed = len(entries) != len(self._snapshot) or not all(map(self._is_known_locked, entries))
+                    if changed:
+                        self._snapshot = {e["id"]: e for e in entries}
+                self._refreshes_since_full = 0
+                if changed:
+                    self.index.rebuild(entries)
+                    self.duplicates.rebuild(entries)
+                    self.vectors.rebuild(entries)
+                    self.facets.rebuild(entries)
+                    self.snapshot_version += 1
+                    logger.info(f"Snapshot KB charge : {len(entries)} entree(s)")
+                else:
+                    # Resynchronisation sans changement : version, index et stockage inchanges
+                    entries = []
+                    full = False
+            else:
+                edited = self._query_all({
+                    "timestamp": "last_edited_time",
+                    "last_edited_time": {"on_or_after": self._last_edited_cursor},
+                })
+                with self._snapshot_lock:
+                    # on_or_after renvoie toujours les dernieres pages deja vues : seules les
+                    # entrees nouvelles ou modifiees depuis comptent comme un changement
+                    entries = [e for e in edited if not self._is_known_locked(e)]
+                    for entry in entries:
+                        self._snapshot[entry["id"]] = entry
+                for entry in entries:
+                    self.index.add(entry)
+                    self.duplicates.add(entry)
+                    self.vectors.add(entry)
+                    self.facets.add(entry)
+                # IDF des vecteurs recalcules ici (thread de rafraichissement), pas a la question
+                self.vectors.reweight()
+                self._refreshes_since_full += 1
+                if entries:
+                    self.snapshot_version += 1
+                    logger.info(f"Snapshot KB : {len(entries)} entree(s) modifiee(s)")
+        except Exception as e:
+            self._count("refresh_errors")
+            logger.warning(f"Rafraichissement du snapshot KB echoue: {e}")
+            return False
+
+        with self._snapshot_lock:
+            edited = [e.get("last_edited_time", "") for e in self._snapshot.values()]
+        self._last_edited_cursor = max([self._last_edited_cursor, *edited])
+        self._snapshot_refreshed_at = time.monotonic()
+        KB_SNAPSHOT_SYNCED.set(time.time())
+        self._count("refreshes")
+        self._persist(entries, full)
+        return True
+
+    def start_background_refresh(self, interval: Optional[int] = None, refresh_now: bool = False) -> None:
+        """
+        Lance le rafraichissement periodique du snapshot dans un thread daemon.
+        refresh_now=True fait d'abord un rechargement complet (reconciliation apres un
+        demarrage sur le snapshot local).
+        """
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        interval = interval or KB_REFRESH_INTERVAL
+        self._stop_refresh.clear()
+
+        def _loop():
+            if refresh_now:
+                self.refresh_snapshot(full=True)
+            self.prefetch_page_bodies()
+            while not self._stop_refresh.wait(interval):
+                self.refresh_snapshot()
+                self.prefetch_page_bodies()
+
+        self._refresh_thread = threading.Thread(target=_loop, name="kb-snapshot-refresh", daemon=True)
+        self._refresh_thread.start()
+        logger.info(f"Rafraichissement du snapshot KB toutes les {interval}s")
+
+    def stop_background_refresh(self) -> None:
+        """Arrete le thread de rafraichissement."""
+        self._stop_refresh.set()
+
+    def snapshot_age(self) -> Optional[float]:
+        """Age du snapshot en secondes (None si jamais charge)."""
+        if self._snapshot_refreshed_at is None:
+            return None
+        return time.monotonic() - self._snapshot_refreshed_at
+
+    def is_snapshot_fresh(self) -> bool:
+        """Le snapshot est-il charge et plus recent que la borne de fraicheur ?"""
+        age = self.snapshot_age()
+        return self.use_snapshot and age is not None and age <= self.max_staleness
+
+    def get_snapshot_entries(self) -> list[dict]:
+        """Retourne une copie de la liste des entrees du snapshot."""
+        with self._snapshot_lock:
+            return list(self._snapshot.values())
+
+    def get_entry(self, entry_id: str) -> Optional[dict]:
+        """Retourne une entree du snapshot par id de page."""
+        with self._snapshot_lock:
+            return self._snapshot.get(entry_id)
+
+    def should_use_snapshot(self) -> bool:
+        """
+        Les lectures doivent-elles etre servies localement ? Oui si le snapshot est frais,
+        ou s'il est perime mais que Notion est indisponible (disjoncteur ouvert).
+        """
+        if self.is_snapshot_fresh():
+            return True
+        return self.use_snapshot and self.snapshot_age() is not None and self.transport.breaker.is_open()
+
+    def _serve_from_snapshot(self) -> bool:
+        """Decide si une lecture est servie par le snapshot et compte hit/miss."""
+        if self.should_use_snapshot():
+            self._count("hits")
+            return True
+        self._count("misses")
+        return False
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    # ------------------------------------------------------------------
+    # Corps des pages (charge a la demande)
+    # ------------------------------------------------------------------
+
+    def with_page_bodies(self, entries: list[dict], deadline: Optional[float] = None) -> list[dict]:
+        """
+        Retourne des copies des entrees avec leur corps de page ("body"). Les corps sont caches
+        (en memoire et dans le stockage local) par last_edited_time et lus en tache de fond
+        apres chaque rafraichissement : Notion n'est appele, en parallele, qu'en cas d'absence.
+        Une page trop lente (deadline) ou en erreur est renvoyee sans corps ; sa lecture
+        continue en fond et profitera aux questions suivantes.
+        """
+        deadline = KB_PAGE_BODY_DEADLINE if deadline is None else deadline
+        futures = {}
+        results = []
+        for entry in entries:
+            body = self._cached_page_body(entry)
+            if body is None:
+                futures[entry["id"]] = self._page_body_future(entry)
+            results.append(dict(entry, body=body or ""))
+
+        if futures:
+            _, not_done = wait(futures.values(), timeout=deadline)
+            for entry in results:
+                future = futures.get(entry["id"])
+                if future is not None and future not in not_done and future.exception() is None:
+                    entry["body"] = future.result()
+        return results
+
+    def prefetch_page_bodies(self) -> int:
+        """
+        Lit les corps de page absents du cache ou perimes (last_edited_time change), une page
+        a la fois : les questions suivantes trouvent le corps en cache, sans appel Notion.
+        S'arrete si le disjoncteur s'ouvre ou si le rafraichissement est arrete.
+        Retourne le nombre de pages lues.
+        """
+        if not (KB_FETCH_PAGE_BODIES and KB_PREFETCH_PAGE_BODIES):
+            return 0
+        fetched = 0
+        for entry in self.get_snapshot_entries():
+            if self._stop_refresh.is_set() or self.transport.breaker.is_open():
+                break
+            if self._cached_page_body(entry) is None:
+                # Mutualisee avec une lecture a la demande deja en cours pour la meme page
+                self._page_body_future(entry).exception()
+                fetched += 1
+        if fetched:
+            logger.info(f"Corps de page : {fetched} page(s) lue(s) en tache de fond")
+        return fetched
+
+    def _page_body_future(self, entry: dict) -> Future:
+        """Lecture du corps d'une page, mutualisee si elle est deja en cours."""
+        with self._page_bodies_lock:
+            future = self._page_body_fetches.get(entry["id"])
+            if future is not None:
+                return future
+            future = _SEARCH_POOL.submit(self._fetch_page_body, entry)
+            self._page_body_fetches[entry["id"]] = future
+
+        def _done(f: Future, page_id: str = entry["id"]) -> None:
+            with self._page_bodies_lock:
+                if self._page_body_fetches.get(page_id) is f:
+                    del self._page_body_fetches[page_id]
+
+        future.add_done_callback(_done)
+        return future
+
+    def _cached_page_body(self, entry: dict) -> Optional[str]:
+        with self._page_bodies_lock:
+            cached = self._page_bodies.get(entry["id"])
+        if cached and cached[0] == entry.get("last_edited_time", ""):
+            return cached[1]
+        return None
+
+    def _fetch_page_body(self, entry: dict) -> str:
+        """Lit les blocs de premier niveau d'une page (pagination) et les convertit en texte."""
+        lines = []
+        start_cursor = None
+        numbered = 0
+        while True:
+            kwargs = {"block_id": entry["id"], "page_size": 100}
+            if start_cursor:
+                kwargs["start_cursor"] = start_cursor
+            try:
+                response = self._notion_call("blocks.children.list", self.notion.blocks.children.list, **kwargs)
+            except Exception as e:
+                logger.warning(f"Lecture du corps de la page {entry['id']} echouee: {e}")
+                return ""
+            for block in response.get("results", []):
+                numbered = numbered + 1 if block.get("type") == "numbered_list_item" else 0
+                line = _block_to_text(block, numbered)
+                if line:
+                    lines.append(line)
+            if not response.get("has_more"):
+                break
+            start_cursor = response.get("next_cursor")
+
+        body = "\n".join(lines)
+        edited = entry.get("last_edited_time", "")
+        with self._page_bodies_lock:
+            self._page_bodies[entry["id"]] = (edited, body)
+        if self.store:
+            try:
+                self.store.save_page_body(entry["id"], edited, body)
+            except Exception as e:
+                logger.warning(f"Sauvegarde du corps de la page {entry['id']} echouee: {e}")
+        return body
+
+    # ------------------------------------------------------------------
+    # Recherche
+    # ------------------------------------------------------------------
+
+    def search_by_keywords(self, query: str, max_results: int = 8, filters: Optional[Filters] = None) -> list[dict]:
         """
         Recherche dans la KB par mots-cles.
         Strategie : recherche dans les champs Mots-cles, Description, et Name.
-        Retourne les entrees les plus pertinentes.
+        Retourne les entrees les plus pertinentes, restreintes aux facettes `filters` si fourni
+        (cf. facet_index.py ; sans snapshot, le filtre est combine a la requete Notion).
         """
-        results = []
+        if self._serve_from_snapshot():
+            return self._search_snapshot(query, max_results, filters)
+        return self._search_notion(query, max_results, filters)
+
+    def rank(self, query: str, max_results: int = 8, filters: Optional[Filters] = None) -> list[tuple[dict, float]]:
+        """
+        Classement hybride local des entrees du snapshot pour une question : score BM25
+        (normalise par le meilleur score) fusionne avec la similarite cosinus des vecteurs
+        n-grammes, ponderee par KB_VECTOR_WEIGHT. Une entree sans mot commun avec la question
+        n'est retenue que si sa similarite vectorielle atteint KB_VECTOR_MIN_SCORE.
+        Avec `filters`, seules les entrees qui passent le filtre de facettes sont scorees.
+        Retourne les (entree, score) tries par pertinence decroissante.
+        """
+        allowed = None
+        if filters:
+            allowed = set(self.facets.select(filters))
+            if not allowed:
+                return []
+        terms = analyze(query, drop_stop_words=True) or analyze(query)
+        # Candidats elargis : le classement final peut differer de chacun des deux
+        bm25 = dict(self.index.search(terms, max_results * 2, allowed))
+        similar = dict(self.vectors.search(query, max_results * 2, allowed=allowed)) if KB_VECTOR_WEIGHT > 0 else {}
+
+        best_bm25 = max(bm25.values(), default=0.0) or 1.0
+        scores = {}
+        for entry_id in bm25.keys() | similar.keys():
+            similarity = similar.get(entry_id, 0.0)
+            if entry_id not in bm25 and similarity < KB_VECTOR_MIN_SCORE:
+                continue
+            scores[entry_id] = (1 - KB_VECTOR_WEIGHT) * bm25.get(entry_id, 0.0) / best_bm25 + KB_VECTOR_WEIGHT * similarity
+
+        ranked = []
+        for entry_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+            entry = self.get_entry(entry_id)
+            if entry:
+                ranked.append((entry, score))
+            if len(ranked) >= max_results:
+                break
+        return ranked
+
+    def _search_snapshot(self, query: str, max_results: int, filters: Optional[Filters] = None) -> list[dict]:
+        """Recherche locale dans le snapshot via l'index inverse (top-k BM25)."""
+        return [entry for entry, _ in self.rank(query, max_results, filters)]
+
+    def _search_notion(self, query: str, max_results: int, filters: Optional[Filters] = None) -> list[dict]:
+        """Recherche en direct via l'API Notion (filtre sur la database puis recherche globale)."""
+        results = self._query_notion_filter(query, max_results, filters)
+
+        # Si pas assez de resultats, fallback sur la recherche globale (non filtrable cote Notion)
+        if len(results) < 3:
+            extra = self._search_notion_global(query, max_results)
+            if filters:
+                extra = [entry for entry in extra if entry_matches(entry, filters)]
+            results = _merge_unique(results, extra)
+
+        return results[:max_results]
+
+    def search_parallel(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        max_results: int = 8,
+        deadline: Optional[float] = None,
+    ) -> list[dict]:
+        """
+        Lance en parallele les trois strategies Notion (filtre mots-cles, recherche globale,
+        categorie) et fusionne les resultats par id de page, dans le meme ordre de priorite
+        que la recherche sequentielle. Les requetes qui depassent la deadline sont ignorees.
+        La latence devient max() des appels au lieu de leur somme.
+        """
+        self._count("misses")
+        deadline = KB_SEARCH_DEADLINE if deadline is None else deadline
 
+        futures = {
+            "keywords": _SEARCH_POOL.submit(self._query_notion_filter, query, max_results),
+            "global": _SEARCH_POOL.submit(self._search_notion_global, query, max_results),
+        }
+        if category:
+            futures["category"] = _SEARCH_POOL.submit(self._query_notion_facets, {"categorie": category}, 5)
+
+        _, not_done = wait(futures.values(), timeout=deadline)
+        for future in not_done:
+            # Annule si pas encore demarree ; sinon le resultat sera simplement ignore
+            future.cancel()
+        if not_done:
+            late = [name for name, f in futures.items() if f in not_done]
+            logger.warning(f"Recherche KB : deadline de {deadline}s depassee pour {late}")
+
+        def _result(name: str) -> list[dict]:
+            future = futures.get(name)
+            if future is None or future in not_done:
+                return []
+            return future.result()
+
+        results = _result("keywords")
+        if len(results) < 3:
+            results = _merge_unique(results, _result("global"))
+        if len(results) < 2:
+            results = _merge_unique(results, _result("category"))
+        return results[:max_results]
+
+    def _query_notion_filter(self, query: str, max_results: int, filters: Optional[Filters] = None) -> list[dict]:
+        """
+        Requete filtree (contains) sur Name / Mots-cles / Description de la database.
+        Les facettes `filters` sont combinees au filtre texte (ET) dans la meme requete ; si le
+        filtre compose depasse l'imbrication acceptee par Notion, elles s'appliquent aux resultats.
+        """
+        notion_filter = self._build_text_filter(query)
+        if filters:
+            combined = _and_filters(notion_filter, _notion_facet_filter(filters))
+            if _filter_depth(combined) <= _NOTION_MAX_FILTER_DEPTH:
+                notion_filter = combined
+            else:
+                logger.info("Filtre de facettes trop imbrique pour Notion, applique aux resultats")
         try:
-            # Recherche directe dans la database
-            response = self.notion.databases.query(
+            response = self._notion_call(
+                "databases.query",
+                self.notion.databases.query,
                 database_id=self.db_id,
-                filter=self._build_text_filter(query),
+                filter=notion_filter,
                 page_size=max_results,
             )
-            results.extend(self._parse_pages(response.get("results", [])))
+            results = self._parse_pages(response.get("results", []))
+            # Notion compare les selects avec la casse : meme semantique que l'index local
+            return [entry for entry in results if entry_matches(entry, filters)] if filters else results
         except Exception as e:
             logger.warning(f"Recherche par filtre echouee: {e}")
+            return []
 
-        # Si pas assez de resultats, fallback sur la recherche globale
-        if len(results) < 3:
-            try:
-                # Utiliser les mots significatifs pour la recherche globale
-                search_query = " ".join(self._extract_significant_words(query)[:3])
-                if not search_query:
-                    search_query = query
-
-                response = self.notion.search(
-                    query=search_query,
-                    filter={"value": "page", "property": "object"},
-                    page_size=max_results,
-                )
-                for page in response.get("results", []):
-                    if page.get("parent", {}).get("database_id", "").replace("-", "") == self.db_id.replace("-", ""):
-                        parsed = self._parse_single_page(page)
-                        if parsed and parsed["name"] not in [r["name"] for r in results]:
-                            results.append(parsed)
-            except Exception as e:
-                logger.warning(f"Recherche globale echouee: {e}")
-
-        return results[:max_results]
+    def _search_notion_global(self, query: str, max_results: int) -> list[dict]:
+        """Recherche globale Notion, restreinte aux pages de la database KB."""
+        try:
+            # Utiliser les mots significatifs pour la recherche globale
+            search_query = " ".join(self._extract_significant_words(query)[:3])
+            if not search_query:
+                search_query = query
+
+            response = self._notion_call(
+                "search",
+                self.notion.search,
+                query=search_query,
+                filter={"value": "page", "property": "object"},
+                page_size=max_results,
+            )
+            results = []
+            for page in response.get("results", []):
+                if page.get("parent", {}).get("database_id", "").replace("-", "") == self.db_id.replace("-", ""):
+                    parsed = self._parse_single_page(page)
+                    if parsed:
+                        results.append(parsed)
+            return results
+        except Exception as e:
+            logger.warning(f"Recherche globale echouee: {e}")
+            return []
 
     def search_by_category(self, category: str, max_results: int = 10) -> list[dict]:
         """Recherche toutes les entrees d'une categorie donnee."""
+        return self.search_by_facets({"categorie": category}, max_results)
+
+    def search_by_facets(self, filters: Filters, max_results: int = 10) -> list[dict]:
+        """
+        Entrees qui passent un filtre de facettes, ex : {"langue": "FR", "categorie": "Billing",
+        "confiance": "Haute"} (cf. FacetIndex.bitset). Lu dans les bitsets du snapshot, sinon
+        une seule requete Notion avec le filtre compose equivalent.
+        """
+        if self._serve_from_snapshot():
+            entries = (self.get_entry(entry_id) for entry_id in self.facets.select(filters))
+            return [entry for entry in entries if entry][:max_results]
+        return self._query_notion_facets(filters, max_results)
+
+    def _query_notion_facets(self, filters: Filters, max_results: int) -> list[dict]:
+        """Requete Notion sur les proprietes des facettes (resultats reverifies localement)."""
         try:
-            response = self.notion.databases.query(
+            notion_filter = _notion_facet_filter(filters)
+            response = self._notion_call(
+                "databases.query",
+                self.notion.databases.query,
                 database_id=self.db_id,
-                filter={
-                    "property": "Catégorie",
-                    "select": {"equals": category},
-                },
                 page_size=max_results,
+                **({"filter": notion_filter} if notion_filter else {}),
             )
-            return self._parse_pages(response.get("results", []))
+            # Notion compare les selects avec la casse : meme semantique que l'index local
+            return [e for e in self._parse_pages(response.get("results", [])) if entry_matches(e, filters)]
         except Exception as e:
-            logger.error(f"Erreur recherche par categorie: {e}")
+            logger.error(f"Erreur recherche par facettes: {e}")
             return []
 
     def get_all_entries(self) -> list[dict]:
         """Recupere toutes les entrees de la KB (pour le cache)."""
+        return self._query_all()
+
+    def _query_all(self, notion_filter: Optional[dict] = None) -> list[dict]:
+        """Parcourt toutes les pages de la database (pagination), avec un filtre optionnel."""
         all_entries = []
         has_more = True
         start_cursor = None
 
         while has_more:
             kwargs = {"database_id": self.db_id, "page_size": 100}
+            if notion_filter:
+                kwargs["filter"] = notion_filter
             if start_cursor:
                 kwargs["start_cursor"] = start_cursor
 
-            response = self.notion.databases.query(**kwargs)
+            response = self._notion_call("databases.query", self.notion.databases.query, **kwargs)
             all_entries.extend(self._parse_pages(response.get("results", [])))
             has_more = response.get("has_more", False)
             start_cursor = response.get("next_cursor")
@@ -128,8 +669,17 @@ class KBRetriever:
     def check_similar_entry_exists(self, question: str) -> bool:
         """
         Verifie si une entree similaire existe deja dans la KB avant d'en creer une nouvelle.
-        Cherche par mots significatifs dans le titre.
+        Similarite TF-IDF locale (nom + description + mots-cles) avec les entrees du snapshot
+        et les fiches en attente de creation. Sans snapshot charge, cherche par mots
+        significatifs dans les titres Notion.
         """
+        if len(self.duplicates):
+            match = self.duplicates.find(question)
+            if match:
+                entry = self.get_entry(match[0]) or {}
+                logger.info(f"Entree similaire trouvee (similarite {match[1]:.2f}): {entry.get('name', match[0])}")
+            return match is not None
+
         keywords = self._extract_significant_words(question)[:2]
         if not keywords:
             return False
@@ -149,7 +699,9 @@ class KBRetriever:
             else:
                 notion_filter = {"and": filters}
 
-            response = self.notion.databases.query(
+            response = self._notion_call(
+                "databases.query",
+                self.notion.databases.query,
                 database_id=self.db_id,
                 filter=notion_filter,
                 page_size=3,
@@ -182,7 +734,7 @@ class KBRetriever:
                 "title": [{"text": {"content": title}}]
             },
             "Description": {
-                "rich_text": [{"text": {"content": f"Question posee sur Slack : {question}"}}]
+                "rich_text": [{"text": {"content": f"{PLACEHOLDER_DESCRIPTION_PREFIX}{question}"}}]
             },
             "Process de résolution": {
                 "rich_text": [{"text": {"content": "⚠️ À COMPLÉTER — Process non documenté"}}]
@@ -211,11 +763,25 @@ class KBRetriever:
         }
 
         try:
-            response = self.notion.pages.create(
+            response = self._notion_call(
+                "pages.create",
+                self.notion.pages.create,
+                idempotent=False,
                 parent={"database_id": self.db_id},
                 properties=properties,
             )
             logger.info(f"Entree KB placeholder creee : {title}")
+            # Rendre la nouvelle entree visible tout de suite (anti-doublon local)
+            parsed = self._parse_single_page(response)
+            if parsed:
+                with self._snapshot_lock:
+                    self._snapshot[parsed["id"]] = parsed
+                self.index.add(parsed)
+                self.duplicates.add(parsed)
+                self.vectors.add(parsed)
+                self.facets.add(parsed)
+                self.snapshot_version += 1
+                self._persist([parsed], full=False)
             return {
                 "id": response["id"],
                 "url": response.get("url", ""),
@@ -226,22 +792,26 @@ class KBRetriever:
             logger.error(f"Erreur creation entree KB : {e}")
             return None
 
+    def _notion_call(self, operation: str, fn, idempotent: bool = True, **kwargs) -> dict:
+        """Appel a l'API Notion via le transport (limiteur, retries, disjoncteur, metriques)."""
+        return self.transport.call(operation, fn, idempotent=idempotent, **kwargs)
+
     def _extract_significant_words(self, text: str) -> list[str]:
-        """Extrait les mots significatifs d'un texte (filtre les stop words)."""
+        """
+        Extrait les mots significatifs d'un texte (filtre les stop words).
+        Les mots gardent leurs accents (filtres Notion "contains") ; la comparaison
+        aux stop words se fait sans accents ("très" == "tres").
+        """
         # Nettoyer la ponctuation
         clean = text.lower()
         for char in "?!.,;:()[]{}\"'/-–—":
             clean = clean.replace(char, " ")
 
         words = clean.split()
-        return [w for w in words if len(w) > 2 and w not in STOP_WORDS][:6]
+        return [w for w in words if len(w) > 2 and fold_accents(w) not in STOP_WORDS][:6]
 
-    def _build_text_filter(self, query: str) -> dict:
-        """
-        Construit un filtre OR sur les champs textuels.
-        Cherche dans : Name, Mots-cles, Description, Sous-categorie.
-        Utilise les mots significatifs (pas les stop words).
-        """
+    def _search_keywords(self, query: str) -> list[str]:
+        """Mots-cles utilises pour la recherche (locale ou Notion)."""
         keywords = self._extract_significant_words(query)[:4]
 
         # Fallback : si aucun mot significatif, prendre les mots de + de 2 chars
@@ -252,6 +822,15 @@ class KBRetriever:
         if not keywords:
             keywords = [query.lower()[:20]]
 
+        return keywords
+
+    def _build_text_filter(self, query: str) -> dict:
+        """
+        Construit un filtre OR sur les champs textuels.
+        Cherche dans : Name, Mots-cles, Description, Sous-categorie.
+        Utilise les mots significatifs (pas les stop words).
+        """
+        keywords = self._search_keywords(query)
         logger.info(f"Mots-cles de recherche: {keywords}")
 
         filters = []
@@ -296,6 +875,7 @@ class KBRetriever:
                 "frequence": self._get_select(props.get("Fréquence", {})),
                 "langue": self._get_select(props.get("Langue", {})),
                 "url": page.get("url", ""),
+                "last_edited_time": page.get("last_edited_time", ""),
             }
         except Exception as e:
             logger.warning(f"Erreur parsing page: {e}")
@@ -303,13 +883,11 @@ class KBRetriever:
 
     @staticmethod
     def _get_title(prop: dict) -> str:
-        items = prop.get("title", [])
-        return items[0].get("plain_text", "") if items else ""
+        return _plain_text(prop.get("title", []))
 
     @staticmethod
     def _get_text(prop: dict) -> str:
-        items = prop.get("rich_text", [])
-        return items[0].get("plain_text", "") if items else ""
+        return _plain_text(prop.get("rich_text", []))
 
     @staticmethod
     def _get_select(prop: dict) -> str:
@@ -330,31 +908,85 @@ class KBRetriever:
         return prop.get("url") or ""
 
 
+def _plain_text(items: list[dict]) -> str:
+    """Concatene tous les spans d'un rich text Notion (un span par changement de mise en forme)."""
+    return "".join(item.get("plain_text", "") for item in items)
+
+
+# Prefixes des blocs de liste / a cocher dans le texte du corps de page
+_BLOCK_PREFIXES = {"bulleted_list_item": "- ", "to_do": "- [ ] ", "quote": "> "}
+
+
+def _block_to_text(block: dict, numbered: int = 0) -> str:
+    """Texte d'un bloc Notion (paragraphes, titres, listes, to-do, citations, callouts, code)."""
+    kind = block.get("type", "")
+    content = block.get(kind) or {}
+    text = _plain_text(content.get("rich_text", []))
+    if not text.strip():
+        return ""
+    if kind == "numbered_list_item":
+        return f"{numbered}. {text}"
+    if kind == "to_do" and content.get("checked"):
+        return f"- [x] {text}"
+    return _BLOCK_PREFIXES.get(kind, "") + text
+
+
+def _notion_facet_filter(filters: Filters) -> dict:
+    """Filtre Notion equivalent a un filtre de facettes (OU entre valeurs d'un champ, ET entre champs)."""
+    if isinstance(filters, list):
+        return _compound("or", [_notion_facet_filter(f) for f in filters])
+    clauses = []
+    for field, wanted in filters.items():
+        if field not in FACET_FIELDS:
+            raise ValueError(f"Facette inconnue : {field}")
+        prop, kind = _FACET_PROPERTIES[field]
+        values = wanted if isinstance(wanted, (list, tuple, set, frozenset)) else [wanted]
+        if kind == "checkbox":
+            conditions = [{"property": prop, "checkbox": {"equals": str(v).lower() == "true"}} for v in values]
+        elif kind == "multi_select":
+            conditions = [{"property": prop, "multi_select": {"contains": v}} for v in values]
+        else:
+            conditions = [{"property": prop, "select": {"equals": v}} for v in values]
+        clauses.append(_compound("or", conditions))
+    return _compound("and", clauses)
+
+
+def _compound(operator: str, filters: list[dict]) -> dict:
+    filters = [f for f in filters if f]
+    if len(filters) <= 1:
+        return filters[0] if filters else {}
+    return {operator: filters}
+
+
+def _and_filters(*filters: dict) -> dict:
+    """ET de filtres Notion, en aplatissant les "and" imbriques (un niveau d'imbrication de moins)."""
+    clauses = []
+    for f in filters:
+        clauses.extend(f["and"] if "and" in f else [f])
+    return _compound("and", clauses)
+
+
+def _filter_depth(notion_filter: dict) -> int:
+    """Niveaux d'imbrication des filtres composes ("and" / "or") d'un filtre Notion."""
+    for operator in ("and", "or"):
+        if operator in notion_filter:
+            return 1 + max((_filter_depth(f) for f in notion_filter[operator]), default=0)
+    return 0
+
+
+def _merge_unique(results: list[dict], extra: list[dict]) -> list[dict]:
+    """Ajoute a results les entrees de extra absentes (dedup par id de page)."""
+    seen = {r["id"] for r in results}
+    merged = list(results)
+    for entry in extra:
+        if entry["id"] not in seen:
+            seen.add(entry["id"])
+            merged.append(entry)
+    return merged
+
+
 def format_kb_entries_for_prompt(entries: list[dict]) -> str:
-    """Formate les entrees KB pour injection dans le prompt Claude."""
+    """Formate les entrees KB pour injection dans le prompt Claude (sans budget, cf. prompt_builder)."""
     if not entries:
-        return "Aucune entree KB trouvee pour cette question."
-
-    parts = []
-    for i, entry in enumerate(entries, 1):
-        qui = ", ".join(entry.get("qui_resout", [])) or "Non defini"
-        action_crm = "Oui" if entry.get("action_crm") else "Non"
-        lien = entry.get("lien", "")
-        lien_str = f"\n   Lien process: {lien}" if lien else ""
-        notion_url = entry.get("url", "")
-        notion_str = f"\n   Page Notion: {notion_url}" if notion_url else ""
-
-        parts.append(
-            f"### Entree {i}: {entry['name']}\n"
-            f"   Categorie: {entry.get('categorie', 'N/A')} > {entry.get('sous_categorie', 'N/A')}\n"
-            f"   Description: {entry.get('description', 'N/A')}\n"
-            f"   Process: {entry.get('process', 'N/A')}\n"
-            f"   Qui resout: {qui}\n"
-            f"   Action CRM requise: {action_crm}\n"
-            f"   Confiance KB: {entry.get('confiance', 'N/A')}\n"
-            f"   Frequence: {entry.get('frequence', 'N/A')}"
-            f"{lien_str}"
-            f"{notion_str}"
-        )
-
-    return "\n\n".join(parts)
+        return NO_ENTRY_MESSAGE
+    return "\n\n".join(format_entry(i, entry) for i, entry in enumerate(entries, 1))
@@ -0,0 +1,98 @@
+"""
+Stockage local (SQLite) du snapshot KB.
+Persiste les entrees parsees (dicts de _parse_single_page), le curseur last_edited_time,
+l'etat de l'index BM25 et le corps des pages deja lus (avec leur last_edited_time), pour
+redemarrer en quelques millisecondes sans attendre Notion.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Chemin du fichier SQLite du snapshot KB (vide = pas de persistance)
+KB_STORE_PATH = os.getenv("KB_STORE_PATH", "data/kb_snapshot.db")
+
+
+class KBStore:
+    """Snapshot KB persiste sur disque : entrees + metadonnees (curseur, index)."""
+
+    def __init__(self, path: str = KB_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (id TEXT PRIMARY KEY, data TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS page_bodies (id TEXT PRIMARY KEY, edited TEXT, body TEXT)")
+        self._db.commit()
+
+    def load(self) -> tuple[list[dict], dict]:
+        """
+        Charge les entrees et les metadonnees persistees.
+        Metadonnees : cursor (last_edited_time max), saved_at (timestamp de la derniere
+        synchronisation avec Notion), index (etat KBIndex).
+        """
+        with self._lock:
+            entries = [json.loads(data) for (data,) in self._db.execute("SELECT data FROM entries")]
+            meta = {key: json.loads(value) for key, value in self._db.execute("SELECT key, value FROM meta")}
+        return entries, meta
+
+    def load_page_bodies(self) -> dict[str, tuple[str, str]]:
+        """Corps de page persistes : id de page -> (last_edited_time, texte)."""
+        with self._lock:
+            return {page_id: (edited, body) for page_id, edited, body in self._db.execute(
+                "SELECT id, edited, body FROM page_bodies"
+            )}
+
+    def save_page_body(self, page_id: str, edited: str, body: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO page_bodies (id, edited, body) VALUES (?, ?, ?)",
+                (page_id, edited, body),
+            )
+            self._db.commit()
+
+    def save_all(self, entries: list[dict], cursor: str, index_state: Optional[dict] = None) -> None:
+        """Remplace tout le snapshot persiste (apres un chargement complet)."""
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._write_entries(entries)
+            # Corps des pages supprimees de la KB
+            self._db.execute("DELETE FROM page_bodies WHERE id NOT IN (SELECT id FROM entries)")
+            self._write_meta(cursor, index_state)
+            self._db.commit()
+
+    def upsert(self, entries: list[dict], cursor: str, index_state: Optional[dict] = None) -> None:
+        """Ajoute / met a jour des entrees (apres un delta ou une creation de placeholder)."""
+        with self._lock:
+            self._write_entries(entries)
+            self._write_meta(cursor, index_state)
+            self._db.commit()
+
+    def mark_synced(self, cursor: str) -> None:
+        """Snapshot verifie aupres de Notion sans changement : seules les metadonnees sont datees."""
+        with self._lock:
+            self._write_meta(cursor, None)
+            self._db.commit()
+
+    def _write_entries(self, entries: list[dict]) -> None:
+        self._db.executemany(
+            "INSERT OR REPLACE INTO entries (id, data) VALUES (?, ?)",
+            [(e["id"], json.dumps(e, ensure_ascii=False)) for e in entries],
+        )
+
+    def _write_meta(self, cursor: str, index_state: Optional[dict]) -> None:
+        meta = {"cursor": cursor, "saved_at": time.time()}
+        if index_state is not None:
+            meta["index"] = index_state
+        self._db.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value, ensure_ascii=False)) for key, value in meta.items()],
+        )
@@ -0,0 +1,186 @@
+"""
+Detection d'intention par mots-cles, en une seule passe sur le texte.
+Les tables de mots-cles (filtre #help_raul, categories KB) sont compilees une fois au
+chargement en une regex "trie" (alternatives factorisees par prefixe), partagee par
+_is_revops_request (app.py) et _detect_category (agent.py).
+"""
+
+import re
+from functools import lru_cache
+from tokenizer import normalize_text
+
+# ---- Filtre des messages #help_raul (app._is_revops_request) ----
+
+# Messages qui sont juste des remerciements
+THANKS_ONLY = frozenset([
+    "merci", "merci !", "merci beaucoup", "thanks", "thank you",
+    "top merci", "super merci", "parfait merci", "ok merci",
+    "c'est bon merci", "nickel", "top", "parfait",
+])
+
+# Mots interrogatifs : en debut de message ou entoures d'espaces
+QUESTION_WORDS = [
+    "comment", "pourquoi", "quand", "combien", "quel", "quelle",
+    "quels", "quelles", "est-ce que", "est-ce qu", "ou est",
+    "qui peut", "qui doit", "how", "what", "when", "where", "why",
+]
+
+# Demandes d'action (typiques de #help_raul)
+ACTION_KEYWORDS = [
+    # Demandes polies
+    "svp", "s'il vous plait", "stp", "s'il te plait",
+    "merci d'avance", "merci par avance", "d'avance merci",
+    # Formulations de demande
+    "possible de", "est-il possible", "est-ce possible", "serait-il possible",
+    "il faudrait", "il faut", "on peut", "on pourrait", "tu peux", "vous pouvez",
+    "j'aimerais", "je voudrais", "je souhaite", "je souhaiterais",
+    "besoin de", "besoin d'aide", "j'ai besoin",
+    "peux-tu", "pouvez-vous", "pourriez-vous", "pourrais-tu",
+    # Mots-cles d'aide
+    "help", "quelqu'un sait", "quelqu'un peut",
+    "je ne trouve pas", "je n'arrive pas",
+    "probleme avec", "soucis avec", "souci avec",
+    "bug", "erreur", "bloque", "bloqu",
+    "urgent",
+]
+
+# Termes metier RevOps : si le message en contient, c'est probablement une demande
+REVOPS_TERMS = [
+    # Contract Change
+    " cc ", "contract change", "changement de contrat", "changement contrat",
+    "upsell", "downsell", "migration", "rollout",
+    # Billing
+    "facture", "facturation", "remboursement", "avoir", "credit note",
+    "impaye", "recouvrement", "prelevement", "chargebee", "stripe",
+    "dunning", "chorus", "write-off", "write off",
+    # Lead & Opportunity
+    "lead", "opportunite", "opportunity", "prospect", "conversion",
+    # Churn
+    "churn", "resiliation", "reactivation", "desabonnement",
+    # Quote
+    "devis", "quote", "propal",
+    # Subscription
+    "subscription", "abonnement", "mrr",
+    # Acces
+    "acces salesforce", "acces chargebee", "acces stripe",
+    "reset password", "mot de passe",
+    # Technique
+    "sync", "synchronisation", "automation",
+    # Actions courantes
+    "activer", "desactiver", "creer", "supprimer", "modifier",
+    "mettre a jour", "mise a jour", "ajouter", "retirer",
+    "badgeuse", "planning",
+]
+
+# Liens Salesforce / Chargebee
+CRM_LINK_MARKERS = ["lightning.force.com", "chargebee.com"]
+
+# ---- Categories KB (agent._detect_category) ----
+
+CATEGORY_KEYWORDS = {
+    "Billing": ["facture", "facturation", "credit note", "avoir", "remboursement", "paiement",
+                "rib", "tva", "impaye", "recouvrement", "dunning", "chargebee", "stripe",
+                "prelevement", "encaissement", "chorus", "banniere", "relance"],
+    "Lead": ["lead", "prospect", "conversion lead", "convertir", "assignation", "doublon",
+             "partenariat", "partnership"],
+    "Contract Change": ["changement contrat", "contract change", "upsell", "downsell",
+                        "migration", "rollout", "remise", "discount", "avenant",
+                        "mm vers enterprise", "enterprise vers mm", "changement plan"],
+    "Churn": ["churn", "resiliation", "reactivation", "reactiver", "desabonnement",
+              "annulation", "free trial", "churned"],
+    "Quote": ["devis", "quote", "propal", "proposition", "multi-shop", "multi shop",
+              "approbation devis"],
+    "Opportunité": ["opportunite", "opportunity", "pipeline", "conversion opp"],
+    "Pricing": ["prix", "pricing", "tarif", "grille", "remise exceptionnelle",
+                "mm vs enterprise"],
+    "Calendrier": ["calendly", "booking", "calendar", "rdv", "rendez-vous",
+                   "assignation raul"],
+    "Accès": ["acces", "login", "mot de passe", "password", "reset", "salesforce acces",
+              "chargebee acces", "stripe acces"],
+    "Technique": ["bug", "sync", "synchronisation", "automation", "erreur technique",
+                  "probleme sf"],
+    "Subscription/MRR": ["mrr", "subscription", "abonnement", "modification cb",
+                         "mensualite"],
+    "Attribution": ["attribution", "changement owner", "reassignation", "regle attribution"],
+    "Rapport": ["rapport", "report", "dashboard", "tableau de bord", "stats"],
+    "Intégration": ["integration", "upflow", "connecteur", "api", "webhook",
+                    "cb sf sync", "calendly sf"],
+}
+
+# Prefixe des groupes de categories dans le matcher partage
+CATEGORY_GROUP_PREFIX = "category:"
+
+
+def _trie_pattern(node: dict) -> str:
+    """Regex d'un noeud du trie : branches par caractere, optionnelles si un mot-cle finit ici."""
+    terminal = "" in node
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    alternation = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if terminal:
+        return f"(?:{alternation})?" if len(branches) == 1 else f"{alternation}?"
+    return alternation
+
+
+class KeywordMatcher:
+    """
+    Recherche simultanee de nombreux mots-cles (sous-chaines) dans un texte normalise.
+    Les mots-cles sont normalises (minuscules, sans accents) a la compilation et ranges
+    par groupe ; un meme mot-cle peut appartenir a plusieurs groupes.
+    """
+
+    def __init__(self, groups: dict[str, list[str]], cache_size: int = 1024):
+        self.groups = list(groups)
+        self._keyword_groups: dict[str, tuple[str, ...]] = {}
+        for group, keywords in groups.items():
+            for kw in keywords:
+                kw = normalize_text(kw)
+                if kw:
+                    self._keyword_groups[kw] = self._keyword_groups.get(kw, ()) + (group,)
+
+        trie: dict = {}
+        for kw in self._keyword_groups:
+            node = trie
+            for ch in kw:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+        # Lookahead : a chaque position, le plus long mot-cle qui commence ici
+        self._regex = re.compile(f"(?=({_trie_pattern(trie)}))")
+        # Mots-cles plus courts qui commencent au meme endroit (prefixes du mot-cle trouve)
+        self._prefixes = {
+            kw: tuple(other for other in self._keyword_groups if kw.startswith(other))
+            for kw in self._keyword_groups
+        }
+        self.find_terms = lru_cache(maxsize=cache_size)(self._find_terms)
+
+    def _find_terms(self, text: str) -> frozenset[str]:
+        """Tous les mots-cles presents dans le texte (deja normalise), en une passe."""
+        found = set()
+        for match in self._regex.finditer(text):
+            found.update(self._prefixes[match.group(1)])
+        return frozenset(found)
+
+    def group_scores(self, text: str) -> dict[str, int]:
+        """Nombre de mots-cles distincts trouves par groupe (groupes sans match omis)."""
+        scores: dict[str, int] = {}
+        for kw in self.find_terms(text):
+            for group in self._keyword_groups[kw]:
+                scores[group] = scores.get(group, 0) + 1
+        return scores
+
+
+# Matcher partage : filtre des messages + categories, compile une seule fois
+KEYWORD_MATCHER = KeywordMatcher({
+    "action": ACTION_KEYWORDS,
+    "revops": REVOPS_TERMS,
+    "link": CRM_LINK_MARKERS,
+    **{CATEGORY_GROUP_PREFIX + category: keywords for category, keywords in CATEGORY_KEYWORDS.items()},
+})
+
+# Groupes qui font d'un message une demande RevOps
+REQUEST_GROUPS = ("action", "revops", "link")
+
+_question_words = "|".join(re.escape(w) for w in sorted(QUESTION_WORDS, key=len, reverse=True))
+# Mot interrogatif en debut de message, ou entoure d'espaces
+QUESTION_WORDS_RE = re.compile(f"^(?:{_question_words})| (?:{_question_words}) ")
@@ -0,0 +1,308 @@
+"""
+Instrumentation du pipeline : spans de latence par etape, compteurs d'appels Notion /
+Claude / Slack, tokens consommes, et endpoint HTTP local (/metrics au format texte
+Prometheus, /healthz pour le healthcheck Docker).
+Volontairement sans dependance externe : quelques dizaines de series suffisent ici.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Port de l'endpoint /metrics + /healthz (0 = desactive)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# Bornes des histogrammes de latence (secondes)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        super().__init__(name, description, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        # cle de labels -> [compteurs par bucket..., somme, total]
+        self._series: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return int(series[-1]) if series else 0
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count:g}")
+                inf = _format_labels(self.labels, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf} {series[-1]:g}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]:g}")
+        return lines
+
+
+class Registry:
+    """Ensemble des metriques exposees sur /metrics."""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, labels: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, description, labels))
+
+    def histogram(self, name: str, description: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, labels, buckets))
+
+    def _register(self, metric: _Metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "ops_help_raul_stage_seconds", "Duree de chaque etape du pipeline", labels=("stage",)
+)
+NOTION_CALLS = REGISTRY.counter(
+    "ops_help_raul_notion_calls_total", "Appels a l'API Notion", labels=("operation", "status")
+)
+NOTION_CALL_SECONDS = REGISTRY.histogram(
+    "ops_help_raul_notion_call_seconds", "Duree des appels a l'API Notion", labels=("operation",)
+)
+NOTION_RETRIES = REGISTRY.counter(
+    "ops_help_raul_notion_retries_total", "Nouveaux essais d'appels Notion", labels=("operation", "reason")
+)
+NOTION_CIRCUIT_OPEN = REGISTRY.gauge(
+    "ops_help_raul_notion_circuit_open", "Disjoncteur Notion ouvert (1) ou ferme (0)"
+)
+KB_SNAPSHOT_SYNCED = REGISTRY.gauge(
+    "ops_help_raul_kb_snapshot_synced_timestamp_seconds",
+    "Derniere synchronisation du snapshot KB avec Notion (timestamp Unix ; age = time() - valeur)"
+)
+CLAUDE_TOKENS = REGISTRY.counter(
+    "ops_help_raul_claude_tokens_total", "Tokens consommes par les appels Claude", labels=("type",)
+)
+ANSWERS = REGISTRY.counter(
+    "ops_help_raul_answers_total", "Reponses produites par l'agent", labels=("source", "confidence")
+)
+SLACK_EVENTS = REGISTRY.counter(
+    "ops_help_raul_slack_events_total", "Evenements Slack recus", labels=("event", "outcome")
+)
+SCHEDULER_QUEUE_DEPTH = REGISTRY.gauge(
+    "ops_help_raul_scheduler_queue_depth", "Demandes en attente dans la file de l'ordonnanceur"
+)
+SCHEDULER_RUNNING = REGISTRY.gauge(
+    "ops_help_raul_scheduler_running", "Demandes en cours de traitement"
+)
+SCHEDULER_WAIT_SECONDS = REGISTRY.histogram(
+    "ops_help_raul_scheduler_wait_seconds", "Temps d'attente dans la file avant traitement", labels=("kind",)
+)
+SCHEDULER_JOBS = REGISTRY.counter(
+    "ops_help_raul_scheduler_jobs_total", "Demandes vues par l'ordonnanceur", labels=("kind", "outcome")
+)
+MODEL_ROUTES = REGISTRY.counter(
+    "ops_help_raul_model_routes_total", "Decisions de routage du modele Claude", labels=("tier", "reason")
+)
+CLAUDE_CALL_SECONDS = REGISTRY.histogram(
+    "ops_help_raul_claude_call_seconds", "Duree des appels Claude par tier de modele", labels=("tier",)
+)
+COALESCED_ANSWERS = REGISTRY.counter(
+    "ops_help_raul_coalesced_answers_total", "Questions servies par un calcul identique deja en cours"
+)
+PLACEHOLDER_REQUESTS = REGISTRY.counter(
+    "ops_help_raul_placeholder_requests_total", "Demandes de fiches KB placeholder par issue", labels=("outcome",)
+)
+THREAD_CACHE_LOOKUPS = REGISTRY.counter(
+    "ops_help_raul_thread_cache_lookups_total", "Contexte de thread lu en cache (hit) ou via l'API Slack (miss)",
+    labels=("result",)
+)
+
+
+# Durees des spans du thread courant, si collectees (cf. collect_spans)
+_collected = threading.local()
+
+
+@contextmanager
+def span(stage: str):
+    """Mesure la duree d'une etape (histogramme + log debug structure)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = getattr(_collected, "timings", None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+        logger.debug(f"span stage={stage} duration_ms={elapsed * 1000:.1f}")
+
+
+@contextmanager
+def collect_spans():
+    """
+    Collecte les durees (secondes) des spans executes dans le thread courant, par etape :
+    timings par question en mode batch. Les etapes executees dans d'autres threads ne sont pas vues.
+    """
+    previous = getattr(_collected, "timings", None)
+    _collected.timings = timings = {}
+    try:
+        yield timings
+    finally:
+        _collected.timings = previous
+
+
+def record_usage(usage) -> None:
+    """Ajoute les tokens d'une reponse Anthropic aux compteurs."""
+    if usage is None:
+        return
+    CLAUDE_TOKENS.inc(usage.input_tokens or 0, type="input")
+    CLAUDE_TOKENS.inc(usage.output_tokens or 0, type="output")
+    CLAUDE_TOKENS.inc(getattr(usage, "cache_read_input_tokens", 0) or 0, type="cache_read")
+    CLAUDE_TOKENS.inc(getattr(usage, "cache_creation_input_tokens", 0) or 0, type="cache_creation")
+
+
+# ----------------------------------------------------------------------
+# Healthcheck
+# ----------------------------------------------------------------------
+
+_health_checks: dict[str, Callable[[], bool]] = {}
+
+
+def register_health_check(name: str, check: Callable[[], bool]) -> None:
+    """Enregistre une verification pour /healthz (doit retourner True si OK)."""
+    _health_checks[name] = check
+
+
+def health_status() -> tuple[bool, dict]:
+    """Execute les verifications enregistrees. Retourne (ok global, detail par check)."""
+    details = {}
+    for name, check in list(_health_checks.items()):
+        try:
+            details[name] = bool(check())
+        except Exception as e:
+            logger.warning(f"Healthcheck {name} en erreur: {e}")
+            details[name] = False
+    return all(details.values()), details
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            self._reply(200, REGISTRY.render(), "text/plain; version=0.0.4")
+        elif path in ("/healthz", "/health"):
+            ok, details = health_status()
+            self._reply(200 if ok else 503, json.dumps({"ok": ok, "checks": details}), "application/json")
+        else:
+            self._reply(404, "not found", "text/plain")
+
+    def _reply(self, status: int, body: str, content_type: str) -> None:
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """Demarre l'endpoint /metrics + /healthz dans un thread daemon (None si desactive)."""
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Endpoint metriques demarre sur :{port} (/metrics, /healthz)")
+    return server
@@ -0,0 +1,103 @@
+"""
+Routage des questions entre un modele rapide et le modele principal.
+Les cas clairs (une entree KB nettement en tete, fiche de confiance haute, sans action CRM)
+partent sur le modele rapide avec un budget de tokens reduit ; les autres sur Sonnet.
+Une reponse du modele rapide en confiance BASSE est recalculee avec le modele principal.
+Chaque decision est loggee avec ses signaux, et la latence Claude est exportee par tier.
+"""
+
+import os
+import logging
+from typing import Optional
+from metrics import MODEL_ROUTES
+
+logger = logging.getLogger(__name__)
+
+# Active le routage (sinon toutes les questions partent sur le modele principal)
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() in ("1", "true", "yes")
+# Modeles et budgets de tokens par tier
+CLAUDE_MODEL = os.getenv("CLAUDE_MODEL", "claude-sonnet-4-20250514")
+CLAUDE_MAX_TOKENS = int(os.getenv("CLAUDE_MAX_TOKENS", "1024"))
+CLAUDE_FAST_MODEL = os.getenv("CLAUDE_FAST_MODEL", "claude-haiku-4-5-20251001")
+CLAUDE_FAST_MAX_TOKENS = int(os.getenv("CLAUDE_FAST_MAX_TOKENS", "600"))
+# Seuils du modele rapide : score de la meilleure entree (classement hybride local) et ecart au second
+ROUTER_MIN_TOP_SCORE = float(os.getenv("ROUTER_MIN_TOP_SCORE", "0.75"))
+ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.3"))
+# Categories toujours traitees par le modele principal (separees par des virgules)
+ROUTER_STRONG_CATEGORIES = {
+    c.strip() for c in os.getenv("ROUTER_STRONG_CATEGORIES", "").split(",") if c.strip()
+}
+
+TIER_FAST = "fast"
+TIER_STRONG = "strong"
+
+
+class Route:
+    """Decision de routage : tier, modele, budget de tokens et raison (pour les logs / metriques)."""
+
+    __slots__ = ("tier", "model", "max_tokens", "reason")
+
+    def __init__(self, tier: str, reason: str):
+        self.tier = tier
+        self.model = CLAUDE_FAST_MODEL if tier == TIER_FAST else CLAUDE_MODEL
+        self.max_tokens = CLAUDE_FAST_MAX_TOKENS if tier == TIER_FAST else CLAUDE_MAX_TOKENS
+        self.reason = reason
+
+
+class ModelRouter:
+    """Choisit le modele a partir des signaux du retrieval."""
+
+    def __init__(self, enabled: bool = MODEL_ROUTING_ENABLED):
+        self.enabled = enabled
+
+    def route(
+        self,
+        ranked: Optional[list[tuple[dict, float]]],
+        category: Optional[str] = None,
+        channel_context: str = "",
+    ) -> Route:
+        """
+        ranked : classement local (entree, score) des meilleures entrees pour la question,
+        None si le classement local n'est pas disponible (snapshot absent ou perime).
+        """
+        if not self.enabled:
+            return self._decide(TIER_STRONG, "disabled", ranked)
+        if ranked is None:
+            return self._decide(TIER_STRONG, "no_local_ranking", ranked)
+        if not ranked:
+            return self._decide(TIER_STRONG, "no_match", ranked)
+
+        top, top_score = ranked[0]
+        margin = top_score - (ranked[1][1] if len(ranked) > 1 else 0.0)
+        if channel_context:
+            reason = "thread_context"
+        elif top.get("action_crm"):
+            reason = "action_crm"
+        elif (top.get("confiance") or "").lower() != "haute":
+            reason = "entry_confidence"
+        elif category in ROUTER_STRONG_CATEGORIES:
+            reason = "category"
+        elif top_score < ROUTER_MIN_TOP_SCORE:
+            reason = "low_score"
+        elif margin < ROUTER_MIN_MARGIN:
+            reason = "ambiguous"
+        else:
+            return self._decide(TIER_FAST, "clear_match", ranked, margin)
+        return self._decide(TIER_STRONG, reason, ranked, margin)
+
+    @staticmethod
+    def escalate(route: Route) -> Route:
+        """Route vers le modele principal apres une reponse en confiance BASSE du modele rapide."""
+        escalated = Route(TIER_STRONG, "escalated_low_confidence")
+        MODEL_ROUTES.inc(tier=escalated.tier, reason=escalated.reason)
+        logger.info(f"Routage : escalade {route.model} -> {escalated.model} (confiance BASSE)")
+        return escalated
+
+    @staticmethod
+    def _decide(tier: str, reason: str, ranked: Optional[list], margin: Optional[float] = None) -> Route:
+        route = Route(tier, reason)
+        MODEL_ROUTES.inc(tier=tier, reason=reason)
+        top = f"{ranked[0][1]:.2f}" if ranked else "-"
+        gap = f"{margin:.2f}" if margin is not None else "-"
+        logger.info(f"Routage : tier={tier} model={route.model} reason={reason} top={top} margin={gap}")
+        return route
@@ -0,0 +1,145 @@
+"""
+Detection locale des quasi-doublons dans la KB (avant creation d'une fiche placeholder).
+Similarite cosinus TF-IDF sur les termes (tokenizer.py) du nom, de la description et des
+mots-cles de chaque entree du snapshot, plus les fiches placeholder en attente de creation.
+Les candidats sont lus dans un index inverse : une recherche ne touche que les entrees
+partageant au moins un terme avec la question (quelques microsecondes sur la KB actuelle).
+"""
+
+import os
+import math
+import threading
+from collections import Counter
+from typing import Optional
+from tokenizer import analyze
+
+# Similarite cosinus a partir de laquelle une question est consideree comme deja couverte
+KB_DUPLICATE_THRESHOLD = float(os.getenv("KB_DUPLICATE_THRESHOLD", "0.6"))
+
+# Description des fiches placeholder (prefixe commun, exclu de la comparaison)
+PLACEHOLDER_DESCRIPTION_PREFIX = "Question posee sur Slack : "
+
+# Champs compares
+DUPLICATE_FIELDS = ("name", "description", "mots_cles")
+
+
+def entry_text(entry: dict) -> str:
+    """Texte compare pour une entree KB : nom + description + mots-cles."""
+    parts = []
+    for field in DUPLICATE_FIELDS:
+        value = entry.get(field) or ""
+        if field == "description" and value.startswith(PLACEHOLDER_DESCRIPTION_PREFIX):
+            value = value[len(PLACEHOLDER_DESCRIPTION_PREFIX):]
+        parts.append(value)
+    return " ".join(parts)
+
+
+def _terms(text: str) -> Counter:
+    return Counter(analyze(text, drop_stop_words=True))
+
+
+class NearDuplicateIndex:
+    """Vecteurs TF-IDF (tf sous-lineaire) des entrees KB, mise a jour incrementale, thread-safe."""
+
+    def __init__(self, threshold: float = KB_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        # id entree -> {terme: 1 + log(tf)}
+        self._doc_terms: dict[str, dict[str, float]] = {}
+        # terme -> ids des entrees qui le contiennent
+        self._postings: dict[str, set[str]] = {}
+        # normes des vecteurs (dependent des idf : invalidees a chaque modification)
+        self._norms: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def rebuild(self, entries: list[dict]) -> None:
+        with self._lock:
+            self._doc_terms = {}
+            self._postings = {}
+            for entry in entries:
+                self._add_locked(entry["id"], entry_text(entry))
+            self._norms = {}
+
+    def add(self, entry: dict) -> None:
+        """Ajoute ou met a jour une entree KB."""
+        self.add_text(entry["id"], entry_text(entry))
+
+    def add_text(self, doc_id: str, text: str) -> None:
+        """Ajoute un document libre (ex : fiche placeholder en attente, id "pending:...")."""
+        with self._lock:
+            self._remove_locked(doc_id)
+            self._add_locked(doc_id, text)
+            self._norms = {}
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            self._remove_locked(doc_id)
+            self._norms = {}
+
+    def find(self, text: str, threshold: Optional[float] = None) -> Optional[tuple[str, float]]:
+        """
+        Entree la plus proche du texte si sa similarite depasse le seuil : (id, score), sinon None.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        query = _terms(text)
+        if not query:
+            return None
+
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not n_docs:
+                return None
+            idf = {t: self._idf(t, n_docs) for t in query if t in self._postings}
+            if not idf:
+                return None
+
+            query_weights = {t: (1 + math.log(query[t])) * w for t, w in idf.items()}
+            query_norm = math.sqrt(sum(
+                ((1 + math.log(tf)) * idf.get(t, math.log(1 + n_docs))) ** 2 for t, tf in query.items()
+            ))
+
+            dots: dict[str, float] = {}
+            for term, weight in query_weights.items():
+                for doc_id in self._postings[term]:
+                    dots[doc_id] = dots.get(doc_id, 0.0) + weight * self._doc_terms[doc_id][term] * idf[term]
+
+            best_id, best_score = None, 0.0
+            for doc_id, dot in dots.items():
+                score = dot / (query_norm * self._norm(doc_id, n_docs))
+                if score > best_score:
+                    best_id, best_score = doc_id, score
+
+        if best_id is None or best_score < threshold:
+            return None
+        return best_id, best_score
+
+    def _idf(self, term: str, n_docs: int) -> float:
+        return math.log(1 + n_docs / len(self._postings[term]))
+
+    def _norm(self, doc_id: str, n_docs: int) -> float:
+        norm = self._norms.get(doc_id)
+        if norm is None:
+            norm = math.sqrt(sum((tf * self._idf(t, n_docs)) ** 2 for t, tf in self._doc_terms[doc_id].items()))
+            self._norms[doc_id] = norm or 1.0
+        return self._norms[doc_id]
+
+    def _add_locked(self, doc_id: str, text: str) -> None:
+        terms = {t: 1 + math.log(tf) for t, tf in _terms(text).items()}
+        if not terms:
+            return
+        self._doc_terms[doc_id] = terms
+        for term in terms:
+            self._postings.setdefault(term, set()).add(doc_id)
+
+    def _remove_locked(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[term]
@@ -0,0 +1,253 @@
+"""
+Couche de transport partagee par tous les appels a l'API Notion.
+- session HTTP persistante (keep-alive, pool de connexions) passee au client notion_client
+- limiteur token bucket (~3 requetes/s, la limite documentee par Notion)
+- retries avec backoff exponentiel + jitter, en respectant Retry-After sur les 429
+- disjoncteur : apres plusieurs echecs consecutifs, les appels echouent immediatement
+  (KBRetriever sert alors le snapshot local, meme perime)
+- metriques par appel (duree, statut, retries)
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from typing import Callable, Optional
+import httpx
+from notion_client import Client as NotionClient
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+from metrics import NOTION_CALL_SECONDS, NOTION_CALLS, NOTION_CIRCUIT_OPEN, NOTION_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Debit autorise vers Notion (requetes/s) et rafale maximale
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT", "3"))
+NOTION_RATE_BURST = int(os.getenv("NOTION_RATE_BURST", "3"))
+# Retries sur 429 / 5xx / timeouts
+NOTION_MAX_RETRIES = int(os.getenv("NOTION_MAX_RETRIES", "3"))
+NOTION_BACKOFF_BASE = float(os.getenv("NOTION_BACKOFF_BASE", "0.5"))
+NOTION_BACKOFF_MAX = float(os.getenv("NOTION_BACKOFF_MAX", "8"))
+# Retry-After au-dela duquel on abandonne plutot que de bloquer la reponse (secondes)
+NOTION_RETRY_AFTER_MAX = float(os.getenv("NOTION_RETRY_AFTER_MAX", "30"))
+# Disjoncteur : echecs consecutifs avant ouverture, duree d'ouverture (secondes)
+NOTION_BREAKER_THRESHOLD = int(os.getenv("NOTION_BREAKER_THRESHOLD", "5"))
+NOTION_BREAKER_COOLDOWN = float(os.getenv("NOTION_BREAKER_COOLDOWN", "30"))
+# Session HTTP : taille du pool de connexions et timeout des requetes
+NOTION_POOL_SIZE = int(os.getenv("NOTION_POOL_SIZE", "10"))
+NOTION_TIMEOUT_MS = int(os.getenv("NOTION_TIMEOUT_MS", "10000"))
+
+# Statuts HTTP pour lesquels un nouvel essai a du sens
+_RETRYABLE_STATUSES = {409, 429, 500, 502, 503, 504}
+# Erreurs ou la requete n'a pas atteint Notion : seuls cas (avec 429) retentes pour une ecriture
+_CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+class CircuitOpenError(Exception):
+    """Appel refuse : le disjoncteur Notion est ouvert."""
+
+
+class TokenBucket:
+    """Limiteur de debit thread-safe : `rate` jetons/s, au plus `burst` en reserve."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Attend un jeton. Retourne le temps passe a attendre (secondes)."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """Suspend tous les appels pendant `seconds` (Retry-After renvoye par Notion)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur ferme / ouvert / semi-ouvert.
+    Ouvert apres `threshold` echecs consecutifs ; apres `cooldown` secondes, un seul appel
+    d'essai est autorise : un succes referme le disjoncteur, un echec le rouvre.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """Vrai tant que les appels sont refuses (hors appel d'essai)."""
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.cooldown
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Disjoncteur Notion referme.")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+        NOTION_CIRCUIT_OPEN.set(0)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is None and self._failures < self.threshold:
+                return
+            self._opened_at = time.monotonic()
+        logger.warning(f"Disjoncteur Notion ouvert pour {self.cooldown:.0f}s ({self._failures} echecs consecutifs)")
+        NOTION_CIRCUIT_OPEN.set(1)
+
+    def release_trial(self) -> None:
+        """Libere l'appel d'essai si aucun resultat n'a ete enregistre (erreur inattendue)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class NotionTransport:
+    """Execute les appels Notion avec limitation de debit, retries et disjoncteur."""
+
+    def __init__(
+        self,
+        rate: float = NOTION_RATE_LIMIT,
+        burst: int = NOTION_RATE_BURST,
+        max_retries: int = NOTION_MAX_RETRIES,
+        breaker_threshold: int = NOTION_BREAKER_THRESHOLD,
+        breaker_cooldown: float = NOTION_BREAKER_COOLDOWN,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.max_retries = max_retries
+
+    def call(self, operation: str, fn: Callable[..., dict], idempotent: bool = True, **kwargs) -> dict:
+        """
+        Appelle fn(**kwargs) (methode du client Notion).
+        Les erreurs transitoires (429, 5xx, timeouts, connexion) sont retentees ; les autres
+        (400, 401, 404...) remontent tout de suite et ne comptent pas pour le disjoncteur.
+        idempotent=False (creation de page) : retente seulement les 429 et les erreurs de
+        connexion, ou la requete n'a pas ete traitee ; un timeout ou un 5xx peut cacher une
+        ecriture deja faite, la retenter creerait un doublon.
+        Leve CircuitOpenError si le disjoncteur est ouvert.
+        """
+        if not self.breaker.allow():
+            NOTION_CALLS.inc(operation=operation, status="circuit_open")
+            raise CircuitOpenError(f"Notion indisponible (disjoncteur ouvert), appel {operation} refuse")
+
+        try:
+            return self._call_with_retries(operation, fn, idempotent, kwargs)
+        finally:
+            # Sans effet si un resultat a ete enregistre ; sinon l'essai ne doit pas rester bloque
+            self.breaker.release_trial()
+
+    def _call_with_retries(self, operation: str, fn: Callable[..., dict], idempotent: bool, kwargs: dict) -> dict:
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                response = fn(**kwargs)
+            except Exception as e:
+                NOTION_CALL_SECONDS.observe(time.perf_counter() - start, operation=operation)
+                if not _is_retryable(e):
+                    NOTION_CALLS.inc(operation=operation, status="error")
+                    if isinstance(e, HTTPResponseError):
+                        # Notion a repondu (400, 404...) : le service est joignable
+                        self.breaker.record_success()
+                    raise
+                retry = idempotent or _is_safe_to_resend(e)
+                delay = self._retry_delay(e, attempt) if retry and attempt < self.max_retries else None
+                if delay is None:
+                    NOTION_CALLS.inc(operation=operation, status=_error_status(e))
+                    self.breaker.record_failure()
+                    raise
+                attempt += 1
+                NOTION_RETRIES.inc(operation=operation, reason=_error_status(e))
+                logger.info(f"Notion {operation} : {e} -> nouvel essai {attempt}/{self.max_retries} dans {delay:.2f}s")
+                time.sleep(delay)
+                continue
+
+            NOTION_CALL_SECONDS.observe(time.perf_counter() - start, operation=operation)
+            NOTION_CALLS.inc(operation=operation, status="ok")
+            self.breaker.record_success()
+            return response
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Delai avant le prochain essai (Retry-After si fourni), None si trop long."""
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            if retry_after > NOTION_RETRY_AFTER_MAX:
+                return None
+            self.bucket.pause(retry_after)
+            return retry_after
+        # Backoff exponentiel avec "equal jitter" : entre la moitie et la totalite du palier
+        step = min(NOTION_BACKOFF_MAX, NOTION_BACKOFF_BASE * 2 ** attempt)
+        return step / 2 + random.uniform(0, step / 2)
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, HTTPResponseError):
+        return error.status in _RETRYABLE_STATUSES
+    return isinstance(error, (RequestTimeoutError, httpx.TransportError))
+
+
+def _is_safe_to_resend(error: Exception) -> bool:
+    """Vrai si la requete n'a pas ete traitee par Notion (429, connexion impossible)."""
+    if isinstance(error, HTTPResponseError):
+        return error.status == 429
+    # notion_client convertit les timeouts httpx (connexion comprise) en RequestTimeoutError
+    return isinstance(error, _CONNECT_ERRORS) or isinstance(error.__context__, _CONNECT_ERRORS)
+
+
+def _error_status(error: Exception) -> str:
+    if isinstance(error, HTTPResponseError):
+        return "rate_limited" if error.status == 429 else f"http_{error.status}"
+    return "timeout" if isinstance(error, (RequestTimeoutError, httpx.TimeoutException)) else "network"
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(error, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def create_notion_client(token: str, base_url: str) -> NotionClient:
+    """Client Notion sur une session httpx persistante (keep-alive, pool dimensionne)."""
+    session = httpx.Client(
+        limits=httpx.Limits(max_connections=NOTION_POOL_SIZE, max_keepalive_connections=NOTION_POOL_SIZE),
+    )
+    return NotionClient(client=session, auth=token, base_url=base_url, timeout_ms=NOTION_TIMEOUT_MS)
@@ -0,0 +1,169 @@
+"""
+File d'attente des fiches KB placeholder (questions en confiance BASSE).
+La creation (verification anti-doublon + pages.create) sort du chemin de la reponse : la
+reponse est postee tout de suite, la fiche est creee en tache de fond, puis le message Slack
+est edite avec le lien Notion (callback on_created).
+Les demandes sont traitees par lots (fenetre PLACEHOLDER_BATCH_WINDOW) et dedoublonnees des
+leur arrivee avec le detecteur de quasi-doublons de la KB (near_duplicate.py), qui contient
+aussi les fiches en attente : les questions proches donnent une seule fiche, dont le lien est
+renvoye a chacune ; une question deja couverte par une entree de la KB ne cree rien.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from itertools import count
+from typing import Callable, Optional
+from metrics import PLACEHOLDER_REQUESTS, span
+
+logger = logging.getLogger(__name__)
+
+# Fenetre de regroupement des demandes avant traitement d'un lot (secondes)
+PLACEHOLDER_BATCH_WINDOW = float(os.getenv("PLACEHOLDER_BATCH_WINDOW", "2"))
+# Taille max de la file (au-dela, la demande est abandonnee : la question sera reposee)
+PLACEHOLDER_QUEUE_SIZE = int(os.getenv("PLACEHOLDER_QUEUE_SIZE", "200"))
+# Fiches recemment creees gardees en memoire (lien renvoye aux questions du meme sujet)
+_RECENT_CREATED_MAX = 500
+# Prefixe des ids des fiches en attente dans le detecteur de quasi-doublons
+_PENDING_PREFIX = "pending:"
+
+
+class _PlaceholderRequest:
+    __slots__ = ("id", "question", "category", "callbacks")
+
+    def __init__(self, request_id: str, question: str, category: str, on_created: Optional[Callable[[dict], None]]):
+        self.id = request_id
+        self.question = question
+        self.category = category
+        self.callbacks = [on_created] if on_created else []
+
+
+class PlaceholderQueue:
+    """
+    File traitee par un thread de fond. `kb` (KBRetriever) fournit create_placeholder_entry et
+    le detecteur de quasi-doublons `duplicates`.
+    """
+
+    def __init__(self, kb, batch_window: float = PLACEHOLDER_BATCH_WINDOW, max_size: int = PLACEHOLDER_QUEUE_SIZE):
+        self.kb = kb
+        self.batch_window = batch_window
+        self.max_size = max_size
+        # Demandes en attente ou en cours de traitement, par id
+        self._pending: dict[str, _PlaceholderRequest] = {}
+        self._queued: list[_PlaceholderRequest] = []
+        self._seq = count()
+        # id de fiche creee -> fiche (lien renvoye aux questions quasi-identiques suivantes)
+        self._recent: OrderedDict[str, dict] = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, question: str, category: str = "", on_created: Optional[Callable[[dict], None]] = None) -> bool:
+        """
+        Demande une fiche placeholder pour la question. on_created(fiche) est appele depuis le
+        thread de fond une fois la fiche creee (pas d'appel si une entree similaire existait deja ;
+        appel immediat si la fiche vient d'etre creee pour une question quasi-identique).
+        Retourne False si la file est pleine.
+        """
+        with self._cond:
+            match = self.kb.duplicates.find(question)
+            if match:
+                created = self._merge_locked(match[0], category, on_created)
+                if created is None:
+                    return True
+            else:
+                if len(self._pending) >= self.max_size:
+                    PLACEHOLDER_REQUESTS.inc(outcome="dropped")
+                    logger.warning(f"File des placeholders pleine, demande abandonnee : {question[:50]}")
+                    return False
+                request = _PlaceholderRequest(f"{_PENDING_PREFIX}{next(self._seq)}", question, category, on_created)
+                self._pending[request.id] = request
+                self._queued.append(request)
+                # Visible des le depot pour l'anti-doublon des questions suivantes
+                self.kb.duplicates.add_text(request.id, question)
+                PLACEHOLDER_REQUESTS.inc(outcome="queued")
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._worker, name="kb-placeholders", daemon=True)
+                    self._thread.start()
+                self._cond.notify_all()
+                return True
+
+        # Fiche deja creee pour une question quasi-identique : lien transmis tout de suite
+        if on_created:
+            _notify(on_created, created)
+        return True
+
+    def _merge_locked(self, match_id: str, category: str, on_created) -> Optional[dict]:
+        """
+        Question quasi-identique a une demande en attente (rattachee a celle-ci) ou a une entree
+        de la KB. Retourne la fiche si elle a ete creee recemment par la file, None sinon.
+        """
+        pending = self._pending.get(match_id)
+        if pending is not None:
+            PLACEHOLDER_REQUESTS.inc(outcome="merged")
+            if on_created:
+                pending.callbacks.append(on_created)
+            pending.category = pending.category or category
+            return None
+        created = self._recent.get(match_id)
+        PLACEHOLDER_REQUESTS.inc(outcome="merged" if created else "existing")
+        if created is None:
+            logger.info(f"Entree KB similaire deja existante ({match_id}) : pas de fiche placeholder.")
+        return created
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Attend que toutes les demandes soient traitees. Retourne False si le delai expire."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queued:
+                    self._cond.wait()
+            # Laisser arriver les questions voisines (plusieurs personnes sur le meme trou de la KB)
+            time.sleep(self.batch_window)
+            with self._cond:
+                batch, self._queued = self._queued, []
+            logger.info(f"Lot de placeholders : {len(batch)} fiche(s) a creer")
+            for request in batch:
+                self._process(request)
+
+    def _process(self, request: _PlaceholderRequest) -> None:
+        """Cree la fiche d'une demande (et de celles qui lui ont ete rattachees)."""
+        created = None
+        try:
+            # La demande ne doit pas se detecter elle-meme comme doublon
+            self.kb.duplicates.remove(request.id)
+            with span("placeholder"):
+                created = self.kb.create_placeholder_entry(question=request.question, category=request.category)
+        except Exception as e:
+            logger.error(f"Erreur lors de la creation de la fiche placeholder: {e}")
+        finally:
+            with self._cond:
+                del self._pending[request.id]
+                callbacks = list(request.callbacks)
+                if created:
+                    self._recent[created["id"]] = created
+                    while len(self._recent) > _RECENT_CREATED_MAX:
+                        self._recent.popitem(last=False)
+                self._cond.notify_all()
+
+        PLACEHOLDER_REQUESTS.inc(outcome="created" if created else "not_created")
+        if created:
+            for callback in callbacks:
+                _notify(callback, created)
+
+
+def _notify(callback: Callable[[dict], None], created: dict) -> None:
+    try:
+        callback(created)
+    except Exception as e:
+        logger.warning(f"Impossible de signaler la fiche KB creee: {e}")
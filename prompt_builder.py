@@ -0,0 +1,181 @@
+"""
+Assemblage du message utilisateur envoye a Claude, sous budget de tokens.
+Les entrees KB sont re-scorees par rapport a la question, formatees de facon compacte
+(lignes vides / "N/A" retirees, process et corps de page longs tronques) puis empilees
+par pertinence tant que le budget le permet. Le contexte du thread Slack est compacte de la meme facon.
+"""
+
+import os
+import re
+import math
+import logging
+from typing import Optional
+from kb_index import FIELD_WEIGHTS
+from prompts import KB_CONTEXT_TEMPLATE
+from tokenizer import analyze
+
+logger = logging.getLogger(__name__)
+
+# Budget (tokens estimes) pour les entrees KB + le contexte du thread dans le message utilisateur
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2500"))
+# Part maximale du budget reservee au contexte du thread
+PROMPT_THREAD_TOKENS = int(os.getenv("PROMPT_THREAD_TOKENS", "400"))
+# Longueur max du champ process d'une entree (caracteres)
+PROMPT_PROCESS_MAX_CHARS = int(os.getenv("PROMPT_PROCESS_MAX_CHARS", "1200"))
+
+# Estimation locale : ~3.5 caracteres par token pour du francais / anglais melange
+_CHARS_PER_TOKEN = 3.5
+# Process encore plus court pour faire rentrer une entree qui depasse le budget
+_PROCESS_FALLBACK_CHARS = 300
+# Longueur max d'un message du thread (caracteres)
+_THREAD_MESSAGE_MAX_CHARS = 400
+
+NO_ENTRY_MESSAGE = "Aucune entree KB trouvee pour cette question."
+
+# Valeurs considerees comme vides dans les fiches KB
+_EMPTY_VALUES = {"", "n/a", "na", "-", "none"}
+
+# Liens Slack <url|libelle> -> libelle, <url> -> url
+_SLACK_LINK_RE = re.compile(r"<(https?://[^|>]+)\|([^>]+)>")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation du nombre de tokens d'un texte (sans appel API)."""
+    return math.ceil(len(text) / _CHARS_PER_TOKEN) if text else 0
+
+
+def _is_empty(value) -> bool:
+    return not isinstance(value, str) or value.strip().lower() in _EMPTY_VALUES
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Tronque a max_chars, de preference sur une fin de ligne ou de phrase."""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = max(cut.rfind("\n"), cut.rfind(". "))
+    if boundary > max_chars // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + " [...]"
+
+
+def format_entry(i: int, entry: dict, process_max_chars: Optional[int] = None) -> str:
+    """Formate une entree KB pour le prompt, sans les lignes vides ou "N/A"."""
+    lines = [f"### Entree {i}: {entry['name']}"]
+
+    categorie = " > ".join(v for v in (entry.get("categorie"), entry.get("sous_categorie")) if not _is_empty(v))
+    if categorie:
+        lines.append(f"   Categorie: {categorie}")
+    if not _is_empty(entry.get("description")):
+        lines.append(f"   Description: {entry['description']}")
+    if not _is_empty(entry.get("process")):
+        process = entry["process"]
+        if process_max_chars:
+            process = _truncate(process, process_max_chars)
+        lines.append(f"   Process: {process}")
+    if not _is_empty(entry.get("body")):
+        body = entry["body"]
+        if process_max_chars:
+            body = _truncate(body, process_max_chars)
+        lines.append(f"   Contenu de la page:\n{body}")
+
+    qui = ", ".join(entry.get("qui_resout", [])) or "Non defini"
+    lines.append(f"   Qui resout: {qui}")
+    lines.append(f"   Action CRM requise: {'Oui' if entry.get('action_crm') else 'Non'}")
+    for label, key in (("Confiance KB", "confiance"), ("Frequence", "frequence"),
+                       ("Lien process", "lien"), ("Page Notion", "url")):
+        if not _is_empty(entry.get(key)):
+            lines.append(f"   {label}: {entry[key]}")
+    return "\n".join(lines)
+
+
+def score_entries(question: str, entries: list[dict]) -> list[tuple[dict, float]]:
+    """
+    Pertinence de chaque entree pour la question : recouvrement des termes (stemmes)
+    pondere par champ, plus un petit bonus de rang (l'ordre du retrieval reste un signal).
+    Retourne les entrees triees par score decroissant (ordre stable a score egal).
+    """
+    terms = set(analyze(question, drop_stop_words=True) or analyze(question))
+    scored = []
+    for rank, entry in enumerate(entries):
+        overlap = 0.0
+        if terms:
+            for field, weight in FIELD_WEIGHTS.items():
+                overlap += weight * len(terms.intersection(analyze(entry.get(field) or "")))
+            overlap /= len(terms)
+        scored.append((entry, overlap + 0.5 / (1 + rank)))
+    scored.sort(key=lambda pair: pair[1], reverse=True)
+    return scored
+
+
+def pack_kb_entries(question: str, entries: list[dict], token_budget: int) -> tuple[str, list[dict]]:
+    """
+    Empile les entrees les plus pertinentes dans le budget de tokens.
+    Une entree trop longue est retentee avec un process tres court avant d'etre ecartee ;
+    la meilleure entree est toujours gardee. Retourne (texte formate, entrees retenues).
+    """
+    if not entries:
+        return NO_ENTRY_MESSAGE, []
+
+    parts, kept = [], []
+    used = 0
+    for entry, _ in score_entries(question, entries):
+        i = len(kept) + 1
+        text = format_entry(i, entry, PROMPT_PROCESS_MAX_CHARS)
+        cost = estimate_tokens(text)
+        if kept and used + cost > token_budget:
+            text = format_entry(i, entry, _PROCESS_FALLBACK_CHARS)
+            cost = estimate_tokens(text)
+            if used + cost > token_budget:
+                continue
+        parts.append(text)
+        kept.append(entry)
+        used += cost
+
+    if len(kept) < len(entries):
+        logger.info(f"Prompt : {len(kept)}/{len(entries)} entree(s) KB retenue(s) (~{used} tokens)")
+    return "\n\n".join(parts), kept
+
+
+def compact_thread_context(context: str, token_budget: int = PROMPT_THREAD_TOKENS) -> str:
+    """
+    Compacte le contexte du thread ("<@user>: texte" par ligne) : liens Slack reduits a leur
+    libelle, espaces fusionnes, messages longs tronques, et plus anciens messages retires
+    jusqu'a tenir dans le budget.
+    """
+    if not context:
+        return ""
+
+    messages = []
+    for line in context.split("\n"):
+        line = _SLACK_LINK_RE.sub(r"\2", line)
+        line = _WHITESPACE_RE.sub(" ", line).strip()
+        if line:
+            messages.append(_truncate(line, _THREAD_MESSAGE_MAX_CHARS))
+
+    # Les messages les plus recents d'abord
+    kept, used = [], 0
+    for message in reversed(messages):
+        cost = estimate_tokens(message)
+        if kept and used + cost > token_budget:
+            break
+        kept.append(message)
+        used += cost
+    return "\n".join(reversed(kept))
+
+
+def build_user_message(
+    question: str,
+    kb_entries: list[dict],
+    channel_context: str = "",
+    token_budget: int = PROMPT_TOKEN_BUDGET,
+) -> str:
+    """Message utilisateur complet : contexte du thread compacte + entrees KB sous budget + question."""
+    thread = compact_thread_context(channel_context, min(PROMPT_THREAD_TOKENS, token_budget // 2))
+    kb_context, _ = pack_kb_entries(question, kb_entries, token_budget - estimate_tokens(thread))
+
+    user_message = KB_CONTEXT_TEMPLATE.format(kb_entries=kb_context, question=question)
+    if thread:
+        user_message = f"## Contexte de la conversation Slack\n{thread}\n\n{user_message}"
+    return user_message
@@ -0,0 +1,317 @@
+"""
+File d'attente bornee entre les handlers Slack et l'agent.
+Limite le nombre de reponses calculees en parallele (appels Claude / Notion), sert les
+mentions avant les messages passifs de la channel, alterne entre utilisateurs (un
+utilisateur qui enchaine 5 questions ne bloque pas les autres), previent l'utilisateur
+quand la file est longue et rejette les demandes les moins prioritaires quand elle est pleine.
+Deux variantes : threads (mode Slack sync) et taches asyncio (mode async).
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+import threading
+from itertools import count
+from typing import Any, Awaitable, Callable, Optional
+from metrics import SCHEDULER_JOBS, SCHEDULER_QUEUE_DEPTH, SCHEDULER_RUNNING, SCHEDULER_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Nombre de reponses calculees en parallele
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "4"))
+# Taille max de la file d'attente (au-dela : rejet des demandes les moins prioritaires)
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "50"))
+# Nombre de demandes devant soi a partir duquel on poste un accuse de reception
+SCHEDULER_ACK_DEPTH = int(os.getenv("SCHEDULER_ACK_DEPTH", "3"))
+
+# Priorites (plus petit = servi en premier)
+PRIORITY_MENTION = 0
+PRIORITY_MESSAGE = 1
+_PRIORITY_NAMES = {PRIORITY_MENTION: "app_mention", PRIORITY_MESSAGE: "message"}
+
+
+class _Job:
+    """Demande en attente : ordonnee par (priorite, tour de l'utilisateur, arrivee)."""
+
+    __slots__ = ("key", "priority", "user", "run", "on_shed", "ack", "ack_ready", "enqueued_at")
+
+    def __init__(self, key: tuple, priority: int, user: str, run, on_shed, enqueued_at: float):
+        self.key = key
+        self.priority = priority
+        self.user = user
+        self.run = run
+        self.on_shed = on_shed
+        self.ack: Optional[str] = None
+        # Accuse de reception en cours d'envoi (Event) : le worker attend son ts avant de demarrer
+        self.ack_ready = None
+        self.enqueued_at = enqueued_at
+
+    def __lt__(self, other: "_Job") -> bool:
+        return self.key < other.key
+
+
+class FairQueue:
+    """
+    File de priorite bornee, equitable entre utilisateurs (non thread-safe : protegee
+    par l'ordonnanceur). A priorite egale, chaque demande recoit un "tour" : le tour
+    courant + 1 pour un utilisateur sans demande en attente, son dernier tour + 1 sinon.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._heap: list[_Job] = []
+        self._seq = count()
+        self._current_round = 0
+        self._user_rounds: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, priority: int, user: str, run, on_shed) -> tuple[Optional[_Job], Optional[_Job]]:
+        """
+        Ajoute une demande. Retourne (demande ajoutee ou None si rejetee, demande evincee).
+        File pleine : la nouvelle demande prend la place de la moins prioritaire en attente
+        si elle passe avant elle, sinon elle est rejetee.
+        """
+        user_round = max(self._user_rounds.get(user, 0), self._current_round) + 1
+        job = _Job((priority, user_round, next(self._seq)), priority, user, run, on_shed, time.monotonic())
+
+        evicted = None
+        if len(self._heap) >= self.max_size:
+            worst = max(self._heap)
+            if not job < worst:
+                return None, None
+            self._heap.remove(worst)
+            heapq.heapify(self._heap)
+            evicted = worst
+
+        self._user_rounds[user] = user_round
+        heapq.heappush(self._heap, job)
+        return job, evicted
+
+    def pop(self) -> _Job:
+        job = heapq.heappop(self._heap)
+        self._current_round = max(self._current_round, job.key[1])
+        if self._user_rounds.get(job.user) == job.key[1] and not any(j.user == job.user for j in self._heap):
+            del self._user_rounds[job.user]
+        return job
+
+    def position(self, job: _Job) -> int:
+        """Nombre de demandes servies avant celle-ci."""
+        return sum(1 for other in self._heap if other < job)
+
+
+def _should_ack(position: int, running: int, workers: int, ack_depth: int) -> bool:
+    """Accuse de reception seulement si la demande va vraiment attendre (aucun worker libre pour elle)."""
+    return running + position >= workers and position >= ack_depth
+
+
+def _observe_start(job: _Job, depth: int) -> None:
+    kind = _PRIORITY_NAMES.get(job.priority, str(job.priority))
+    SCHEDULER_WAIT_SECONDS.observe(time.monotonic() - job.enqueued_at, kind=kind)
+    SCHEDULER_QUEUE_DEPTH.set(depth)
+
+
+class AnswerScheduler:
+    """
+    Ordonnanceur a base de threads (mode Slack sync).
+    run(ack_ts) calcule et poste la reponse ; ack_ts est le ts de l'accuse de reception
+    eventuel (a remplacer par la reponse). on_ack(position) poste l'accuse et retourne son ts ;
+    on_shed(ack_ts) previent l'utilisateur que sa demande n'a pas pu etre traitee (en remplacant
+    l'accuse de reception s'il a ete poste, ack_ts sinon None).
+    """
+
+    def __init__(
+        self,
+        workers: int = SCHEDULER_WORKERS,
+        max_queue: int = SCHEDULER_MAX_QUEUE,
+        ack_depth: int = SCHEDULER_ACK_DEPTH,
+    ):
+        self.workers = workers
+        self.ack_depth = ack_depth
+        self._queue = FairQueue(max_queue)
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._running = 0
+
+    def start(self) -> "AnswerScheduler":
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"answer-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Ordonnanceur demarre : {self.workers} worker(s), file max {self._queue.max_size}")
+        return self
+
+    def submit(
+        self,
+        run: Callable[[Optional[str]], Any],
+        user: str = "",
+        priority: int = PRIORITY_MESSAGE,
+        on_ack: Optional[Callable[[int], Optional[str]]] = None,
+        on_shed: Optional[Callable[[Optional[str]], Any]] = None,
+    ) -> bool:
+        """Met une demande en file. Retourne False si elle a ete rejetee (file pleine)."""
+        kind = _PRIORITY_NAMES.get(priority, str(priority))
+        with self._cond:
+            job, evicted = self._queue.push(priority, user, run, on_shed)
+            position = self._queue.position(job) if job else 0
+            ack = bool(job and on_ack) and _should_ack(position, self._running, self.workers, self.ack_depth)
+            if ack:
+                # Pose avant que la demande soit visible des workers
+                job.ack_ready = threading.Event()
+            SCHEDULER_QUEUE_DEPTH.set(len(self._queue))
+            if job:
+                self._cond.notify()
+
+        if evicted:
+            self._shed(evicted)
+        if job is None:
+            SCHEDULER_JOBS.inc(kind=kind, outcome="rejected")
+            logger.warning(f"File pleine : demande {kind} de {user or 'inconnu'} rejetee")
+            if on_shed:
+                _safe_call(on_shed, None)
+            return False
+
+        SCHEDULER_JOBS.inc(kind=kind, outcome="queued")
+        if ack:
+            try:
+                job.ack = _safe_call(on_ack, position + self._running)
+            finally:
+                job.ack_ready.set()
+            SCHEDULER_JOBS.inc(kind=kind, outcome="acked")
+        return True
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not len(self._queue):
+                    self._cond.wait()
+                job = self._queue.pop()
+                self._running += 1
+                SCHEDULER_RUNNING.set(self._running)
+                _observe_start(job, len(self._queue))
+            if job.ack_ready is not None:
+                # Demande depilee pendant l'envoi de l'accuse : la reponse doit le remplacer
+                job.ack_ready.wait()
+            try:
+                job.run(job.ack)
+            except Exception as e:
+                logger.error(f"Erreur dans une demande planifiee: {e}")
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    SCHEDULER_RUNNING.set(self._running)
+
+    @staticmethod
+    def _shed(job: _Job) -> None:
+        SCHEDULER_JOBS.inc(kind=_PRIORITY_NAMES.get(job.priority, str(job.priority)), outcome="shed")
+        logger.warning(f"File pleine : demande de {job.user or 'inconnu'} evincee")
+        if job.on_shed:
+            if job.ack_ready is not None:
+                # Accuse en cours d'envoi : c'est lui qui doit annoncer le rejet
+                job.ack_ready.wait()
+            _safe_call(job.on_shed, job.ack)
+
+
+class AsyncAnswerScheduler:
+    """Meme ordonnancement pour le mode async : workers = taches asyncio, callbacks = coroutines."""
+
+    def __init__(
+        self,
+        workers: int = SCHEDULER_WORKERS,
+        max_queue: int = SCHEDULER_MAX_QUEUE,
+        ack_depth: int = SCHEDULER_ACK_DEPTH,
+    ):
+        self.workers = workers
+        self.ack_depth = ack_depth
+        self._queue = FairQueue(max_queue)
+        self._cond: Optional[asyncio.Condition] = None
+        self._tasks: list[asyncio.Task] = []
+        self._running = 0
+
+    def start(self) -> "AsyncAnswerScheduler":
+        """A appeler depuis la boucle asyncio (ou au premier submit)."""
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            logger.info(f"Ordonnanceur async demarre : {self.workers} worker(s), file max {self._queue.max_size}")
+        return self
+
+    async def submit(
+        self,
+        run: Callable[[Optional[str]], Awaitable[Any]],
+        user: str = "",
+        priority: int = PRIORITY_MESSAGE,
+        on_ack: Optional[Callable[[int], Awaitable[Optional[str]]]] = None,
+        on_shed: Optional[Callable[[Optional[str]], Awaitable[Any]]] = None,
+    ) -> bool:
+        self.start()
+        kind = _PRIORITY_NAMES.get(priority, str(priority))
+        async with self._cond:
+            job, evicted = self._queue.push(priority, user, run, on_shed)
+            position = self._queue.position(job) if job else 0
+            ack = bool(job and on_ack) and _should_ack(position, self._running, self.workers, self.ack_depth)
+            if ack:
+                job.ack_ready = asyncio.Event()
+            SCHEDULER_QUEUE_DEPTH.set(len(self._queue))
+            if job:
+                self._cond.notify()
+
+        if evicted:
+            SCHEDULER_JOBS.inc(kind=_PRIORITY_NAMES.get(evicted.priority, str(evicted.priority)), outcome="shed")
+            logger.warning(f"File pleine : demande de {evicted.user or 'inconnu'} evincee")
+            if evicted.on_shed:
+                if evicted.ack_ready is not None:
+                    await evicted.ack_ready.wait()
+                await _safe_await(evicted.on_shed, evicted.ack)
+        if job is None:
+            SCHEDULER_JOBS.inc(kind=kind, outcome="rejected")
+            logger.warning(f"File pleine : demande {kind} de {user or 'inconnu'} rejetee")
+            if on_shed:
+                await _safe_await(on_shed, None)
+            return False
+
+        SCHEDULER_JOBS.inc(kind=kind, outcome="queued")
+        if ack:
+            try:
+                job.ack = await _safe_await(on_ack, position + self._running)
+            finally:
+                job.ack_ready.set()
+            SCHEDULER_JOBS.inc(kind=kind, outcome="acked")
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: len(self._queue) > 0)
+                job = self._queue.pop()
+                self._running += 1
+                SCHEDULER_RUNNING.set(self._running)
+                _observe_start(job, len(self._queue))
+            if job.ack_ready is not None:
+                await job.ack_ready.wait()
+            try:
+                await job.run(job.ack)
+            except Exception as e:
+                logger.error(f"Erreur dans une demande planifiee: {e}")
+            finally:
+                self._running -= 1
+                SCHEDULER_RUNNING.set(self._running)
+
+
+def _safe_call(fn: Callable, *args):
+    try:
+        return fn(*args)
+    except Exception as e:
+        logger.warning(f"Callback de l'ordonnanceur en erreur: {e}")
+        return None
+
+
+async def _safe_await(fn: Callable, *args):
+    try:
+        return await fn(*args)
+    except Exception as e:
+        logger.warning(f"Callback de l'ordonnanceur en erreur: {e}")
+        return None
@@ -0,0 +1,113 @@
+"""
+Affichage progressif des reponses dans Slack.
+Poste un message d'attente dans le thread, puis le met a jour via chat_update au fil
+du streaming Claude, avec un debit limite (chat.update est en Tier 3 chez Slack).
+"""
+
+import os
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Intervalle minimum entre deux chat_update pendant le streaming (secondes)
+STREAM_UPDATE_INTERVAL = float(os.getenv("STREAM_UPDATE_INTERVAL", "1.0"))
+# Nombre minimum de caracteres nouveaux avant une mise a jour
+STREAM_MIN_CHARS = int(os.getenv("STREAM_MIN_CHARS", "40"))
+
+PENDING_MESSAGE = ":hourglass_flowing_sand: Je cherche dans la KB..."
+# Suffixe affiche tant que la reponse est en cours d'ecriture
+TYPING_SUFFIX = " :writing_hand:"
+
+
+class _StreamThrottle:
+    """
+    Decide quand pousser une mise a jour (intervalle + volume de texte nouveau).
+    Un texte qui ne prolonge pas le dernier texte pousse est un nouveau flux (ex : reponse
+    recalculee par le modele principal) : il remplace l'ancien sans attendre l'intervalle.
+    """
+
+    def __init__(self, interval: float = STREAM_UPDATE_INTERVAL, min_chars: int = STREAM_MIN_CHARS):
+        self.interval = interval
+        self.min_chars = min_chars
+        self._last_push = 0.0
+        self._last_text = ""
+
+    def should_push(self, text: str) -> bool:
+        if not text:
+            return False
+        if not text.startswith(self._last_text):
+            return len(text) >= self.min_chars
+        if len(text) - len(self._last_text) < self.min_chars:
+            return False
+        return time.monotonic() - self._last_push >= self.interval
+
+    def pushed(self, text: str) -> None:
+        self._last_push = time.monotonic()
+        self._last_text = text
+
+
+class SlackStreamingReply:
+    """Message Slack mis a jour progressivement (client WebClient sync)."""
+
+    def __init__(self, client, channel: str, thread_ts: str, message_ts: Optional[str] = None):
+        self.client = client
+        self.channel = channel
+        self.thread_ts = thread_ts
+        self.ts = message_ts
+        self._throttle = _StreamThrottle()
+
+        if self.ts is None:
+            try:
+                response = client.chat_postMessage(channel=channel, thread_ts=thread_ts, text=PENDING_MESSAGE)
+                self.ts = response.get("ts")
+            except Exception as e:
+                logger.warning(f"Impossible de poster le message d'attente: {e}")
+
+    def update(self, partial: str) -> None:
+        """Callback on_partial de l'agent : met a jour le message si le throttle le permet."""
+        if not self.ts or not self._throttle.should_push(partial):
+            return
+        try:
+            self.client.chat_update(channel=self.channel, ts=self.ts, text=partial + TYPING_SUFFIX)
+            self._throttle.pushed(partial)
+        except Exception as e:
+            logger.warning(f"Mise a jour du message en streaming echouee: {e}")
+
+    def finish(self, text: str) -> None:
+        """Remplace le message par la reponse finale (ou la poste si le message d'attente a echoue)."""
+        if self.ts:
+            self.client.chat_update(channel=self.channel, ts=self.ts, text=text)
+        else:
+            response = self.client.chat_postMessage(channel=self.channel, thread_ts=self.thread_ts, text=text)
+            self.ts = response.get("ts")
+
+
+class AsyncSlackStreamingReply:
+    """Equivalent de SlackStreamingReply pour AsyncWebClient (mode async)."""
+
+    def __init__(self, client, channel: str, thread_ts: str, message_ts: Optional[str] = None):
+        self.client = client
+        self.channel = channel
+        self.thread_ts = thread_ts
+        self.ts = message_ts
+        self._throttle = _StreamThrottle()
+
+    async def update(self, partial: str) -> None:
+        """Callback on_partial de l'agent (coroutine)."""
+        if not self.ts or not self._throttle.should_push(partial):
+            return
+        try:
+            await self.client.chat_update(channel=self.channel, ts=self.ts, text=partial + TYPING_SUFFIX)
+            self._throttle.pushed(partial)
+        except Exception as e:
+            logger.warning(f"Mise a jour du message en streaming echouee: {e}")
+
+    async def finish(self, text: str) -> None:
+        """Remplace le message par la reponse finale (ou la poste si besoin)."""
+        if self.ts:
+            await self.client.chat_update(channel=self.channel, ts=self.ts, text=text)
+        else:
+            response = await self.client.chat_postMessage(channel=self.channel, thread_ts=self.thread_ts, text=text)
+            self.ts = response.get("ts")
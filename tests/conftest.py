@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules a plat a la racine du depot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+
+import pytest
+
+from event_dedup import AsyncSingleFlight, EventDeduplicator, SingleFlight
+
+
+def test_deduplicator_ignores_same_message_within_window():
+    dedup = EventDeduplicator(window=60)
+    event = {"channel": "C1", "ts": "1.0", "client_msg_id": "m1"}
+    assert not dedup.is_duplicate(event)
+    # message + app_mention du meme message : meme client_msg_id
+    assert dedup.is_duplicate({"channel": "C1", "ts": "1.0", "client_msg_id": "m1", "type": "app_mention"})
+    assert not dedup.is_duplicate({"channel": "C1", "ts": "2.0"})
+
+
+def test_deduplicator_forgets_expired_events():
+    dedup = EventDeduplicator(window=0)
+    event = {"channel": "C1", "ts": "1.0"}
+    assert not dedup.is_duplicate(event)
+    assert not dedup.is_duplicate(event)
+
+
+def test_single_flight_shares_one_computation():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "reponse"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("q", compute)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("q", compute))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == ["reponse"] * 4
+
+
+def test_single_flight_propagates_error_to_followers():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise ValueError("echec")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("q", compute)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == ["echec", "echec"]
+    # La cle est liberee : un nouvel appel relance le calcul
+    assert flight.do("q", lambda: "ok") == "ok"
+
+
+def test_async_single_flight_shares_result():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "reponse"
+
+        results = await asyncio.gather(*(flight.do("q", compute) for _ in range(4)))
+        return calls, results
+
+    calls, results = asyncio.run(scenario())
+    assert calls == [1]
+    assert results == ["reponse"] * 4
+
+
+def test_async_single_flight_follower_takes_over_after_leader_cancel():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        runs = []
+
+        def compute(tag):
+            async def _run():
+                runs.append(tag)
+                await asyncio.sleep(0.02)
+                return f"reponse-{tag}"
+            return _run
+
+        leader = asyncio.create_task(flight.do("q", compute("leader")))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(flight.do("q", compute(f"f{i}"))) for i in range(2)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        results = await asyncio.gather(leader, *followers, return_exceptions=True)
+        return runs, results, flight._calls
+
+    runs, results, pending = asyncio.run(scenario())
+    assert isinstance(results[0], asyncio.CancelledError)
+    # Le premier appelant en attente relance le calcul, le second le partage
+    assert runs == ["leader", "f0"]
+    assert results[1:] == ["reponse-f0", "reponse-f0"]
+    assert pending == {}
+
+
+def test_async_single_flight_follower_cancel_keeps_shared_computation():
+    async def scenario():
+        flight = AsyncSingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.02)
+            return "reponse"
+
+        leader = asyncio.create_task(flight.do("q", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("q", compute))
+        await asyncio.sleep(0)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(scenario()) == "reponse"
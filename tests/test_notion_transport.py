@@ -0,0 +1,152 @@
+import time
+
+import httpx
+import pytest
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+import notion_transport
+from notion_transport import CircuitBreaker, CircuitOpenError, NotionTransport, TokenBucket
+
+
+def _http_error(status: int, headers: dict = None) -> HTTPResponseError:
+    return HTTPResponseError(httpx.Response(status, headers=headers or {}))
+
+
+def _timeout(cause: Exception) -> RequestTimeoutError:
+    """Comme notion_client : le timeout httpx est converti en RequestTimeoutError."""
+    try:
+        raise cause
+    except Exception:
+        try:
+            raise RequestTimeoutError()
+        except RequestTimeoutError as e:
+            return e
+
+
+class _Failing:
+    """fn(**kwargs) qui leve les erreurs donnees puis retourne `result`."""
+
+    def __init__(self, *errors, result=None):
+        self.errors = list(errors)
+        self.result = result if result is not None else {"ok": True}
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(notion_transport, "NOTION_BACKOFF_BASE", 0.001)
+    monkeypatch.setattr(notion_transport, "NOTION_BACKOFF_MAX", 0.001)
+
+
+def test_token_bucket_allows_burst_then_waits():
+    bucket = TokenBucket(rate=50, burst=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    start = time.monotonic()
+    waited = bucket.acquire()
+    assert waited > 0
+    assert time.monotonic() - start >= 0.015
+
+
+def test_token_bucket_pause_blocks_until_retry_after():
+    bucket = TokenBucket(rate=1000, burst=5)
+    bucket.pause(0.05)
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.045
+
+
+def test_token_bucket_without_rate_never_waits():
+    bucket = TokenBucket(rate=0, burst=1)
+    assert all(bucket.acquire() == 0.0 for _ in range(10))
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    # Ouvert : appels refuses pendant le cooldown
+    assert breaker.is_open()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    # Semi-ouvert : un seul appel d'essai
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    # Referme
+    assert not breaker.is_open()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_trial_failure_reopens():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open()
+    assert not breaker.allow()
+
+
+def test_unexpected_error_during_trial_releases_the_breaker():
+    transport = NotionTransport(rate=0, breaker_threshold=1, breaker_cooldown=0.01)
+    transport.breaker.record_failure()
+    time.sleep(0.02)
+
+    with pytest.raises(ValueError):
+        transport.call("databases.query", _Failing(ValueError("reponse invalide")))
+    # L'essai n'a pas laisse le disjoncteur bloque
+    assert transport.call("databases.query", _Failing()) == {"ok": True}
+    assert not transport.breaker.is_open()
+
+
+def test_open_breaker_rejects_calls_without_calling_notion():
+    transport = NotionTransport(rate=0, breaker_threshold=1, breaker_cooldown=60)
+    transport.breaker.record_failure()
+    fn = _Failing()
+    with pytest.raises(CircuitOpenError):
+        transport.call("search", fn)
+    assert fn.calls == 0
+
+
+def test_reads_retry_transient_errors():
+    transport = NotionTransport(rate=0, max_retries=3)
+    fn = _Failing(_http_error(503), _timeout(httpx.ReadTimeout("lent")))
+    assert transport.call("databases.query", fn) == {"ok": True}
+    assert fn.calls == 3
+
+
+def test_client_errors_are_not_retried_and_do_not_trip_the_breaker():
+    transport = NotionTransport(rate=0, breaker_threshold=1)
+    fn = _Failing(_http_error(400))
+    with pytest.raises(HTTPResponseError):
+        transport.call("databases.query", fn)
+    assert fn.calls == 1
+    assert not transport.breaker.is_open()
+
+
+def test_writes_are_not_resent_after_a_timeout_or_5xx():
+    for error in (_timeout(httpx.ReadTimeout("lent")), _http_error(502)):
+        transport = NotionTransport(rate=0, max_retries=3)
+        fn = _Failing(error)
+        with pytest.raises(type(error)):
+            transport.call("pages.create", fn, idempotent=False)
+        assert fn.calls == 1
+
+
+def test_writes_are_retried_when_the_request_did_not_reach_notion():
+    transport = NotionTransport(rate=0, max_retries=3)
+    fn = _Failing(
+        _http_error(429, {"retry-after": "0"}),
+        httpx.ConnectError("refuse"),
+        _timeout(httpx.ConnectTimeout("connexion")),
+    )
+    assert transport.call("pages.create", fn, idempotent=False) == {"ok": True}
+    assert fn.calls == 4
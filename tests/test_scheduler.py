@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+
+from scheduler import (
+    PRIORITY_MENTION,
+    PRIORITY_MESSAGE,
+    AnswerScheduler,
+    AsyncAnswerScheduler,
+    FairQueue,
+    _should_ack,
+)
+
+
+def _noop(ack_ts=None):
+    return None
+
+
+def _drain(queue: FairQueue) -> list[str]:
+    order = []
+    while len(queue):
+        order.append(queue.pop().user)
+    return order
+
+
+def test_fair_queue_alternates_between_users():
+    queue = FairQueue(max_size=10)
+    for user in ("a", "a", "a", "b"):
+        queue.push(PRIORITY_MESSAGE, user, _noop, None)
+    queue.push(PRIORITY_MENTION, "m", _noop, None)
+
+    # Mention d'abord, puis un tour par utilisateur
+    assert _drain(queue) == ["m", "a", "b", "a", "a"]
+
+
+def test_fair_queue_evicts_least_priority_job_when_full():
+    queue = FairQueue(max_size=3)
+    jobs = [queue.push(PRIORITY_MESSAGE, "a", _noop, None)[0] for _ in range(3)]
+
+    # Une mention prend la place de la demande la moins prioritaire (dernier tour de "a")
+    mention, evicted = queue.push(PRIORITY_MENTION, "m", _noop, None)
+    assert mention is not None and evicted is jobs[2]
+
+    # Un autre utilisateur passe avant le 2e tour de "a"
+    other, evicted = queue.push(PRIORITY_MESSAGE, "b", _noop, None)
+    assert other is not None and evicted is jobs[1]
+
+    # Une demande qui ne passe avant aucune autre est rejetee
+    assert queue.push(PRIORITY_MESSAGE, "a", _noop, None) == (None, None)
+    assert _drain(queue) == ["m", "a", "b"]
+
+
+def test_position_counts_jobs_served_before():
+    queue = FairQueue(max_size=10)
+    first = queue.push(PRIORITY_MESSAGE, "a", _noop, None)[0]
+    second = queue.push(PRIORITY_MESSAGE, "a", _noop, None)[0]
+    mention = queue.push(PRIORITY_MENTION, "m", _noop, None)[0]
+    assert queue.position(mention) == 0
+    assert queue.position(first) == 1
+    assert queue.position(second) == 2
+
+
+def test_should_ack_only_when_job_will_wait():
+    # Un worker libre : pas d'accuse, meme avec des demandes devant
+    assert not _should_ack(position=0, running=3, workers=4, ack_depth=0)
+    assert not _should_ack(position=3, running=0, workers=4, ack_depth=3)
+    # Tous les workers pris et assez de demandes devant
+    assert _should_ack(position=3, running=4, workers=4, ack_depth=3)
+    assert _should_ack(position=3, running=1, workers=4, ack_depth=3)
+    # File profonde mais sous le seuil d'accuse
+    assert not _should_ack(position=2, running=4, workers=4, ack_depth=3)
+
+
+def _wait_for(predicate, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_job_starts_with_its_ack_even_if_dequeued_while_ack_is_posted():
+    scheduler = AnswerScheduler(workers=1, max_queue=10, ack_depth=0).start()
+    release, done = threading.Event(), threading.Event()
+    received = []
+
+    scheduler.submit(lambda ack_ts: release.wait(2))
+    _wait_for(lambda: scheduler._running == 1)
+
+    def slow_ack(position):
+        # Le worker se libere pendant l'envoi de l'accuse
+        release.set()
+        time.sleep(0.05)
+        return "ack-ts"
+
+    def run(ack_ts):
+        received.append(ack_ts)
+        done.set()
+
+    assert scheduler.submit(run, user="u", on_ack=slow_ack)
+    assert done.wait(2)
+    assert received == ["ack-ts"]
+
+
+def test_no_ack_when_a_worker_is_free():
+    scheduler = AnswerScheduler(workers=2, max_queue=10, ack_depth=0).start()
+    release, done = threading.Event(), threading.Event()
+    acks = []
+
+    scheduler.submit(lambda ack_ts: release.wait(2))
+    _wait_for(lambda: scheduler._running == 1)
+    scheduler.submit(lambda ack_ts: done.set(), on_ack=lambda position: acks.append(position) or "ts")
+    assert done.wait(2)
+    release.set()
+    assert acks == []
+
+
+def test_shed_job_receives_its_ack():
+    scheduler = AnswerScheduler(workers=1, max_queue=2, ack_depth=1).start()
+    release = threading.Event()
+    shed = []
+
+    scheduler.submit(lambda ack_ts: release.wait(2), user="x")
+    _wait_for(lambda: scheduler._running == 1)
+    for i in range(2):
+        scheduler.submit(
+            _noop, user=f"u{i}", on_ack=lambda position, i=i: f"ack-{i}",
+            on_shed=lambda ack_ts, i=i: shed.append((i, ack_ts)),
+        )
+    # Mention : evince la derniere demande, dont l'accuse est remplace
+    scheduler.submit(_noop, user="m", priority=PRIORITY_MENTION, on_shed=lambda ack_ts: shed.append(("m", ack_ts)))
+    # File pleine de demandes prioritaires : rejet sans accuse
+    scheduler.submit(_noop, user="n", on_shed=lambda ack_ts: shed.append(("n", ack_ts)))
+    release.set()
+
+    assert shed == [(1, "ack-1"), ("n", None)]
+
+
+def test_async_scheduler_shed_job_receives_its_ack():
+    async def scenario():
+        scheduler = AsyncAnswerScheduler(workers=1, max_queue=2, ack_depth=1)
+        release = asyncio.Event()
+        shed = []
+
+        async def blocker(ack_ts):
+            await release.wait()
+
+        async def noop(ack_ts):
+            return None
+
+        def ack(i):
+            async def _ack(position):
+                return f"ack-{i}"
+            return _ack
+
+        def on_shed(tag):
+            async def _shed(ack_ts):
+                shed.append((tag, ack_ts))
+            return _shed
+
+        await scheduler.submit(blocker, user="x")
+        await asyncio.sleep(0.01)
+        for i in range(2):
+            await scheduler.submit(noop, user=f"u{i}", on_ack=ack(i), on_shed=on_shed(i))
+        await scheduler.submit(noop, user="m", priority=PRIORITY_MENTION, on_shed=on_shed("m"))
+        release.set()
+        return shed
+
+    assert asyncio.run(scenario()) == [(1, "ack-1")]
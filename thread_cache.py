@@ -0,0 +1,151 @@
+"""
+Cache en memoire du contexte des threads Slack.
+Alimente par les evenements `message` que l'app recoit deja (messages, editions,
+suppressions, y compris les reponses du bot) : un buffer circulaire des derniers messages
+par thread, avec eviction LRU sur les threads. conversations_replies n'est appele qu'en
+cas de miss (thread commence avant le demarrage du bot), puis le thread est suivi localement.
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Optional
+from metrics import THREAD_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Nombre max de threads suivis (les moins recemment actifs sont evinces)
+THREAD_CACHE_MAX_THREADS = int(os.getenv("THREAD_CACHE_MAX_THREADS", "500"))
+# Messages gardes par thread (le message courant + les 5 precedents utilises pour le contexte)
+THREAD_CACHE_MESSAGES = int(os.getenv("THREAD_CACHE_MESSAGES", "6"))
+
+
+class _ThreadBuffer:
+    """Derniers messages d'un thread. complete = on a vu le thread depuis sa racine (ou l'API)."""
+
+    __slots__ = ("messages", "complete")
+
+    def __init__(self, size: int, complete: bool):
+        self.messages: deque = deque(maxlen=size)
+        self.complete = complete
+
+
+class ThreadContextCache:
+    """Buffers circulaires par thread (channel, thread_ts), evincement LRU, thread-safe."""
+
+    def __init__(self, max_threads: int = THREAD_CACHE_MAX_THREADS, messages_per_thread: int = THREAD_CACHE_MESSAGES):
+        self.max_threads = max_threads
+        self.messages_per_thread = messages_per_thread
+        self._threads: OrderedDict[tuple[str, str], _ThreadBuffer] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, event: dict) -> None:
+        """Enregistre un evenement `message` (nouveau message, edition ou suppression)."""
+        channel = event.get("channel", "")
+        subtype = event.get("subtype")
+        if not channel:
+            return
+
+        if subtype == "message_changed":
+            message = event.get("message") or {}
+            self._update(channel, message.get("thread_ts") or message.get("ts", ""), message)
+            return
+        if subtype == "message_deleted":
+            previous = event.get("previous_message") or {}
+            self._delete(channel, previous.get("thread_ts") or previous.get("ts", ""), event.get("deleted_ts", ""))
+            return
+        if subtype and subtype not in ("bot_message", "thread_broadcast", "file_share"):
+            return
+
+        ts = event.get("ts", "")
+        thread_ts = event.get("thread_ts") or ts
+        if not ts:
+            return
+        with self._lock:
+            # Un message racine ouvre un thread complet ; une reponse a un thread inconnu
+            # ouvre un buffer incomplet (le debut du thread nous a echappe)
+            buffer = self._buffer(channel, thread_ts, complete=(thread_ts == ts))
+            self._upsert(buffer, _compact(event))
+
+    def get(self, channel: str, thread_ts: str, ts: str) -> Optional[list[dict]]:
+        """
+        Messages du thread anterieurs au message `ts` (ordre chronologique),
+        ou None si le thread n'est pas connu en entier (fallback API necessaire).
+        """
+        with self._lock:
+            buffer = self._threads.get((channel, thread_ts))
+            if buffer is None or not buffer.complete:
+                THREAD_CACHE_LOOKUPS.inc(result="miss")
+                return None
+            self._threads.move_to_end((channel, thread_ts))
+            messages = [m for m in buffer.messages if not ts or float(m["ts"]) < float(ts)]
+        THREAD_CACHE_LOOKUPS.inc(result="hit")
+        return messages
+
+    def seed(self, channel: str, thread_ts: str, messages: list[dict], complete: bool = True) -> None:
+        """
+        Initialise un thread a partir de conversations_replies. complete=False si l'API n'a pas
+        tout renvoye (has_more) : le prochain message du thread repassera par l'API.
+        """
+        with self._lock:
+            buffer = self._buffer(channel, thread_ts, complete=complete)
+            buffer.complete = complete
+            for message in messages:
+                self._upsert(buffer, _compact(message))
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+    def _buffer(self, channel: str, thread_ts: str, complete: bool) -> _ThreadBuffer:
+        key = (channel, thread_ts)
+        buffer = self._threads.get(key)
+        if buffer is None:
+            buffer = _ThreadBuffer(self.messages_per_thread, complete)
+            self._threads[key] = buffer
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        else:
+            self._threads.move_to_end(key)
+        return buffer
+
+    @staticmethod
+    def _upsert(buffer: _ThreadBuffer, message: dict) -> None:
+        """Insere un message a sa place chronologique (remplace s'il existe deja)."""
+        messages = [m for m in buffer.messages if m["ts"] != message["ts"]]
+        messages.append(message)
+        messages.sort(key=lambda m: float(m["ts"]))
+        buffer.messages.clear()
+        buffer.messages.extend(messages)
+
+    def _update(self, channel: str, thread_ts: str, message: dict) -> None:
+        with self._lock:
+            buffer = self._threads.get((channel, thread_ts))
+            if buffer is None:
+                return
+            for i, existing in enumerate(buffer.messages):
+                if existing["ts"] == message.get("ts"):
+                    buffer.messages[i] = _compact(dict(message, user=message.get("user", existing["user"])))
+                    return
+
+    def _delete(self, channel: str, thread_ts: str, ts: str) -> None:
+        with self._lock:
+            buffer = self._threads.get((channel, thread_ts))
+            if buffer is None:
+                return
+            remaining = [m for m in buffer.messages if m["ts"] != ts]
+            buffer.messages.clear()
+            buffer.messages.extend(remaining)
+
+
+def _compact(message: dict) -> dict:
+    """Champs utiles au contexte (meme forme que les messages de conversations_replies)."""
+    return {
+        "ts": message.get("ts", "0"),
+        "user": message.get("user") or message.get("bot_id") or "inconnu",
+        "text": message.get("text", ""),
+    }
+
+
+# Cache partage par les handlers Slack (sync et async)
+THREAD_CACHE = ThreadContextCache()
@@ -0,0 +1,100 @@
+"""
+Pipeline de normalisation du texte pour le retrieval et la detection d'intention.
+minuscules -> repli des accents (NFKD) -> decoupage -> stop words -> stemming leger FR/EN.
+Partage par KBRetriever (index + requetes), _detect_category et _is_revops_request,
+pour que "résiliation" / "resiliation" ou "factures" / "facture" se retrouvent.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# Mots vides a ignorer dans la recherche (sans accents : compares apres repli)
+STOP_WORDS = {
+    # Francais courant
+    "comment", "faire", "pour", "dans", "avec", "sans", "entre", "cette",
+    "sont", "sera", "suis", "etre", "avoir", "fait", "faut", "peut",
+    "dois", "doit", "veux", "veut", "quel", "quelle", "quels", "quelles",
+    "quand", "combien", "pourquoi", "quel", "aussi", "bien", "comme",
+    "plus", "moins", "tres", "tout", "tous", "toute", "toutes",
+    "mais", "donc", "encore", "depuis", "avant", "apres", "pendant",
+    "voici", "voila", "autre", "autres", "meme", "notre", "votre", "leur",
+    "chez", "vers", "sous", "dessus", "dessous",
+    # Determinants et pronoms
+    "elle", "elles", "nous", "vous", "ils", "leur", "leurs",
+    "celui", "celle", "ceux", "celles",
+    # Mots outils courts
+    "les", "des", "une", "est", "pas", "qui", "que", "sur", "par", "aux",
+    "ses", "son", "the", "and", "for", "are", "you", "can", "how",
+    # Formulations de demande
+    "possible", "besoin", "bonjour", "hello", "salut", "merci",
+    "svp", "equipe", "team", "quelqu",
+    # Anglais courant
+    "what", "when", "where", "which", "that", "this", "from",
+    "have", "will", "been", "would", "could", "should",
+    "about", "there", "their", "them", "they", "some",
+}
+
+# Separateurs : espaces + ponctuation (memes caracteres que l'ancien nettoyage, + guillemets)
+_SPLIT_RE = re.compile(r"[\s?!.,;:()\[\]{}\"'/\-–—«»]+")
+
+# Caracteres que la decomposition NFKD ne replie pas
+_EXTRA_FOLDS = str.maketrans({"œ": "oe", "æ": "ae", "ß": "ss", "’": "'", "‘": "'"})
+
+# Suffixes retires par le stemmer (le premier qui s'applique, du plus long au plus court).
+# Volontairement leger : on vise pluriels, feminins et derivations courantes,
+# pas un stemmer linguistique complet.
+_SUFFIXES = (
+    ("issements", ""), ("issement", ""),
+    ("ations", ""), ("ation", ""),
+    ("ements", ""), ("ement", ""),
+    ("ing", ""), ("ies", "y"),
+    ("ees", ""), ("ee", ""),
+    ("er", ""), ("ir", ""), ("ed", ""),
+    ("es", ""), ("e", ""),
+    ("s", ""), ("x", ""),
+)
+
+# Longueur minimale du radical apres stemming
+_MIN_STEM_LEN = 4
+
+
+def fold_accents(text: str) -> str:
+    """Retire les accents et ligatures ("Résiliation" -> "Resiliation")."""
+    if text.isascii():
+        return text
+    text = text.translate(_EXTRA_FOLDS)
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_text(text: str) -> str:
+    """Minuscules + repli des accents. Base commune a toute la detection par mots-cles."""
+    return fold_accents(text.lower())
+
+
+def tokenize(text: str) -> list[str]:
+    """Decoupe un texte normalise en mots de plus de 2 caracteres."""
+    return [w for w in _SPLIT_RE.split(normalize_text(text)) if len(w) > 2]
+
+
+@lru_cache(maxsize=8192)
+def stem(word: str) -> str:
+    """Stemming leger FR/EN d'un mot deja normalise (resultat mis en cache par mot)."""
+    for suffix, replacement in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) + len(replacement) >= _MIN_STEM_LEN:
+            return word[: len(word) - len(suffix)] + replacement
+    return word
+
+
+def significant_words(text: str, limit: int = 6) -> list[str]:
+    """Mots normalises (non stemmes) hors stop words, dans l'ordre du texte."""
+    return [w for w in tokenize(text) if w not in STOP_WORDS][:limit]
+
+
+def analyze(text: str, drop_stop_words: bool = False) -> list[str]:
+    """Pipeline complet : tokens normalises et stemmes (termes de l'index et des requetes)."""
+    words = tokenize(text)
+    if drop_stop_words:
+        words = [w for w in words if w not in STOP_WORDS]
+    return [stem(w) for w in words]
@@ -0,0 +1,231 @@
+"""
+Representation vectorielle locale des entrees KB (aucun service externe).
+Chaque entree est encodee en n-grammes de caracteres (3 et 4) de ses mots significatifs,
+hashes dans un espace de KB_VECTOR_DIM dimensions et ponderes TF-IDF : "rembourser" et
+"remboursement" partagent la plupart de leurs n-grammes, la ou l'index BM25 ne voit que des
+termes differents. Les vecteurs normalises sont empiles dans une matrice NumPy : une
+question est scoree contre toute la KB en un seul produit vecteur-matrice (restreint aux
+dimensions presentes dans la question).
+Une modification de la KB (ajout / mise a jour / suppression) ne reecrit que la colonne de
+l'entree, avec les IDF du dernier calcul ; les IDF et toute la matrice sont recalcules en bloc
+par reweight(), appele depuis le thread de rafraichissement du snapshot.
+"""
+
+import os
+import zlib
+import threading
+from collections import Counter
+from typing import Optional
+import numpy as np
+from kb_index import FIELD_WEIGHTS
+from tokenizer import STOP_WORDS, tokenize
+
+# Dimension de l'espace des n-grammes hashes
+KB_VECTOR_DIM = int(os.getenv("KB_VECTOR_DIM", "4096"))
+# Tailles des n-grammes de caracteres
+_NGRAM_SIZES = (3, 4)
+
+
+def _ngram_counts(text: str, weight: float, dim: int, counts: Counter) -> None:
+    for word in tokenize(text):
+        if word in STOP_WORDS:
+            continue
+        padded = f" {word} "
+        for n in _NGRAM_SIZES:
+            for i in range(len(padded) - n + 1):
+                counts[zlib.crc32(padded[i:i + n].encode()) % dim] += weight
+
+
+def encode_entry(entry: dict, dim: int = KB_VECTOR_DIM) -> Counter:
+    """Compteurs de n-grammes hashes d'une entree, ponderes par champ (memes poids que BM25)."""
+    counts: Counter = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        _ngram_counts(entry.get(field) or "", weight, dim, counts)
+    return counts
+
+
+def encode_query(text: str, dim: int = KB_VECTOR_DIM) -> Counter:
+    counts: Counter = Counter()
+    _ngram_counts(text, 1.0, dim, counts)
+    return counts
+
+
+def _encode_doc(entry: dict, dim: int) -> Optional[tuple[np.ndarray, np.ndarray]]:
+    """(dimensions, poids tf sous-lineaires) d'une entree, None si elle n'a aucun n-gramme."""
+    counts = encode_entry(entry, dim)
+    if not counts:
+        return None
+    dims = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    # Compteurs ponderes par champ (>= 1) : tf sous-lineaire
+    weights = 1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    return dims, weights
+
+
+class VectorIndex:
+    """
+    Vecteurs TF-IDF normalises des entrees, stockes en matrice (dimensions x entrees) : les
+    lignes des dimensions de la question sont contigues en memoire. Les colonnes des entrees
+    supprimees sont remises a zero et reutilisees. Thread-safe.
+    """
+
+    def __init__(self, dim: int = KB_VECTOR_DIM):
+        self.dim = dim
+        # id entree -> (dimensions, poids tf sous-lineaires)
+        self._docs: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        # nombre d'entrees contenant chaque dimension
+        self._df = np.zeros(dim, dtype=np.int32)
+        # matrice ponderee (colonnes en reserve au-dela de len(_row_ids)), IDF du dernier calcul
+        self._matrix: Optional[np.ndarray] = None
+        self._idf = np.zeros(dim, dtype=np.float32)
+        # id de chaque colonne (None = libre), colonne de chaque id, colonnes libres
+        self._row_ids: list[Optional[str]] = []
+        self._columns: dict[str, int] = {}
+        self._free: list[int] = []
+        # IDF perimes depuis le dernier calcul en bloc (ajouts / suppressions incrementaux)
+        self._stale = False
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def rebuild(self, entries: list[dict]) -> None:
+        docs, df = {}, np.zeros(self.dim, dtype=np.int32)
+        for entry in entries:
+            doc = _encode_doc(entry, self.dim)
+            if doc is not None:
+                docs[entry["id"]] = doc
+                df[doc[0]] += 1
+        # Matrice construite hors du verrou : les recherches en cours ne l'attendent pas
+        built = self._build(docs, df)
+        with self._lock:
+            self._docs, self._df = docs, df
+            self._install_locked(built)
+            self._version += 1
+
+    def add(self, entry: dict) -> None:
+        """Ajoute ou met a jour une entree : seule sa colonne est reecrite."""
+        doc = _encode_doc(entry, self.dim)
+        with self._lock:
+            self._remove_locked(entry["id"])
+            if doc is not None:
+                self._docs[entry["id"]] = doc
+                self._df[doc[0]] += 1
+                self._write_column_locked(entry["id"])
+            self._stale = True
+            self._version += 1
+
+    def remove(self, entry_id: str) -> None:
+        with self._lock:
+            self._remove_locked(entry_id)
+            self._stale = True
+            self._version += 1
+
+    def reweight(self) -> bool:
+        """
+        Recalcule les IDF et toute la matrice si des entrees ont change depuis le dernier calcul
+        (a appeler hors du chemin des questions, ex. thread de rafraichissement du snapshot).
+        Retourne True si la matrice a ete recalculee.
+        """
+        with self._lock:
+            if not self._stale:
+                return False
+            docs, df, version = dict(self._docs), self._df.copy(), self._version
+        built = self._build(docs, df)
+        with self._lock:
+            if self._version != version:
+                # Modifiee pendant le calcul : reste perimee, recalculee au prochain appel
+                return False
+            self._install_locked(built)
+        return True
+
+    def search(
+        self, query: str, max_results: int = 8, min_score: float = 0.0, allowed: Optional[set[str]] = None
+    ) -> list[tuple[str, float]]:
+        """
+        Similarite cosinus entre la question et toutes les entrees (un produit matrice-vecteur),
+        ou seulement les entrees `allowed` (colonnes correspondantes de la matrice).
+        Retourne les (id entree, score) tries par score decroissant, scores >= min_score.
+        """
+        counts = encode_query(query, self.dim)
+        if not counts:
+            return []
+        dims = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+
+        with self._lock:
+            if self._matrix is None or not self._columns:
+                return []
+            weights = (1 + np.log(weights)) * self._idf[dims]
+            if allowed is None:
+                row_ids = list(self._row_ids)
+                # Copie des lignes utiles : les colonnes peuvent etre reecrites apres le verrou
+                rows = self._matrix[dims, :len(row_ids)]
+            else:
+                cols = [self._columns[entry_id] for entry_id in allowed if entry_id in self._columns]
+                if not cols:
+                    return []
+                row_ids = [self._row_ids[col] for col in cols]
+                rows = self._matrix[np.ix_(dims, cols)]
+
+        norm = float(np.linalg.norm(weights))
+        if not norm:
+            return []
+        scores = (weights / norm) @ rows
+
+        k = min(max_results, len(row_ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(row_ids[i], float(scores[i])) for i in top if scores[i] >= min_score and scores[i] > 0]
+
+    def _build(self, docs: dict[str, tuple[np.ndarray, np.ndarray]], df: np.ndarray) -> tuple:
+        """IDF et matrice complete (colonnes compactees, reserve pour les ajouts suivants)."""
+        n_docs = len(docs)
+        idf = np.log1p(max(n_docs, 1) / np.maximum(df, 1)).astype(np.float32)
+        row_ids = list(docs)
+        matrix = np.zeros((self.dim, n_docs + max(16, n_docs // 8)), dtype=np.float32) if n_docs else None
+        for col, doc_id in enumerate(row_ids):
+            dims, weights = docs[doc_id]
+            vector = weights * idf[dims]
+            matrix[dims, col] = vector / (np.linalg.norm(vector) or 1.0)
+        return idf, row_ids, matrix
+
+    def _install_locked(self, built: tuple) -> None:
+        self._idf, self._row_ids, self._matrix = built
+        self._columns = {doc_id: col for col, doc_id in enumerate(self._row_ids)}
+        self._free = []
+        self._stale = False
+
+    def _write_column_locked(self, doc_id: str) -> None:
+        """Ecrit le vecteur normalise d'une entree dans sa colonne (allouee si besoin)."""
+        col = self._columns.get(doc_id)
+        if col is None:
+            col = self._free.pop() if self._free else len(self._row_ids)
+            if col == len(self._row_ids):
+                self._row_ids.append(doc_id)
+            else:
+                self._row_ids[col] = doc_id
+            self._columns[doc_id] = col
+        if self._matrix is None or col >= self._matrix.shape[1]:
+            # Reserve epuisee : capacite doublee (cout amorti)
+            grown = np.zeros((self.dim, max(16, 2 * (col + 1))), dtype=np.float32)
+            if self._matrix is not None:
+                grown[:, :self._matrix.shape[1]] = self._matrix
+            self._matrix = grown
+
+        dims, weights = self._docs[doc_id]
+        # Avant le premier calcul en bloc (IDF nuls) : IDF maximal (df = 1)
+        idf = np.where(self._idf[dims] > 0, self._idf[dims], np.log1p(max(len(self._docs), 1)))
+        vector = weights * idf
+        self._matrix[:, col] = 0.0
+        self._matrix[dims, col] = vector / (np.linalg.norm(vector) or 1.0)
+
+    def _remove_locked(self, entry_id: str) -> None:
+        doc = self._docs.pop(entry_id, None)
+        if doc is not None:
+            self._df[doc[0]] -= 1
+        col = self._columns.pop(entry_id, None)
+        if col is not None:
+            self._matrix[:, col] = 0.0
+            self._row_ids[col] = None
+            self._free.append(col)